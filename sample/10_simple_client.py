@@ -1,4 +1,5 @@
 import asyncio
+import time
 import websockets
 import numpy as np
 import soundfile as sf
@@ -11,6 +12,7 @@ async def main():
         async with websockets.connect(uri) as ws:
             text_to_speak = "Hello! This is a streaming test."
             await ws.send(text_to_speak)
+            start = time.perf_counter()
 
             audio_chunks = []
             print("Receiving audio...")
@@ -19,6 +21,8 @@ async def main():
                 while True:
                     # Added a timeout so it doesn't wait forever if server dies
                     data = await asyncio.wait_for(ws.recv(), timeout=10.0)
+                    if not audio_chunks:
+                        print(f"First audio after {(time.perf_counter() - start) * 1000:.0f} ms")
                     audio_frame = np.frombuffer(data, dtype=np.float32)
                     audio_chunks.append(audio_frame)
             except (ConnectionClosedOK, ConnectionClosedError):
@@ -27,6 +31,7 @@ async def main():
                 print("Timeout: Server took too long to respond.")
 
             if audio_chunks:
+                print(f"Last audio after {(time.perf_counter() - start) * 1000:.0f} ms")
                 waveform = np.concatenate(audio_chunks)
                 sf.write("speech_stream.wav", waveform, 22050)
                 print(f"Success! Saved {len(waveform)} samples to speech_stream.wav")
@@ -0,0 +1,123 @@
+"""
+Load test for sample.10_simple_server
+Opens N concurrent WebSocket clients, each sending utterances back to back,
+and reports p50/p95/p99 latency and utterances/sec per concurrency level.
+Requests the server turns away as busy (close code 1013) are counted as
+rejected, other abnormal closes as failed; neither counts towards the
+latency percentiles or utterances/sec.
+
+Against a running server:
+    uvicorn 10_simple_server:app --host 0.0.0.0 --port 8000
+    python ./10_simple_loadtest.py --concurrency 1 2 4 8 16
+
+Without models (exercises tts_batching.BatchScheduler in-process with a fake
+model whose cost is a fixed per-batch overhead plus a per-item cost):
+    python ./10_simple_loadtest.py --simulate
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from tts_batching import BatchScheduler
+from tts_executor import BUSY_CLOSE_CODE
+
+COMPLETED, REJECTED, FAILED = "completed", "rejected", "failed"
+
+TEXTS = [
+    "Hello!",
+    "This is a streaming test.",
+    "Your call is important to us, please stay on the line.",
+    "Press one for billing, press two for technical support, or stay on the line to speak to an agent.",
+]
+
+
+async def ws_request(uri, text):
+    """One utterance; returns COMPLETED, REJECTED (busy close) or FAILED."""
+    import websockets
+    from websockets.exceptions import ConnectionClosed
+
+    async with websockets.connect(uri) as ws:
+        try:
+            # The server may close (busy / warming up) before the text is even sent
+            await ws.send(text)
+            while True:
+                await ws.recv()
+        except ConnectionClosed as e:
+            # No close frame from the server at all is an abnormal close too
+            code = e.rcvd.code if e.rcvd is not None else None
+    if code == 1000:
+        return COMPLETED
+    return REJECTED if code == BUSY_CLOSE_CODE else FAILED
+
+
+def make_simulated_request(args):
+    def fake_batch(texts):
+        time.sleep((args.batch_overhead_ms + args.item_ms * len(texts)) / 1000)
+        return [np.zeros(len(t) * 256, dtype=np.float32) for t in texts]
+
+    scheduler = BatchScheduler(fake_batch, max_batch_size=args.max_batch_size,
+                               max_wait_ms=args.max_wait_ms)
+    scheduler.start()
+
+    async def request(text):
+        await scheduler.submit(text)
+        return COMPLETED
+
+    return request, scheduler
+
+
+async def client(request, n_requests, latencies, outcomes, offset):
+    for i in range(n_requests):
+        text = TEXTS[(offset + i) % len(TEXTS)]
+        start = time.perf_counter()
+        outcome = await request(text)
+        outcomes[outcome] += 1
+        # Rejections come back almost at once; only completed utterances are timed
+        if outcome == COMPLETED:
+            latencies.append(time.perf_counter() - start)
+
+
+async def run_level(request, concurrency, requests_per_client):
+    latencies = []
+    outcomes = {COMPLETED: 0, REJECTED: 0, FAILED: 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(request, requests_per_client, latencies, outcomes, c)
+                           for c in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (float("nan"),) * 3
+    return p50, p95, p99, len(latencies) / elapsed, outcomes[REJECTED], outcomes[FAILED]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uri", default="ws://localhost:8000/ws_tts")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=10, help="requests per client")
+    parser.add_argument("--simulate", action="store_true")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--batch-overhead-ms", type=float, default=40)
+    parser.add_argument("--item-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    scheduler = None
+    if args.simulate:
+        request, scheduler = make_simulated_request(args)
+    else:
+        request = lambda text: ws_request(args.uri, text)
+
+    print(f"{'clients':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'utt/s':>7} {'rejected':>8} {'failed':>6}")
+    for concurrency in args.concurrency:
+        p50, p95, p99, rate, rejected, failed = await run_level(request, concurrency, args.requests)
+        print(f"{concurrency:>7} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {rate:>7.1f} {rejected:>8} {failed:>6}")
+
+    if scheduler is not None:
+        scheduler.stop()
+        print(f"mean batch size: {scheduler.mean_batch_size:.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,78 +1,223 @@
+import time
+IMPORT_START = time.perf_counter()
+
+from contextlib import aclosing, asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 import torch
 import numpy as np
 import logging
+import os
 from speechbrain.inference.TTS import FastSpeech2 
 from speechbrain.inference.vocoders import HIFIGAN
 
+from tts_batching import BatchScheduler
+from tts_executor import InferenceExecutor, ServerBusy, BUSY_CLOSE_CODE
+from tts_streaming import stream_vocode, pipelined_stream, StreamTimer, LatencyStats
+from tts_text import split_sentences
+from tts_cache import SynthesisCache, cache_key
+from tts_formats import FORMATS, StreamEncoder, encode_stream
+from tts_lifecycle import ModelLifecycle
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_START
+
 # Setup logging to see errors in the console
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Streaming Multilingual TTS")
+# ------------------ Batching config ------------------
+# Concurrent requests are gathered into micro-batches of up to MAX_BATCH_SIZE,
+# waiting at most MAX_WAIT_MS after the first request for others to arrive.
+MAX_BATCH_SIZE = int(os.environ.get("TTS_MAX_BATCH_SIZE", 8))
+MAX_WAIT_MS = float(os.environ.get("TTS_MAX_WAIT_MS", 10))
+SAMPLE_RATE = 22050
+HOP_LENGTH = 256  # hop of the hifigan-libritts-22050Hz mel config
+
+# Admission control: requests beyond MAX_IN_FLIGHT running + MAX_QUEUE waiting
+# are closed with "busy" instead of piling up behind the batcher.
+MAX_IN_FLIGHT = int(os.environ.get("TTS_MAX_IN_FLIGHT", 2 * MAX_BATCH_SIZE))
+MAX_QUEUE = int(os.environ.get("TTS_MAX_QUEUE", 32))
+
+# ------------------ Streaming config ------------------
+# By default the scheduler batches the full pipeline: FastSpeech2 and HiFi-GAN
+# both run on the padded batch, and each sentence is sent once vocoded. With
+# TTS_STREAMING=1 only FastSpeech2 is batched; each mel is then vocoded per
+# request in overlapping windows and every chunk is sent as soon as it is
+# ready (earlier first audio, less throughput under concurrent load).
+STREAMING = os.environ.get("TTS_STREAMING", "0") == "1"
+CHUNK_FRAMES = int(os.environ.get("TTS_CHUNK_FRAMES", 40))
+FIRST_CHUNK_FRAMES = int(os.environ.get("TTS_FIRST_CHUNK_FRAMES", 16))
+CONTEXT_FRAMES = 10
+
+# Long texts are split into sentences of at most MAX_SENTENCE_CHARS; each is
+# submitted to the batcher separately, with up to SENTENCES_IN_FLIGHT
+# synthesized ahead of the sentence being streamed.
+MAX_SENTENCE_CHARS = int(os.environ.get("TTS_MAX_SENTENCE_CHARS", 200))
+SENTENCES_IN_FLIGHT = 2
 
 # ------------------ Load models ------------------
+# Loaded from the lifespan (see tts_lifecycle.py), not at import
 device = "cuda" if torch.cuda.is_available() else "cpu"
+mms_tts = None
+hifigan = None
+
+def load_models():
+    global mms_tts, hifigan
+    mms_tts = FastSpeech2.from_hparams(
+        source="speechbrain/tts-fastspeech2-mms",
+        savedir="pretrained_mms",
+        run_opts={"device": device}
+    )
+
+    hifigan = HIFIGAN.from_hparams(
+        source="speechbrain/tts-hifigan-libritts-22050Hz",
+        savedir="pretrained_hifigan",
+        run_opts={"device": device}
+    )
+
+# ------------------ Batched inference ------------------
+def fastspeech2_mel_lengths(durations, pace=1.0):
+    """
+    Real (unpadded) mel length of each item in a FastSpeech2 batch.
+    encode_text returns log-domain durations; this mirrors how the model
+    upsamples them: (pace * clamp(expm1(d), 0)).long() frames per token.
+    """
+    frames = (pace * torch.clamp(torch.special.expm1(durations), 0)).long()
+    return frames.sum(dim=-1)
+
+def synthesize_batch(texts):
+    """Run FastSpeech2 + HiFi-GAN on a padded batch, return one waveform per text."""
+    with torch.no_grad():
+        mel_output, durations, _, _ = mms_tts.encode_text(texts)
+        mel_lens = fastspeech2_mel_lengths(durations)
+        audio_tensor = hifigan.decode_batch(mel_output.to(device), mel_lens=mel_lens, hop_len=HOP_LENGTH)
+
+    audio = audio_tensor.squeeze(1).cpu().numpy()  # [B, T_audio]
+    # Drop the padding each item picked up from the longest one in the batch
+    return [audio[i, : int(mel_lens[i]) * HOP_LENGTH] for i in range(len(texts))]
+
+def acoustic_batch(texts):
+    """Run FastSpeech2 on a padded batch, return one unpadded [1, n_mels, T] mel per text."""
+    with torch.no_grad():
+        mel_output, durations, _, _ = mms_tts.encode_text(texts)
+        mel_lens = fastspeech2_mel_lengths(durations)
+    return [mel_output[i:i + 1, :, : int(mel_lens[i])] for i in range(len(texts))]
 
-mms_tts = FastSpeech2.from_hparams(
-    source="speechbrain/tts-fastspeech2-mms",
-    savedir="pretrained_mms",
-    run_opts={"device": device}
-)
+# ------------------ Streaming vocoder ------------------
+def vocode(mel):
+    return hifigan.decode_batch(mel.to(device)).reshape(-1).cpu().numpy()
 
-hifigan = HIFIGAN.from_hparams(
-    source="speechbrain/tts-hifigan-libritts-22050Hz",
-    savedir="pretrained_hifigan",
-    run_opts={"device": device}
-)
+def vocode_stream(mel):
+    yield from stream_vocode(vocode, mel, HOP_LENGTH, chunk_frames=CHUNK_FRAMES,
+                             first_chunk_frames=FIRST_CHUNK_FRAMES, context_frames=CONTEXT_FRAMES)
+
+scheduler = BatchScheduler(acoustic_batch if STREAMING else synthesize_batch,
+                           max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
+# The scheduler owns the acoustic model thread; the executor bounds admission
+# and runs the per-connection streaming vocoder
+limiter = InferenceExecutor(MAX_IN_FLIGHT, MAX_QUEUE)
+latency = LatencyStats()
+
+# Raw audio keyed by text/model; see tts_cache.py for TTS_CACHE_* settings
+MODEL_VERSION = "fastspeech2-mms+hifigan-libritts-22050"
+cache = SynthesisCache.from_env()
+
+async def vocode_chunks(output):
+    if STREAMING:
+        async for chunk in limiter.iterate(vocode_stream, output):
+            yield chunk
+    else:
+        chunk_size = 2048
+        for i in range(0, len(output), chunk_size):
+            yield output[i : i + chunk_size]
+
+# ------------------ Warm-up ------------------
+def warm_up(text):
+    """Blocking end-to-end synthesis at batch size 1 and MAX_BATCH_SIZE, bypassing the scheduler."""
+    sentences = split_sentences(text, MAX_SENTENCE_CHARS)
+    outputs = scheduler.batch_fn(sentences[:1])
+    scheduler.batch_fn((sentences * MAX_BATCH_SIZE)[:MAX_BATCH_SIZE])
+    if STREAMING:
+        for _ in vocode_stream(outputs[0]):
+            pass
+
+lifecycle = ModelLifecycle(load=load_models, warm_up=warm_up)
+lifecycle.mark("import", IMPORT_SECONDS)
+
+async def synthesize_chunks(text):
+    # Only cache misses count against admission
+    async with limiter.limit():
+        # 1. The acoustic model runs in the scheduler's worker thread, one
+        # sentence at a time, batched with other requests' sentences and
+        # running ahead of the sentence currently being streamed
+        # 2. Streaming: HiFi-GAN decodes window by window and each chunk goes
+        # out immediately. Otherwise the scheduler already vocoded the sentence.
+        chunks = pipelined_stream(
+            split_sentences(text, MAX_SENTENCE_CHARS),
+            scheduler.submit,
+            vocode_chunks,
+            max_in_flight=SENTENCES_IN_FLIGHT,
+        )
+        async for chunk in chunks:
+            yield chunk.astype(np.float32).tobytes()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Serve /healthz while the models load and warm up in the background
+    lifecycle.start()
+    scheduler.start()
+    yield
+    scheduler.stop()
+    limiter.shutdown()
+    logger.info(f"Scheduler served {scheduler.requests} requests in {scheduler.batches} batches "
+                f"(mean batch size {scheduler.mean_batch_size:.2f})")
+
+app = FastAPI(title="Streaming Multilingual TTS", lifespan=lifespan)
+lifecycle.add_routes(app)
+
+@app.get("/metrics")
+def metrics():
+    return {**limiter.metrics(), "batches": scheduler.batches,
+            "mean_batch_size": scheduler.mean_batch_size, "latency": latency.summary(),
+            "cache": cache.stats(), "startup": lifecycle.report()}
 
 @app.websocket("/ws_tts")
-async def websocket_tts(ws: WebSocket):
+async def websocket_tts(ws: WebSocket, format: str = "float32"):
     await ws.accept()
+    if not lifecycle.ready:
+        await ws.close(code=BUSY_CLOSE_CODE, reason="warming up")
+        return
+    if format not in FORMATS:
+        await ws.close(code=1008, reason="unknown format")
+        return
     try:
         text = await ws.receive_text()
         logger.info(f"Processing text: {text}")
 
-        with torch.no_grad():
-            # 1. Standardize text encoding
-            # Some SpeechBrain versions require the text to be wrapped in a list for batching
-            # and may need the specific 'encode_text' or 'generate_mel' method.
-            
-            # TRY THIS: Wrap text in a list to provide a batch dimension
-            outputs = mms_tts.encode_text([text]) 
-            
-            # 2. Handle the output tuple
-            # FastSpeech2 returns (mel_postnet, postnet_loss, durations, etc.)
-            # We need the FIRST element which is the mel-spectrogram
-            if isinstance(outputs, (tuple, list)):
-                mel_output = outputs[0]
-            else:
-                mel_output = outputs
-
-            # 3. Decode to Audio
-            # Ensure the mel_output is on the correct device
-            audio_tensor = hifigan.decode_batch(mel_output.to(device))
-            
-        # 4. Prepare for streaming
-        audio = audio_tensor.squeeze().cpu().numpy()
-
-        # Check if audio was actually generated
-        if audio.size == 0:
-            logger.error("Generated audio is empty")
-            return
+        timer = StreamTimer()
 
-        chunk_size = 2048
-        for i in range(0, len(audio), chunk_size):
-            chunk = audio[i : i + chunk_size]
-            await ws.send_bytes(chunk.astype(np.float32).tobytes())
+        key = cache_key(text, model=MODEL_VERSION)
+        # The cache holds float32; each connection encodes to its own format
+        # Closed right away if the client goes: waiters on this synthesis must not wait for GC
+        async with aclosing(cache.stream(key, lambda: synthesize_chunks(text), chunk_size=2048 * 4)) as chunks:
+            async for chunk in encode_stream(chunks, StreamEncoder(format, SAMPLE_RATE)):
+                await ws.send_bytes(chunk)
+                timer.chunk_sent()
 
-        logger.info("Streaming complete")
+        timer.finish()
+        latency.record(timer)
+        if timer.ttfb is not None:
+            logger.info(f"Time to first audio {timer.ttfb * 1000:.0f} ms, "
+                        f"total {timer.total * 1000:.0f} ms")
         
+    except ServerBusy:
+        logger.warning("Server busy, rejecting request")
+        await ws.close(code=BUSY_CLOSE_CODE, reason="busy")
+    except WebSocketDisconnect:
+        logger.info("Client disconnected")
     except Exception as e:
-        # This will now catch the exact line causing the "list index" error
         logger.error(f"Error during TTS processing: {str(e)}", exc_info=True)
     finally:
         try:
             await ws.close()
         except:
-            pass
\ No newline at end of file
+            pass
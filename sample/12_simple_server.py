@@ -1,7 +1,6 @@
 from melo.api import TTS
 import soundfile as sf
 import torch
-import librosa
 
 # 1. Setup Device
 # ------------------ Device ------------------
@@ -25,13 +24,12 @@ indian_speaker_id = speaker_ids['EN_INDIA']
 # Since there is no native Devanagari (Hindi script) support, 
 # write your Hindi words using Latin (Hinglish) characters.
 text = "Namasteeee! Mera naam Gemini hai. I can speak a mix of Hindi and English fluently."
-temp_output = "indian_accent_test.wav"
 
-model.tts_to_file(text, indian_speaker_id, temp_output, speed=1.0)
+# output_path=None returns the waveform in memory instead of via a temp file
+audio_np = model.tts_to_file(text, indian_speaker_id, None, speed=1.0, quiet=True)
 
-# 5. Save and Load
+# 5. Save
 sampling_rate = model.hps.data.sampling_rate
-audio_np, _ = librosa.load(temp_output, sr=sampling_rate)
 sf.write("melo_hindi_english.wav", audio_np, sampling_rate)
 
 print(f"Success! Generated audio with {indian_speaker_id} accent.")
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+MeloTTS Server (in-memory)
+Text → MeloTTS → Waveform, over the same /tts (WAV) and /ws_tts (streaming)
+contracts as the other sample servers. The model and speaker table stay
+resident; audio never touches the disk.
+"""
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+import os
+
+from melo_service import MeloService
+from tts_executor import InferenceExecutor, ServerBusy, BUSY_CLOSE_CODE
+from tts_formats import FORMATS, MEDIA_TYPES, StreamEncoder, encode_stream, output_rate, stream_file
+
+# ------------------ Config ------------------
+MELO_LANGUAGE = os.environ.get("TTS_MELO_LANGUAGE", "EN")
+DEFAULT_SPEAKER = os.environ.get("TTS_MELO_SPEAKER", "EN-Default")
+INFERENCE_WORKERS = int(os.environ.get("TTS_INFERENCE_WORKERS", 2))
+MAX_QUEUE = int(os.environ.get("TTS_MAX_QUEUE", 16))
+
+# ------------------ Load model once ------------------
+melo = MeloService(language=MELO_LANGUAGE)
+SAMPLE_RATE = melo.sample_rate
+
+# The model object is shared, so a thread pool only (no process pool)
+executor = InferenceExecutor(INFERENCE_WORKERS, MAX_QUEUE)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    executor.shutdown()
+
+app = FastAPI(title="MeloTTS Server", lifespan=lifespan)
+
+# ------------------ Request Schema ------------------
+class TTSRequest(BaseModel):
+    text: str
+    language: str = "en"
+    speaker: str = DEFAULT_SPEAKER
+    speed: float = Field(1.0, gt=0)  # > 1 is faster; 0 or less is a 422
+    format: str = "pcm16"  # float32 | pcm16 | mulaw | opus
+
+def check_speaker(speaker):
+    if speaker not in melo.spk2id:
+        raise HTTPException(status_code=400, detail=f"Unknown speaker, expected one of {melo.speakers}")
+
+@app.get("/metrics")
+def metrics():
+    return executor.metrics()
+
+# ------------------ HTTP endpoint ------------------
+@app.post("/tts")
+async def tts(req: TTSRequest):
+    if not req.text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    check_speaker(req.speaker)
+    if req.format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of {FORMATS}")
+
+    # The first sentence is synthesized before responding, so a full server
+    # is still a 503; the rest follows sentence by sentence (chunked transfer)
+    sentences = executor.stream(melo.synthesize_sentences, req.text, req.speaker, req.speed)
+    try:
+        first = await sentences.__anext__()
+    except ServerBusy:
+        raise HTTPException(status_code=503, detail="Server busy")
+    except StopAsyncIteration:
+        raise HTTPException(status_code=400, detail="Nothing to synthesize")
+
+    async def audio():
+        yield first
+        async for sentence in sentences:
+            yield sentence
+
+    return StreamingResponse(
+        stream_file(audio(), SAMPLE_RATE, req.format),
+        media_type=MEDIA_TYPES[req.format],
+        headers={
+            "X-Sample-Rate": str(output_rate(req.format, SAMPLE_RATE)),
+            "X-Format": req.format,
+            "X-Language": req.language,
+            "X-Speaker": req.speaker,
+            "X-Engine": "melotts"
+        }
+    )
+
+# ------------------ WebSocket endpoint ------------------
+# ws://host/ws_tts?speaker=EN_INDIA&format=pcm16 — send the text, receive audio
+# (float32 by default) one sentence at a time as soon as MeloTTS has produced it.
+# An invalid query (e.g. speed=0) is closed with 1008 before the handshake completes.
+@app.websocket("/ws_tts")
+async def websocket_tts(ws: WebSocket, speaker: str = DEFAULT_SPEAKER, speed: float = Query(1.0, gt=0),
+                        format: str = "float32"):
+    await ws.accept()
+    if speaker not in melo.spk2id:
+        await ws.close(code=1008, reason="unknown speaker")
+        return
+    if format not in FORMATS:
+        await ws.close(code=1008, reason="unknown format")
+        return
+    encoder = StreamEncoder(format, SAMPLE_RATE)
+    try:
+        text = await ws.receive_text()
+
+        sentences = executor.stream(melo.synthesize_sentences, text, speaker, speed)
+        async for chunk in encode_stream(sentences, encoder):
+            await ws.send_bytes(chunk)
+
+        await ws.close()
+
+    except ServerBusy:
+        await ws.close(code=BUSY_CLOSE_CODE, reason="busy")
+    except WebSocketDisconnect:
+        print("Client disconnected")
@@ -0,0 +1,239 @@
+"""
+Multi-model TTS server
+Text + language → ModelRegistry → (acoustic model → shared HiFi-GAN | MeloTTS) → Waveform
+
+One process serves every language in the catalog below. Models are loaded on
+first request for their language, HiFi-GAN is loaded once for every acoustic
+model with the 22050 Hz / 80-mel config, and idle models are evicted when
+TTS_MODEL_BUDGET_MB is exceeded (see tts_registry.py).
+"""
+import time
+IMPORT_START = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+import logging
+import os
+import torch
+from speechbrain.inference.TTS import Tacotron2, FastSpeech2
+from speechbrain.inference.vocoders import HIFIGAN
+
+from tts_executor import InferenceExecutor, ServerBusy, BUSY_CLOSE_CODE
+from tts_formats import FORMATS, MEDIA_TYPES, StreamEncoder, encode_stream, output_rate, stream_file
+from tts_lifecycle import ModelLifecycle
+from tts_registry import ModelRegistry, MelConfig, UnknownLanguage
+from tts_text import split_sentences
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_START
+
+logging.basicConfig(level=logging.INFO)
+
+# ------------------ Config ------------------
+INFERENCE_WORKERS = int(os.environ.get("TTS_INFERENCE_WORKERS", 2))
+MAX_QUEUE = int(os.environ.get("TTS_MAX_QUEUE", 16))
+MAX_SENTENCE_CHARS = int(os.environ.get("TTS_MAX_SENTENCE_CHARS", 200))
+# Languages loaded (and warmed up) at startup; everything else loads on first use
+PRELOAD_LANGUAGES = [l for l in os.environ.get("TTS_PRELOAD_LANGUAGES", "en").split(",") if l]
+# Extra routes, e.g. TTS_ROUTES="en=fastspeech2-mms,hi=melo-en"
+ROUTES = [r.split("=", 1) for r in os.environ.get("TTS_ROUTES", "").split(",") if r]
+
+device = "cuda" if torch.cuda.is_available() else "cpu"
+run_opts = {"device": device}
+
+# ------------------ Model wrappers ------------------
+class Tacotron2Voice:
+    def __init__(self, source, savedir):
+        self.model = Tacotron2.from_hparams(source=source, savedir=savedir, run_opts=run_opts)
+
+    def mel(self, sentence):
+        with torch.no_grad():
+            mel_output, _, _ = self.model.encode_text(sentence)
+        return mel_output  # [1, n_mels, T]
+
+class FastSpeech2Voice:
+    def __init__(self, source, savedir):
+        self.model = FastSpeech2.from_hparams(source=source, savedir=savedir, run_opts=run_opts)
+
+    def mel(self, sentence):
+        with torch.no_grad():
+            mel_output, _, _, _ = self.model.encode_text([sentence])
+        return mel_output
+
+class HifiGanVocoder:
+    def __init__(self, source, savedir):
+        self.model = HIFIGAN.from_hparams(source=source, savedir=savedir, run_opts=run_opts)
+
+    def vocode(self, mel):
+        with torch.no_grad():
+            return self.model.decode_batch(mel.to(device)).reshape(-1).cpu().numpy()
+
+def melo_voice(language):
+    # Imported on demand: MeloTTS is only needed if one of its languages is requested
+    from melo_service import MeloService
+    return MeloService(language=language, device=device)
+
+# ------------------ Model catalog ------------------
+# Both SpeechBrain acoustic models emit the LibriTTS HiFi-GAN's mel config,
+# so they share one vocoder; MeloTTS is end to end and reports its own
+# sample rate (from its config) once loaded.
+HIFIGAN_22K = MelConfig(sample_rate=22050, n_mels=80, hop_length=256, f_min=0.0, f_max=8000.0)
+
+registry = ModelRegistry.from_env()
+registry.add_vocoder("hifigan-libritts-22050",
+                     lambda: HifiGanVocoder("speechbrain/tts-hifigan-libritts-22050Hz", "pretrained_hifigan"),
+                     HIFIGAN_22K)
+registry.add_acoustic("tacotron2-ljspeech",
+                      lambda: Tacotron2Voice("speechbrain/tts-tacotron2-ljspeech", "pretrained_tts"),
+                      languages=["en"], mel_config=HIFIGAN_22K)
+registry.add_acoustic("fastspeech2-mms",
+                      lambda: FastSpeech2Voice("speechbrain/tts-fastspeech2-mms", "pretrained_mms"),
+                      languages=["en-us"], mel_config=HIFIGAN_22K)
+for code, melo_language in [("es", "ES"), ("fr", "FR"), ("zh", "ZH"), ("ja", "JP"), ("ko", "KR")]:
+    registry.add_acoustic(f"melo-{code}", lambda melo_language=melo_language: melo_voice(melo_language),
+                          languages=[code])
+for language, name in ROUTES:
+    registry.route(language, name)
+
+# Models are shared objects, so a thread pool only (no process pool)
+executor = InferenceExecutor(INFERENCE_WORKERS, MAX_QUEUE)
+
+# ------------------ Inference ------------------
+def synthesize_sentences(pipeline, text):
+    """Blocking: one float32 waveform per sentence, advanced on the executor."""
+    if pipeline.vocoder is None:
+        melo = pipeline.acoustic
+        yield from melo.synthesize_sentences(text, melo.speakers[0])
+        return
+    for sentence in split_sentences(text, MAX_SENTENCE_CHARS):
+        yield pipeline.vocoder.vocode(pipeline.acoustic.mel(sentence))
+
+async def synthesize(language, text):
+    """
+    Yields the pipeline for `language`, then the audio chunks for `text`.
+
+    The request is admitted first: loading a cold model is blocking too, so it
+    runs on the executor inside the request's slot and a full server rejects
+    it before any load starts. The pipeline is released when done or abandoned.
+    """
+    async with executor.limit():
+        pipeline = await executor.call(registry.acquire, language)
+        try:
+            yield pipeline
+            async for chunk in executor.iterate(synthesize_sentences, pipeline, text):
+                yield chunk
+        finally:
+            registry.release(pipeline)
+
+# ------------------ Warm-up ------------------
+def load_models():
+    for language in PRELOAD_LANGUAGES:
+        registry.release(registry.acquire(language))
+
+def warm_up(text):
+    for language in PRELOAD_LANGUAGES:
+        with registry.use(language) as pipeline:
+            for _ in synthesize_sentences(pipeline, text):
+                pass
+
+lifecycle = ModelLifecycle(load=load_models, warm_up=warm_up)
+lifecycle.mark("import", IMPORT_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app):
+    lifecycle.start()
+    yield
+    executor.shutdown()
+
+app = FastAPI(title="Multi-model TTS Server", lifespan=lifespan)
+lifecycle.add_routes(app)
+
+# ------------------ Request Schema ------------------
+class TTSRequest(BaseModel):
+    text: str
+    language: str = "en"
+    format: str = "pcm16"  # float32 | pcm16 | mulaw | opus
+
+@app.get("/metrics")
+def metrics():
+    return {**executor.metrics(), "models": registry.stats(), "startup": lifecycle.report()}
+
+@app.get("/models")
+def models():
+    return {"languages": registry.languages, **registry.stats()}
+
+# ------------------ HTTP endpoint ------------------
+@app.post("/tts")
+async def tts(req: TTSRequest):
+    if not lifecycle.ready:
+        raise HTTPException(status_code=503, detail="Warming up")
+    if not req.text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    if req.format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of {FORMATS}")
+    try:
+        model = registry.resolve(req.language)
+    except UnknownLanguage as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # The first sentence is synthesized before responding, so a full server is still a 503
+    chunks = synthesize(req.language, req.text)
+    try:
+        pipeline = await chunks.__anext__()
+        first = await chunks.__anext__()
+    except ServerBusy:
+        raise HTTPException(status_code=503, detail="Server busy")
+    except StopAsyncIteration:
+        raise HTTPException(status_code=400, detail="Nothing to synthesize")
+
+    async def audio():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(
+        stream_file(audio(), pipeline.sample_rate, req.format),
+        media_type=MEDIA_TYPES[req.format],
+        headers={
+            "X-Sample-Rate": str(output_rate(req.format, pipeline.sample_rate)),
+            "X-Format": req.format,
+            "X-Language": req.language,
+            "X-Model": model,
+        }
+    )
+
+# ------------------ WebSocket endpoint ------------------
+# ws://host/ws_tts?language=fr&format=pcm16 — send the text, receive audio one sentence at a time
+@app.websocket("/ws_tts")
+async def websocket_tts(ws: WebSocket, language: str = "en", format: str = "float32"):
+    await ws.accept()
+    if not lifecycle.ready:
+        await ws.close(code=BUSY_CLOSE_CODE, reason="warming up")
+        return
+    if format not in FORMATS:
+        await ws.close(code=1008, reason="unknown format")
+        return
+    try:
+        registry.resolve(language)
+    except UnknownLanguage:
+        await ws.close(code=1008, reason="unknown language")
+        return
+    try:
+        text = await ws.receive_text()
+
+        chunks = synthesize(language, text)
+        try:
+            pipeline = await chunks.__anext__()
+            encoder = StreamEncoder(format, pipeline.sample_rate)
+            async for chunk in encode_stream(chunks, encoder):
+                await ws.send_bytes(chunk)
+        finally:
+            await chunks.aclose()
+
+        await ws.close()
+
+    except ServerBusy:
+        await ws.close(code=BUSY_CLOSE_CODE, reason="busy")
+    except WebSocketDisconnect:
+        print("Client disconnected")
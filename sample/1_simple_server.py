@@ -1,23 +1,24 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
 import numpy as np
-import soundfile as sf
-import io
+
+from tts_formats import FORMATS, MEDIA_TYPES, iter_file
 
 app = FastAPI()
 
 class TTSRequest(BaseModel):
     text: str
     language: str = "en"
+    format: str = "pcm16"  # float32 | pcm16 | mulaw | opus
 
 @app.post("/tts")
 def tts(req: TTSRequest):
+    if req.format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of {FORMATS}")
+
     # Dummy audio
     audio = np.random.randn(22050).astype(np.float32)
 
-    buffer = io.BytesIO()
-    sf.write(buffer, audio, 22050, format="WAV")
-    buffer.seek(0)
-
-    return StreamingResponse(buffer, media_type="audio/wav")
+    # WAV header, then the samples straight from the array's buffer
+    return StreamingResponse(iter_file(audio, 22050, req.format), media_type=MEDIA_TYPES[req.format])
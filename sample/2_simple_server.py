@@ -6,35 +6,51 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
 import numpy as np
-import soundfile as sf
-import io
+
+from tts_cache import SynthesisCache, cache_key
+from tts_formats import FORMATS, MEDIA_TYPES, encode_file, iter_bytes, output_rate
 
 app = FastAPI(title="Simple TTS Server")
 
 SAMPLE_RATE = 22050
+MODEL_VERSION = "sine-440hz-v1"
+
+# Encoded audio keyed by text/language/model/format; see tts_cache.py for TTS_CACHE_* settings
+cache = SynthesisCache.from_env()
 
 class TTSRequest(BaseModel):
     text: str
     language: str = "en"
+    format: str = "pcm16"  # float32 | pcm16 | mulaw | opus
+
+def render_audio(fmt):
+    # 🔊 1-second sine wave (A4 = 440 Hz)
+    t = np.linspace(0, 1, SAMPLE_RATE, endpoint=False)
+    audio = 0.2 * np.sin(2 * np.pi * 440 * t).astype(np.float32)
+
+    return encode_file(audio, SAMPLE_RATE, fmt)
+
+@app.get("/metrics")
+def metrics():
+    return {"cache": cache.stats()}
 
 @app.post("/tts")
 def tts(req: TTSRequest):
     if not req.text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
+    if req.format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of {FORMATS}")
 
-    # 🔊 1-second sine wave (A4 = 440 Hz)
-    t = np.linspace(0, 1, SAMPLE_RATE, endpoint=False)
-    audio = 0.2 * np.sin(2 * np.pi * 440 * t).astype(np.float32)
-
-    buffer = io.BytesIO()
-    sf.write(buffer, audio, SAMPLE_RATE, format="WAV")
-    buffer.seek(0)
+    key = cache_key(req.text, req.language, model=MODEL_VERSION, format=req.format)
+    audio = cache.get_or_compute(key, lambda: render_audio(req.format))
 
     return StreamingResponse(
-        buffer,
-        media_type="audio/wav",
+        iter_bytes(audio),
+        media_type=MEDIA_TYPES[req.format],
         headers={
-            "X-Sample-Rate": str(SAMPLE_RATE),
+            "Content-Length": str(len(audio)),
+            "X-Sample-Rate": str(output_rate(req.format, SAMPLE_RATE)),
+            "X-Format": req.format,
             "X-Language": req.language
         }
     )
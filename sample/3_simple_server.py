@@ -6,8 +6,9 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
 import numpy as np
-import soundfile as sf
-import io
+
+from tts_cache import SynthesisCache, cache_key
+from tts_formats import FORMATS, MEDIA_TYPES, encode_file, iter_bytes, output_rate
 
 # ------------------------------------------------------------------
 # App Config
@@ -15,6 +16,10 @@ import io
 app = FastAPI(title="From-Scratch TTS Server")
 
 SAMPLE_RATE = 22050
+MODEL_VERSION = "from-scratch-dsp-v1"
+
+# Encoded audio keyed by text/language/model/format; see tts_cache.py for TTS_CACHE_* settings
+cache = SynthesisCache.from_env()
 
 # ------------------------------------------------------------------
 # Request Schema
@@ -22,6 +27,7 @@ SAMPLE_RATE = 22050
 class TTSRequest(BaseModel):
     text: str
     language: str = "en"
+    format: str = "pcm16"  # float32 | pcm16 | mulaw | opus
 
 # ------------------------------------------------------------------
 # DSP-based Speech-like Synth (Placeholder for ML)
@@ -54,25 +60,35 @@ def synthesize_speech_like(text: str, sample_rate: int) -> np.ndarray:
 
     return signal.astype(np.float32)
 
+def render_audio(text: str, fmt: str) -> bytes:
+    audio = synthesize_speech_like(text, SAMPLE_RATE)
+
+    return encode_file(audio, SAMPLE_RATE, fmt)
+
 # ------------------------------------------------------------------
 # TTS Endpoint
 # ------------------------------------------------------------------
+@app.get("/metrics")
+def metrics():
+    return {"cache": cache.stats()}
+
 @app.post("/tts")
 def tts(req: TTSRequest):
     if not req.text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
+    if req.format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of {FORMATS}")
 
-    audio = synthesize_speech_like(req.text, SAMPLE_RATE)
-
-    buffer = io.BytesIO()
-    sf.write(buffer, audio, SAMPLE_RATE, format="WAV")
-    buffer.seek(0)
+    key = cache_key(req.text, req.language, model=MODEL_VERSION, format=req.format)
+    audio = cache.get_or_compute(key, lambda: render_audio(req.text, req.format))
 
     return StreamingResponse(
-        buffer,
-        media_type="audio/wav",
+        iter_bytes(audio),
+        media_type=MEDIA_TYPES[req.format],
         headers={
-            "X-Sample-Rate": str(SAMPLE_RATE),
+            "Content-Length": str(len(audio)),
+            "X-Sample-Rate": str(output_rate(req.format, SAMPLE_RATE)),
+            "X-Format": req.format,
             "X-Language": req.language,
             "X-Engine": "from-scratch-dsp"
         }
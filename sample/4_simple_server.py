@@ -8,8 +8,11 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
 import numpy as np
-import soundfile as sf
-import io
+import zlib
+
+from tts_cache import SynthesisCache, cache_key
+from tts_formats import FORMATS, MEDIA_TYPES, encode_file, iter_bytes, output_rate
+from tts_frontend import frontend
 
 # --------------------------------------------------
 # App
@@ -17,6 +20,11 @@ import io
 app = FastAPI(title="From-Scratch TTS Server")
 
 SAMPLE_RATE = 22050
+# Part of every cache key: bump it whenever the synth's output changes
+MODEL_VERSION = "from-scratch-phoneme-dsp-v2"
+
+# Encoded audio keyed by text/language/model/format; see tts_cache.py for TTS_CACHE_* settings
+cache = SynthesisCache.from_env()
 
 # --------------------------------------------------
 # Request Schema
@@ -24,28 +32,17 @@ SAMPLE_RATE = 22050
 class TTSRequest(BaseModel):
     text: str
     language: str = "en"
+    format: str = "pcm16"  # float32 | pcm16 | mulaw | opus
 
 # --------------------------------------------------
-# Simple rule-based phonemizer (English only)
+# Phonemizer (shared frontend, see tts_frontend.py)
 # --------------------------------------------------
-PHONEME_MAP = {
-    "a": "AH", "b": "B", "c": "K", "d": "D", "e": "EH",
-    "f": "F", "g": "G", "h": "HH", "i": "IH", "j": "JH",
-    "k": "K", "l": "L", "m": "M", "n": "N", "o": "OW",
-    "p": "P", "q": "K", "r": "R", "s": "S", "t": "T",
-    "u": "UH", "v": "V", "w": "W", "x": "KS", "y": "Y",
-    "z": "Z",
-    " ": "SP"
-}
-
 def phonemize(text: str):
     """
     Convert text to a phoneme sequence.
     VERY naive, but linguistically meaningful.
     """
-    phonemes = []
-    for ch in text.lower():
-        phonemes.append(PHONEME_MAP.get(ch, "SP"))
+    phonemes, _ = frontend.phonemize(text)
     return phonemes
 
 # --------------------------------------------------
@@ -54,12 +51,15 @@ def phonemize(text: str):
 def synthesize_from_phonemes(phonemes, sr: int) -> np.ndarray:
     """
     Generate speech-shaped audio using phoneme timing.
+    Deterministic for a phoneme sequence (stable pitches, seeded noise), so
+    cached audio from any process matches a fresh synthesis.
     """
 
     phoneme_duration = 0.08  # seconds per phoneme
     total_duration = max(len(phonemes) * phoneme_duration, 0.5)
 
     signal = []
+    rng = np.random.default_rng(zlib.crc32(" ".join(phonemes).encode()))
 
     for ph in phonemes:
         length = int(sr * phoneme_duration)
@@ -69,11 +69,12 @@ def synthesize_from_phonemes(phonemes, sr: int) -> np.ndarray:
         if ph == "SP":
             frame = np.zeros(length)
         else:
-            # Map phoneme to base frequency (fake articulation)
-            base_freq = 100 + (hash(ph) % 200)
+            # Map phoneme to base frequency (fake articulation); crc32, unlike
+            # hash(), is the same in every process whatever PYTHONHASHSEED is
+            base_freq = 100 + (zlib.crc32(ph.encode()) % 200)
 
             voiced = np.sin(2 * np.pi * base_freq * t)
-            noise = np.random.randn(length) * 0.2
+            noise = rng.standard_normal(length) * 0.2
 
             frame = 0.8 * voiced + 0.2 * noise
 
@@ -90,26 +91,36 @@ def synthesize_from_phonemes(phonemes, sr: int) -> np.ndarray:
 
     return signal.astype(np.float32)
 
+def render_audio(phonemes, fmt) -> bytes:
+    audio = synthesize_from_phonemes(phonemes, SAMPLE_RATE)
+
+    return encode_file(audio, SAMPLE_RATE, fmt)
+
 # --------------------------------------------------
 # TTS Endpoint
 # --------------------------------------------------
+@app.get("/metrics")
+def metrics():
+    return {"cache": cache.stats()}
+
 @app.post("/tts")
 def tts(req: TTSRequest):
     if not req.text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
+    if req.format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of {FORMATS}")
 
     phonemes = phonemize(req.text)
-    audio = synthesize_from_phonemes(phonemes, SAMPLE_RATE)
-
-    buffer = io.BytesIO()
-    sf.write(buffer, audio, SAMPLE_RATE, format="WAV")
-    buffer.seek(0)
+    key = cache_key(req.text, req.language, model=MODEL_VERSION, format=req.format)
+    audio = cache.get_or_compute(key, lambda: render_audio(phonemes, req.format))
 
     return StreamingResponse(
-        buffer,
-        media_type="audio/wav",
+        iter_bytes(audio),
+        media_type=MEDIA_TYPES[req.format],
         headers={
-            "X-Sample-Rate": str(SAMPLE_RATE),
+            "Content-Length": str(len(audio)),
+            "X-Sample-Rate": str(output_rate(req.format, SAMPLE_RATE)),
+            "X-Format": req.format,
             "X-Language": req.language,
             "X-Engine": "from-scratch-phoneme-dsp",
             "X-Phoneme-Count": str(len(phonemes))
@@ -9,6 +9,8 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 import numpy as np
 
+from tts_frontend import frontend
+
 # --------------------------------------------------
 # App
 # --------------------------------------------------
@@ -26,33 +28,12 @@ class TTSRequest(BaseModel):
     language: str = "en"
 
 # --------------------------------------------------
-# Simple rule-based phonemizer (English only)
+# Phonemizer (shared frontend, see tts_frontend.py)
 # --------------------------------------------------
-PHONEME_MAP = {
-    "a": "AH", "b": "B", "c": "K", "d": "D", "e": "EH",
-    "f": "F", "g": "G", "h": "HH", "i": "IH", "j": "JH",
-    "k": "K", "l": "L", "m": "M", "n": "N", "o": "OW",
-    "p": "P", "q": "K", "r": "R", "s": "S", "t": "T",
-    "u": "UH", "v": "V", "w": "W", "x": "KS", "y": "Y",
-    "z": "Z",
-    " ": "SP"
-}
-
-PHONEMES = sorted(set(PHONEME_MAP.values()))
-PHONEME_ID_MAP = {p: i for i, p in enumerate(PHONEMES)}
-
 def phonemize(text: str):
-    phonemes = []
-    phoneme_ids = []
-    durations = []
-
-    for ch in text.lower():
-        ph = PHONEME_MAP.get(ch, "SP")
-        phonemes.append(ph)
-        phoneme_ids.append(PHONEME_ID_MAP[ph])
-        durations.append(FRAMES_PER_PHONEME)
-
-    return phonemes, phoneme_ids, durations
+    phonemes, phoneme_ids = frontend.phonemize(text)
+    durations = [FRAMES_PER_PHONEME] * len(phonemes)
+    return phonemes, phoneme_ids.tolist(), durations
 
 # --------------------------------------------------
 # Mel-spectrogram placeholder
@@ -0,0 +1,76 @@
+"""
+Micro-benchmark for sample.6_simple_server
+Per-request latency (phonemize → acoustic model → vocoder) against text length,
+comparing the vectorized pipeline with the original per-phoneme / per-frame loops.
+
+Run from the sample directory:
+    python ./6_simple_benchmark.py
+"""
+import importlib
+import time
+
+import numpy as np
+
+server = importlib.import_module("6_simple_server")
+
+TEXT_LENGTHS = [16, 64, 256, 1024, 4096]
+REPEATS = 20
+BASE_TEXT = "hello this is a from scratch tts system "
+
+# --------------------------------------------------
+# Reference: the original loop implementations
+# --------------------------------------------------
+def loop_infer(model, phoneme_ids, durations):
+    total_frames = int(durations.sum())
+    mel = np.zeros((server.N_MELS, total_frames), dtype=np.float32)
+    frame = 0
+    for pid, dur in zip(phoneme_ids, durations):
+        mel_frame = model.phoneme_embeddings[pid] @ model.projection
+        mel[:, frame : frame + dur] = mel_frame[:, None]
+        frame += dur
+    return mel / (np.max(np.abs(mel)) + 1e-6)
+
+def loop_synthesize(mel):
+    T = mel.shape[1]
+    waveform = np.zeros(T * server.SAMPLES_PER_FRAME, dtype=np.float32)
+    for t in range(T):
+        freq = 220 + 880 * np.tanh(mel[0, t])
+        frame_samples = np.arange(server.SAMPLES_PER_FRAME)
+        sine_wave = np.sin(2 * np.pi * freq * frame_samples / server.SAMPLE_RATE)
+        waveform[t*server.SAMPLES_PER_FRAME:(t+1)*server.SAMPLES_PER_FRAME] = sine_wave
+    waveform /= np.max(np.abs(waveform) + 1e-6)
+    return waveform
+
+def vectorized_request(text):
+    _, phoneme_ids, durations = server.phonemize(text)
+    mel = server.acoustic_model.infer(phoneme_ids, durations)
+    return server.vocoder.synthesize(mel)
+
+def loop_request(text):
+    _, phoneme_ids, durations = server.phonemize(text)
+    mel = loop_infer(server.acoustic_model, phoneme_ids, durations)
+    return loop_synthesize(mel)
+
+def best_of(fn, text):
+    fn(text)  # warm-up
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+if __name__ == "__main__":
+    # Both paths must produce the same mel
+    _, ids, durs = server.phonemize(BASE_TEXT)
+    assert np.allclose(server.acoustic_model.infer(ids, durs),
+                       loop_infer(server.acoustic_model, ids, durs), atol=1e-5)
+
+    print(f"{'chars':>6} {'audio s':>8} {'loop ms':>9} {'vector ms':>10} {'speedup':>8} {'us/char':>8}")
+    for n in TEXT_LENGTHS:
+        text = (BASE_TEXT * (n // len(BASE_TEXT) + 1))[:n]
+        audio_s = n * server.FRAMES_PER_PHONEME * server.SAMPLES_PER_FRAME / server.SAMPLE_RATE
+        loop_ms = best_of(loop_request, text)
+        vec_ms = best_of(vectorized_request, text)
+        print(f"{n:>6} {audio_s:>8.1f} {loop_ms:>9.2f} {vec_ms:>10.2f} "
+              f"{loop_ms / vec_ms:>7.1f}x {vec_ms * 1000 / n:>8.2f}")
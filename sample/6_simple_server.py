@@ -7,8 +7,11 @@ from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import numpy as np
-import soundfile as sf
-import io
+import hashlib
+
+from tts_cache import SynthesisCache, cache_key
+from tts_formats import FORMATS, MEDIA_TYPES, encode_file, iter_bytes, output_rate
+from tts_frontend import frontend, PHONEMES
 
 # --------------------------------------------------
 # App
@@ -30,34 +33,16 @@ SAMPLES_PER_FRAME = 256  # how many waveform samples per mel frame
 class TTSRequest(BaseModel):
     text: str
     language: str = "en"
+    format: str = "pcm16"  # float32 | pcm16 | mulaw | opus
 
 # --------------------------------------------------
-# Phonemizer
+# Phonemizer (shared frontend, see tts_frontend.py)
 # --------------------------------------------------
-PHONEME_MAP = {
-    "a": "AH", "b": "B", "c": "K", "d": "D", "e": "EH",
-    "f": "F", "g": "G", "h": "HH", "i": "IH", "j": "JH",
-    "k": "K", "l": "L", "m": "M", "n": "N", "o": "OW",
-    "p": "P", "q": "K", "r": "R", "s": "S", "t": "T",
-    "u": "UH", "v": "V", "w": "W", "x": "KS", "y": "Y",
-    "z": "Z",
-    " ": "SP"
-}
-
-PHONEMES = sorted(set(PHONEME_MAP.values()))
-PHONEME_ID_MAP = {p: i for i, p in enumerate(PHONEMES)}
 NUM_PHONEMES = len(PHONEMES)
 
 def phonemize(text: str):
-    phonemes = []
-    phoneme_ids = []
-    durations = []
-    for ch in text.lower():
-        ph = PHONEME_MAP.get(ch, "SP")
-        phonemes.append(ph)
-        phoneme_ids.append(PHONEME_ID_MAP[ph])
-        durations.append(FRAMES_PER_PHONEME)
-    return phonemes, np.array(phoneme_ids, dtype=np.int64), np.array(durations, dtype=np.int64)
+    phonemes, phoneme_ids = frontend.phonemize(text)
+    return phonemes, phoneme_ids, np.full(len(phoneme_ids), FRAMES_PER_PHONEME, dtype=np.int64)
 
 # --------------------------------------------------
 # Acoustic Model (Placeholder)
@@ -66,17 +51,16 @@ class AcousticModel:
     def __init__(self):
         self.phoneme_embeddings = np.random.randn(NUM_PHONEMES, PHONEME_EMBED_DIM).astype(np.float32)
         self.projection = np.random.randn(PHONEME_EMBED_DIM, N_MELS).astype(np.float32)
+        # Weights are random per process, so cached audio is keyed on a fingerprint of them
+        self.version = hashlib.sha1(self.phoneme_embeddings.tobytes() + self.projection.tobytes()).hexdigest()[:12]
 
     def infer(self, phoneme_ids: np.ndarray, durations: np.ndarray) -> np.ndarray:
-        total_frames = int(durations.sum())
-        mel = np.zeros((N_MELS, total_frames), dtype=np.float32)
-        frame = 0
-        for pid, dur in zip(phoneme_ids, durations):
-            emb = self.phoneme_embeddings[pid]
-            mel_frame = emb @ self.projection
-            mel[:, frame : frame + dur] = mel_frame[:, None]
-            frame += dur
-        mel = mel / (np.max(np.abs(mel)) + 1e-6)
+        # One gather + one matmul for the whole utterance, then expand
+        # each phoneme's frame by its duration
+        frame_mels = self.phoneme_embeddings[phoneme_ids] @ self.projection  # [P, N_MELS]
+        # Normalizing before the repeat touches P rows instead of T frames
+        frame_mels /= np.max(np.abs(frame_mels)) + 1e-6
+        mel = np.repeat(frame_mels, durations, axis=0).T                    # [N_MELS, T]
         return mel
 
 acoustic_model = AcousticModel()
@@ -90,31 +74,27 @@ class Vocoder:
     Simple deterministic DSP-based placeholder.
     """
     def synthesize(self, mel: np.ndarray) -> np.ndarray:
-        n_mels, T = mel.shape
-        total_samples = T * SAMPLES_PER_FRAME
-        waveform = np.zeros(total_samples, dtype=np.float32)
-
-        for t in range(T):
-            freq = 220 + 880 * np.tanh(mel[0, t])  # map first mel to freq
-            frame_samples = np.arange(SAMPLES_PER_FRAME)
-            sine_wave = np.sin(2 * np.pi * freq * frame_samples / SAMPLE_RATE)
-            waveform[t*SAMPLES_PER_FRAME:(t+1)*SAMPLES_PER_FRAME] = sine_wave
+        freqs = 220 + 880 * np.tanh(mel[0].astype(np.float64))  # map first mel to freq, one per frame
+        # Phase-continuous oscillator: each frame starts where the previous one
+        # ended, so there are no clicks at frame boundaries. Start phases are
+        # accumulated in float64 and wrapped; the per-sample sine runs in float32.
+        step = 2 * np.pi * freqs / SAMPLE_RATE                          # rad/sample, per frame
+        start = np.cumsum(step * SAMPLES_PER_FRAME) - step * SAMPLES_PER_FRAME
+        start = np.mod(start, 2 * np.pi)
+        phase = start[:, None] + step[:, None] * np.arange(SAMPLES_PER_FRAME)
+        waveform = np.sin(phase.astype(np.float32)).ravel()
 
         waveform /= np.max(np.abs(waveform) + 1e-6)
         return waveform.astype(np.float32)
 
 vocoder = Vocoder()
 
-# --------------------------------------------------
-# TTS Endpoint (Waveform Output)
-# --------------------------------------------------
-@app.post("/tts_audio")
-def tts_audio(req: TTSRequest):
-    if not req.text.strip():
-        raise HTTPException(status_code=400, detail="Text cannot be empty")
+# Encoded audio keyed by text/language/model/format; see tts_cache.py for TTS_CACHE_* settings
+cache = SynthesisCache.from_env()
 
+def render_audio(text: str, fmt: str) -> bytes:
     # 1️⃣ Phonemize
-    phonemes, phoneme_ids, durations = phonemize(req.text)
+    phonemes, phoneme_ids, durations = phonemize(text)
 
     # 2️⃣ Acoustic Model → Mel
     mel = acoustic_model.infer(phoneme_ids, durations)
@@ -122,16 +102,33 @@ def tts_audio(req: TTSRequest):
     # 3️⃣ Vocoder → Waveform
     waveform = vocoder.synthesize(mel)
 
-    # 4️⃣ Stream as WAV
-    buffer = io.BytesIO()
-    sf.write(buffer, waveform, SAMPLE_RATE, format="WAV")
-    buffer.seek(0)
+    # 4️⃣ Encode (WAV / Ogg, see tts_formats.py)
+    return encode_file(waveform, SAMPLE_RATE, fmt)
+
+# --------------------------------------------------
+# TTS Endpoint (Waveform Output)
+# --------------------------------------------------
+@app.get("/metrics")
+def metrics():
+    return {"cache": cache.stats()}
+
+@app.post("/tts_audio")
+def tts_audio(req: TTSRequest):
+    if not req.text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    if req.format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of {FORMATS}")
+
+    key = cache_key(req.text, req.language, model=acoustic_model.version, format=req.format)
+    audio = cache.get_or_compute(key, lambda: render_audio(req.text, req.format))
 
     return StreamingResponse(
-        buffer,
-        media_type="audio/wav",
+        iter_bytes(audio),
+        media_type=MEDIA_TYPES[req.format],
         headers={
-            "X-Sample-Rate": str(SAMPLE_RATE),
+            "Content-Length": str(len(audio)),
+            "X-Sample-Rate": str(output_rate(req.format, SAMPLE_RATE)),
+            "X-Format": req.format,
             "X-Language": req.language,
             "X-Engine": "acoustic+vocoder-placeholder"
         }
@@ -9,8 +9,15 @@ Streaming / Low-Latency TTS. This will allow:
 - Latency of <200ms instead of generating the full sentence first
 """
 
+from contextlib import aclosing
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 import numpy as np
+import hashlib
+
+from tts_cache import SynthesisCache, cache_key
+from tts_frontend import frontend, PHONEMES
+from tts_framing import AudioFramer
+from tts_formats import FORMATS, StreamEncoder, encode_stream
 
 app = FastAPI(title="From-Scratch Streaming TTS")
 
@@ -20,71 +27,90 @@ PHONEME_EMBED_DIM = 64
 SAMPLE_RATE = 22050
 SAMPLES_PER_FRAME = 256
 
-PHONEME_MAP = {
-    "a": "AH", "b": "B", "c": "K", "d": "D", "e": "EH",
-    "f": "F", "g": "G", "h": "HH", "i": "IH", "j": "JH",
-    "k": "K", "l": "L", "m": "M", "n": "N", "o": "OW",
-    "p": "P", "q": "K", "r": "R", "s": "S", "t": "T",
-    "u": "UH", "v": "V", "w": "W", "x": "KS", "y": "Y",
-    "z": "Z",
-    " ": "SP"
-}
-
-PHONEMES = sorted(set(PHONEME_MAP.values()))
-PHONEME_ID_MAP = {p: i for i, p in enumerate(PHONEMES)}
 NUM_PHONEMES = len(PHONEMES)
 
+# Frames are synthesized in blocks of BLOCK_FRAMES phonemes, then sent one by one
+BLOCK_FRAMES = 64
+NOISE_STD = 0.05
+
 # Reuse your acoustic model + vocoder
 class AcousticModel:
     def __init__(self):
         self.phoneme_embeddings = np.random.randn(NUM_PHONEMES, PHONEME_EMBED_DIM).astype(np.float32)
         self.projection = np.random.randn(PHONEME_EMBED_DIM, N_MELS).astype(np.float32)
+        # Weights are random per process, so cached audio is keyed on a fingerprint of them
+        self.version = hashlib.sha1(self.phoneme_embeddings.tobytes() + self.projection.tobytes()).hexdigest()[:12]
+        # One normalized mel frame per phoneme, computed once: inference is a row lookup
+        mel = self.phoneme_embeddings @ self.projection
+        self.mel_table = mel / (np.max(np.abs(mel), axis=1, keepdims=True) + 1e-6)
+
     def infer_frame(self, pid):
-        emb = self.phoneme_embeddings[pid]
-        mel_frame = emb @ self.projection
-        mel_frame = mel_frame / (np.max(np.abs(mel_frame)) + 1e-6)
-        return mel_frame
+        return self.mel_table[pid]
 
 class Vocoder:
-    def synthesize_frame(self, mel_frame):
-        base_freq = 100 + 500 * np.tanh(mel_frame[0])  # base pitch
-
+    def __init__(self, mel_table):
+        # Deterministic part of every phoneme's frame (3 harmonics of its base
+        # pitch), built once at startup; only the noise changes per request
+        base_freq = 100 + 500 * np.tanh(mel_table[:, 0].astype(np.float64))  # base pitch
         frame_samples = np.arange(SAMPLES_PER_FRAME)
-        sine_wave = np.zeros(SAMPLES_PER_FRAME)
-
-        # Add 3 harmonics
-        for i in range(1, 4):
-            sine_wave += (0.5 / i) * np.sin(2 * np.pi * base_freq * i * frame_samples / SAMPLE_RATE)
-
-        # Add slight noise (unvoiced sounds)
-        sine_wave += np.random.randn(SAMPLES_PER_FRAME) * 0.05
-
+        harmonics = np.arange(1, 4)
+        phase = 2 * np.pi * base_freq[:, None, None] * harmonics[:, None] * frame_samples / SAMPLE_RATE
+        self.templates = ((0.5 / harmonics)[:, None] * np.sin(phase)).sum(axis=1).astype(np.float32)
         # Apply short envelope to smooth
-        envelope = np.linspace(1, 0.7, SAMPLES_PER_FRAME)
-        sine_wave *= envelope
+        self.envelope = np.linspace(1, 0.7, SAMPLES_PER_FRAME, dtype=np.float32)
 
-        # Normalize
-        sine_wave /= np.max(np.abs(sine_wave) + 1e-6)
-        return sine_wave.astype(np.float32)
+    def synthesize(self, phoneme_ids, rng):
+        """[n] phoneme IDs -> [n, SAMPLES_PER_FRAME] frames: template + noise, enveloped and normalized."""
+        frames = self.templates[phoneme_ids]
+        # Add slight noise (unvoiced sounds)
+        frames += rng.standard_normal(frames.shape, dtype=np.float32) * NOISE_STD
+        frames *= self.envelope
+        frames /= np.max(np.abs(frames), axis=1, keepdims=True) + 1e-6
+        return frames
 
 acoustic_model = AcousticModel()
-vocoder = Vocoder()
+vocoder = Vocoder(acoustic_model.mel_table)
 
 def phonemize(text):
-    phoneme_ids = [PHONEME_ID_MAP.get(PHONEME_MAP.get(ch, "SP"), 0) for ch in text.lower()]
+    _, phoneme_ids = frontend.phonemize(text)
     return phoneme_ids
 
+# Raw audio keyed by text/model; see tts_cache.py for TTS_CACHE_* settings
+cache = SynthesisCache.from_env()
+
+async def synthesize_frames(text):
+    phoneme_ids = phonemize(text)
+    rng = np.random.default_rng()
+    for start in range(0, len(phoneme_ids), BLOCK_FRAMES):
+        audio = vocoder.synthesize(phoneme_ids[start : start + BLOCK_FRAMES], rng)
+        for audio_frame in audio:
+            yield audio_frame.tobytes()
+
+@app.get("/metrics")
+def metrics():
+    return {"cache": cache.stats()}
+
 @app.websocket("/ws_tts")
-async def websocket_tts(ws: WebSocket):
+async def websocket_tts(ws: WebSocket, frame_ms: float = None, format: str = "float32"):
     await ws.accept()
+    if format not in FORMATS:
+        await ws.close(code=1008, reason="unknown format")
+        return
+    # Audio is re-cut into frame_ms frames (TTS_FRAME_MS by default), then
+    # encoded to `format`; both are announced up front
+    framer = AudioFramer.from_env(SAMPLE_RATE, frame_ms=frame_ms)
+    encoder = StreamEncoder(format, SAMPLE_RATE)
     try:
+        await ws.send_json({**framer.header(), **encoder.header(framer.frame_ms)})
         data = await ws.receive_text()
-        phoneme_ids = phonemize(data)
-
-        for pid in phoneme_ids:
-            mel_frame = acoustic_model.infer_frame(pid)
-            audio_frame = vocoder.synthesize_frame(mel_frame)
-            await ws.send_bytes(audio_frame.tobytes())
+        key = cache_key(data, model=acoustic_model.version)
+
+        # Cache hits are replayed phoneme by phoneme, just like a live synthesis
+        # Closed right away if the client goes: waiters on this synthesis must not wait for GC
+        async with aclosing(cache.stream(key, lambda: synthesize_frames(data),
+                                         chunk_size=SAMPLES_PER_FRAME * 4)) as chunks:
+            async for frame in encode_stream(framer.frames(chunks), encoder):
+                await ws.send_bytes(frame)
 
         # ✅ After sending all frames, close connection
         await ws.close()
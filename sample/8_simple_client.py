@@ -1,23 +1,45 @@
 import asyncio
+import io
+import json
+import sys
 import websockets
 import numpy as np
 import soundfile as sf
 
+# float32 | pcm16 | mulaw | opus
+FORMAT = sys.argv[1] if len(sys.argv) > 1 else "float32"
+
+def save(data, header):
+    """Write the received stream to a file according to the header's format."""
+    if header["format"] == "opus":
+        # The frames are the pages of one Ogg/Opus file
+        with open("speech_stream.ogg", "wb") as f:
+            f.write(data)
+        return "speech_stream.ogg"
+    if header["format"] == "mulaw":
+        waveform, _ = sf.read(io.BytesIO(data), format="RAW", subtype="ULAW",
+                              samplerate=header["sample_rate"], channels=1, dtype="float32")
+    else:
+        waveform = np.frombuffer(data, dtype=header["dtype"])
+    sf.write("speech_stream.wav", waveform, header["sample_rate"])
+    return "speech_stream.wav"
+
 async def main():
-    uri = "ws://localhost:8000/ws_tts"
+    uri = f"ws://localhost:8000/ws_tts?frame_ms=40&format={FORMAT}"
     async with websockets.connect(uri) as ws:
+        # The server announces the stream format before any audio
+        header = json.loads(await ws.recv())
+        print(f"{header['sample_rate']} Hz {header['format']}, {header['frame_ms']} ms frames")
+
         await ws.send("Hello this is a from scratch streaming TTS system")
 
         audio_chunks = []
         try:
             while True:
-                data = await ws.recv()
-                audio_frame = np.frombuffer(data, dtype=np.float32)
-                audio_chunks.append(audio_frame)
+                audio_chunks.append(await ws.recv())
         except websockets.ConnectionClosedOK:
             pass
 
-        waveform = np.concatenate(audio_chunks)
-        sf.write("speech_stream.wav", waveform, 22050)
+        print("Saved", save(b"".join(audio_chunks), header))
 
 asyncio.run(main())
@@ -5,8 +5,15 @@ Text → Phonemes → Acoustic Model → Mel → Waveform (chunked)
 This version uses a formant-based DSP vocoder to produce speech-like audio.
 """
 
+from contextlib import aclosing
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 import numpy as np
+import hashlib
+
+from tts_cache import SynthesisCache, cache_key
+from tts_frontend import frontend, PHONEMES
+from tts_framing import AudioFramer
+from tts_formats import FORMATS, StreamEncoder, encode_stream
 
 app = FastAPI(title="From-Scratch Streaming TTS")
 
@@ -16,18 +23,6 @@ PHONEME_EMBED_DIM = 64
 SAMPLE_RATE = 22050
 SAMPLES_PER_FRAME = 512  # larger frame for smoother audio
 
-PHONEME_MAP = {
-    "a": "AH", "b": "B", "c": "K", "d": "D", "e": "EH",
-    "f": "F", "g": "G", "h": "HH", "i": "IH", "j": "JH",
-    "k": "K", "l": "L", "m": "M", "n": "N", "o": "OW",
-    "p": "P", "q": "K", "r": "R", "s": "S", "t": "T",
-    "u": "UH", "v": "V", "w": "W", "x": "KS", "y": "Y",
-    "z": "Z",
-    " ": "SP"
-}
-
-PHONEMES = sorted(set(PHONEME_MAP.values()))
-PHONEME_ID_MAP = {p: i for i, p in enumerate(PHONEMES)}
 NUM_PHONEMES = len(PHONEMES)
 
 # Simple phoneme formants (frequency in Hz)
@@ -45,75 +40,104 @@ PHONEME_FORMANTS = {
     # Default for other consonants
 }
 
+# Frames are synthesized in blocks of BLOCK_FRAMES phonemes, then sent one by one
+BLOCK_FRAMES = 64
+NOISE_STD = 0.01            # slight noise on every frame
+CONSONANT_NOISE_STD = 0.1   # "noise" phonemes
+
 # ------------------ Acoustic Model (fake) ------------------
 class AcousticModel:
     def __init__(self):
         self.phoneme_embeddings = np.random.randn(NUM_PHONEMES, PHONEME_EMBED_DIM).astype(np.float32)
         self.projection = np.random.randn(PHONEME_EMBED_DIM, N_MELS).astype(np.float32)
+        # Weights are random per process, so cached audio is keyed on a fingerprint of them
+        self.version = hashlib.sha1(self.phoneme_embeddings.tobytes() + self.projection.tobytes()).hexdigest()[:12]
+        # One normalized mel frame per phoneme, computed once: inference is a row lookup
+        mel = self.phoneme_embeddings @ self.projection
+        self.mel_table = mel / (np.max(np.abs(mel), axis=1, keepdims=True) + 1e-6)
 
     def infer_frame(self, pid):
-        emb = self.phoneme_embeddings[pid]
-        mel_frame = emb @ self.projection
-        mel_frame = mel_frame / (np.max(np.abs(mel_frame)) + 1e-6)
-        return mel_frame
+        return self.mel_table[pid]
 
 # ------------------ Formant-based Vocoder ------------------
 class Vocoder:
-    def synthesize_frame(self, mel_frame, phoneme):
+    def __init__(self, mel_table):
+        # Deterministic waveform template and noise level per phoneme ID, built
+        # once at startup; only the noise is drawn per request
         frame_samples = np.arange(SAMPLES_PER_FRAME)
-        sine_wave = np.zeros(SAMPLES_PER_FRAME, dtype=np.float32)
-
-        if phoneme in PHONEME_FORMANTS:
-            fdata = PHONEME_FORMANTS[phoneme]
+        self.templates = np.zeros((NUM_PHONEMES, SAMPLES_PER_FRAME), dtype=np.float32)
+        noise_var = np.full(NUM_PHONEMES, NOISE_STD ** 2)
+        for pid, phoneme in enumerate(PHONEMES):
+            fdata = PHONEME_FORMANTS.get(phoneme)
             if fdata == "noise":
-                sine_wave = np.random.randn(SAMPLES_PER_FRAME) * 0.1
+                noise_var[pid] += CONSONANT_NOISE_STD ** 2
             elif fdata == "silence":
-                sine_wave = np.zeros(SAMPLES_PER_FRAME)
+                pass
+            elif fdata is not None:
+                freqs = np.asarray(fdata, dtype=np.float64)[:, None]
+                self.templates[pid] = np.sin(2 * np.pi * freqs * frame_samples / SAMPLE_RATE).mean(axis=0)
             else:
-                for f in fdata:
-                    sine_wave += np.sin(2 * np.pi * f * frame_samples / SAMPLE_RATE)
-                sine_wave /= len(fdata)
-        else:
-            # fallback: use first mel value as frequency
-            freq = 220 + 500 * np.tanh(mel_frame[0])
-            sine_wave = np.sin(2 * np.pi * freq * frame_samples / SAMPLE_RATE)
-
-        # Add slight noise for consonants
-        sine_wave += np.random.randn(SAMPLES_PER_FRAME) * 0.01
-
-        # Envelope
-        envelope = np.linspace(1, 0.8, SAMPLES_PER_FRAME)
-        sine_wave *= envelope
-
-        # Normalize
-        sine_wave /= np.max(np.abs(sine_wave) + 1e-6)
-        return sine_wave.astype(np.float32)
+                # fallback: use first mel value as frequency
+                freq = 220 + 500 * np.tanh(np.float64(mel_table[pid, 0]))
+                self.templates[pid] = np.sin(2 * np.pi * freq * frame_samples / SAMPLE_RATE)
+        # Independent Gaussian noises add up to one with the summed variance
+        self.noise_std = np.sqrt(noise_var).astype(np.float32)
+        self.envelope = np.linspace(1, 0.8, SAMPLES_PER_FRAME, dtype=np.float32)
+
+    def synthesize(self, phoneme_ids, rng):
+        """[n] phoneme IDs -> [n, SAMPLES_PER_FRAME] frames: template + noise, enveloped and normalized."""
+        frames = self.templates[phoneme_ids]
+        noise = rng.standard_normal(frames.shape, dtype=np.float32)
+        frames += noise * self.noise_std[phoneme_ids, None]
+        frames *= self.envelope
+        frames /= np.max(np.abs(frames), axis=1, keepdims=True) + 1e-6
+        return frames
 
 acoustic_model = AcousticModel()
-vocoder = Vocoder()
+vocoder = Vocoder(acoustic_model.mel_table)
 
 # ------------------ Phonemizer ------------------
 def phonemize(text):
-    phoneme_ids = []
-    phonemes = []
-    for ch in text.lower():
-        ph = PHONEME_MAP.get(ch, "SP")
-        phonemes.append(ph)
-        phoneme_ids.append(PHONEME_ID_MAP[ph])
-    return phonemes, phoneme_ids
+    return frontend.phonemize(text)
+
+# ------------------ Synthesis cache ------------------
+# Raw audio keyed by text/model; see tts_cache.py for TTS_CACHE_* settings
+cache = SynthesisCache.from_env()
+
+async def synthesize_frames(text):
+    _, phoneme_ids = phonemize(text)
+    rng = np.random.default_rng()
+    for start in range(0, len(phoneme_ids), BLOCK_FRAMES):
+        audio = vocoder.synthesize(phoneme_ids[start : start + BLOCK_FRAMES], rng)
+        for audio_frame in audio:
+            yield audio_frame.tobytes()
+
+@app.get("/metrics")
+def metrics():
+    return {"cache": cache.stats()}
 
 # ------------------ WebSocket Endpoint ------------------
 @app.websocket("/ws_tts")
-async def websocket_tts(ws: WebSocket):
+async def websocket_tts(ws: WebSocket, frame_ms: float = None, format: str = "float32"):
     await ws.accept()
+    if format not in FORMATS:
+        await ws.close(code=1008, reason="unknown format")
+        return
+    # Audio is re-cut into frame_ms frames (TTS_FRAME_MS by default), then
+    # encoded to `format`; both are announced up front
+    framer = AudioFramer.from_env(SAMPLE_RATE, frame_ms=frame_ms)
+    encoder = StreamEncoder(format, SAMPLE_RATE)
     try:
+        await ws.send_json({**framer.header(), **encoder.header(framer.frame_ms)})
         data = await ws.receive_text()
-        phonemes, phoneme_ids = phonemize(data)
-
-        for pid, ph in zip(phoneme_ids, phonemes):
-            mel_frame = acoustic_model.infer_frame(pid)
-            audio_frame = vocoder.synthesize_frame(mel_frame, ph)
-            await ws.send_bytes(audio_frame.tobytes())
+        key = cache_key(data, model=acoustic_model.version)
+
+        # Cache hits are replayed phoneme by phoneme, just like a live synthesis
+        # Closed right away if the client goes: waiters on this synthesis must not wait for GC
+        async with aclosing(cache.stream(key, lambda: synthesize_frames(data),
+                                         chunk_size=SAMPLES_PER_FRAME * 4)) as chunks:
+            async for frame in encode_stream(framer.frames(chunks), encoder):
+                await ws.send_bytes(frame)
 
         # Close connection after sending all frames
         await ws.close()
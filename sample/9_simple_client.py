@@ -1,4 +1,5 @@
 import asyncio
+import time
 import websockets
 import numpy as np
 import soundfile as sf
@@ -7,16 +8,20 @@ async def main():
     uri = "ws://localhost:8000/ws_tts"
     async with websockets.connect(uri) as ws:
         await ws.send("Hello, this is a streaming TTS test with Tacotron2 + HiFi-GAN!")
+        start = time.perf_counter()
 
         audio_chunks = []
         try:
             while True:
                 data = await ws.recv()
+                if not audio_chunks:
+                    print(f"First audio after {(time.perf_counter() - start) * 1000:.0f} ms")
                 audio_frame = np.frombuffer(data, dtype=np.float32)
                 audio_chunks.append(audio_frame)
         except websockets.ConnectionClosedOK:
             pass
 
+        print(f"Last audio after {(time.perf_counter() - start) * 1000:.0f} ms")
         waveform = np.concatenate(audio_chunks)
         sf.write("speech_stream.wav", waveform, 22050)
         print("Saved speech_stream.wav")
@@ -1,53 +1,193 @@
 """
 Streaming TTS with Tacotron2 + HiFi-GAN Vocoder
-Text → Tacotron2 → Mel → HiFi-GAN → Waveform chunks (WebSocket)
+Text → Tacotron2 → Mel → HiFi-GAN (chunked) → Waveform chunks (WebSocket)
 """
+import time
+IMPORT_START = time.perf_counter()
 
+from contextlib import aclosing, asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import logging
 import torch
 import numpy as np
+import os
 from speechbrain.pretrained import Tacotron2, HIFIGAN
 
-app = FastAPI(title="Streaming TTS Server")
+from tts_executor import InferenceExecutor, ServerBusy, BUSY_CLOSE_CODE
+from tts_streaming import stream_vocode, pipelined_stream, StreamTimer, LatencyStats
+from tts_text import split_sentences
+from tts_cache import SynthesisCache, cache_key
+from tts_formats import FORMATS, StreamEncoder, encode_stream
+from tts_lifecycle import ModelLifecycle
+from tts_backends import InferenceBackend, TorchBackend, load_backend
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_START
+
+logging.basicConfig(level=logging.INFO)
+
+# ------------------ Inference executor ------------------
+# Synthesis runs off the event loop: at most INFERENCE_WORKERS at once, up to
+# MAX_QUEUE more waiting, anything beyond that is closed with "busy".
+# TTS_USE_PROCESSES=1 uses a process pool instead (CPU-only deployments).
+INFERENCE_WORKERS = int(os.environ.get("TTS_INFERENCE_WORKERS", 2))
+MAX_QUEUE = int(os.environ.get("TTS_MAX_QUEUE", 16))
+USE_PROCESSES = os.environ.get("TTS_USE_PROCESSES", "0") == "1"
+
+# ------------------ Streaming config ------------------
+# HiFi-GAN decodes the mel in windows of CHUNK_FRAMES (the first one smaller,
+# for a fast first byte) with CONTEXT_FRAMES of overlap on each side.
+SAMPLE_RATE = 22050
+HOP_LENGTH = 256
+CHUNK_FRAMES = int(os.environ.get("TTS_CHUNK_FRAMES", 40))
+FIRST_CHUNK_FRAMES = int(os.environ.get("TTS_FIRST_CHUNK_FRAMES", 16))
+CONTEXT_FRAMES = 10
+
+# Long texts are split into sentences of at most MAX_SENTENCE_CHARS; up to
+# SENTENCES_IN_FLIGHT mels are synthesized ahead of the sentence being streamed.
+MAX_SENTENCE_CHARS = int(os.environ.get("TTS_MAX_SENTENCE_CHARS", 200))
+SENTENCES_IN_FLIGHT = 2
+
+latency = LatencyStats()
+
+# TTS_VOCODER_BACKEND=onnx (or torchscript) runs HiFi-GAN from the export at
+# TTS_VOCODER_MODEL (python -m src.train.export --hifigan) instead of eager PyTorch.
+# TTS_VOCODER_PRECISION=int8|fp16|bf16 trades quality for speed / memory
+# (see tts_backends.py and tts_precision_eval.py).
+VOCODER_BACKEND = os.environ.get("TTS_VOCODER_BACKEND", "torch")
+VOCODER_MODEL = os.environ.get("TTS_VOCODER_MODEL", "exported/hifigan.onnx")
+VOCODER_PRECISION = os.environ.get("TTS_VOCODER_PRECISION", "fp32")
+
+# Raw audio keyed by text/model; see tts_cache.py for TTS_CACHE_* settings
+MODEL_VERSION = "tacotron2-ljspeech+hifigan-libritts-22050"
+if VOCODER_PRECISION != "fp32":
+    MODEL_VERSION += f"-{VOCODER_PRECISION}"
+cache = SynthesisCache.from_env()
 
 # ------------------ Load pretrained models ------------------
-# Tacotron2: text -> mel
-tacotron2 = Tacotron2.from_hparams(
-    source="speechbrain/tts-tacotron2-ljspeech",
-    savedir="pretrained_tts"
-)
-
-# HiFi-GAN: mel -> waveform
-hifigan = HIFIGAN.from_hparams(
-    source="speechbrain/tts-hifigan-libritts-22050Hz",
-    savedir="pretrained_hifigan"
-)
+# Loaded from the lifespan (see tts_lifecycle.py), not at import; with
+# TTS_USE_PROCESSES=1 each worker process loads its own copy instead.
+tacotron2 = None
+hifigan = None
+
+def load_models():
+    global tacotron2, hifigan
+    # Tacotron2: text -> mel
+    tacotron2 = Tacotron2.from_hparams(
+        source="speechbrain/tts-tacotron2-ljspeech",
+        savedir="pretrained_tts"
+    )
+
+    # HiFi-GAN: mel -> waveform
+    if VOCODER_BACKEND != "torch":
+        hifigan = load_backend(VOCODER_BACKEND, VOCODER_MODEL, precision=VOCODER_PRECISION)
+        return
+    hifigan = HIFIGAN.from_hparams(
+        source="speechbrain/tts-hifigan-libritts-22050Hz",
+        savedir="pretrained_hifigan"
+    )
+    if VOCODER_PRECISION != "fp32":
+        # Run the generator the way decode_batch does, minus weight norm, at the chosen precision
+        generator = hifigan.hparams.generator
+        generator.remove_weight_norm()
+        hifigan = TorchBackend(generator, precision=VOCODER_PRECISION, method="inference")
+
+executor = InferenceExecutor(INFERENCE_WORKERS, MAX_QUEUE, use_processes=USE_PROCESSES,
+                             initializer=load_models if USE_PROCESSES else None)
+
+# ------------------ Inference ------------------
+def vocode(mel):
+    if isinstance(hifigan, InferenceBackend):
+        return hifigan.run(mel.cpu().numpy()).reshape(-1)
+    return hifigan.decode_batch(mel).reshape(-1).cpu().numpy()
+
+def acoustic(text):
+    """Blocking Tacotron2 synthesis of one sentence, run on the executor."""
+    with torch.no_grad():
+        mel_output, mel_length, _ = tacotron2.encode_text(text)  # [1, n_mels, T]
+    return mel_output
+
+def vocode_stream(mel):
+    """Blocking chunked HiFi-GAN decoding, advanced on the executor one window at a time."""
+    yield from stream_vocode(vocode, mel, HOP_LENGTH, chunk_frames=CHUNK_FRAMES,
+                             first_chunk_frames=FIRST_CHUNK_FRAMES, context_frames=CONTEXT_FRAMES)
+
+# ------------------ Warm-up ------------------
+def warm_up(text):
+    """One blocking end-to-end synthesis: every sentence through Tacotron2 and the chunked vocoder."""
+    for sentence in split_sentences(text, MAX_SENTENCE_CHARS):
+        for _ in vocode_stream(acoustic(sentence)):
+            pass
+
+def load_workers():
+    # Start every worker process; their initializer loads the models
+    for future in [executor.pool.submit(int) for _ in range(INFERENCE_WORKERS)]:
+        future.result()
+
+def warm_up_workers(text):
+    for future in [executor.pool.submit(warm_up, text) for _ in range(INFERENCE_WORKERS)]:
+        future.result()
+
+lifecycle = ModelLifecycle(load=load_workers if USE_PROCESSES else load_models,
+                           warm_up=warm_up_workers if USE_PROCESSES else warm_up)
+lifecycle.mark("import", IMPORT_SECONDS)
+
+async def synthesize_chunks(text):
+    # Only cache misses take an executor slot
+    async with executor.limit():
+        # 1️⃣ Tacotron2 runs sentence by sentence, one sentence ahead of
+        # 2️⃣ HiFi-GAN, which decodes window by window;
+        # 3️⃣ each chunk goes out as soon as it is vocoded
+        chunks = pipelined_stream(
+            split_sentences(text, MAX_SENTENCE_CHARS),
+            lambda sentence: executor.call(acoustic, sentence),
+            lambda mel: executor.iterate(vocode_stream, mel),
+            max_in_flight=SENTENCES_IN_FLIGHT,
+        )
+        async for chunk in chunks:
+            yield chunk.astype(np.float32).tobytes()
+
+@asynccontextmanager
+async def lifespan(app):
+    # Serve /healthz while the models load and warm up in the background
+    lifecycle.start()
+    yield
+    executor.shutdown()
+
+app = FastAPI(title="Streaming TTS Server", lifespan=lifespan)
+lifecycle.add_routes(app)
+
+@app.get("/metrics")
+def metrics():
+    return {**executor.metrics(), "latency": latency.summary(), "cache": cache.stats(),
+            "startup": lifecycle.report()}
 
 # ------------------ WebSocket endpoint ------------------
 @app.websocket("/ws_tts")
-async def websocket_tts(ws: WebSocket):
+async def websocket_tts(ws: WebSocket, format: str = "float32"):
     await ws.accept()
+    if not lifecycle.ready:
+        await ws.close(code=BUSY_CLOSE_CODE, reason="warming up")
+        return
+    if format not in FORMATS:
+        await ws.close(code=1008, reason="unknown format")
+        return
     try:
         text = await ws.receive_text()
+        timer = StreamTimer()
 
-        # 1️⃣ Generate mel from Tacotron2
-        with torch.no_grad():
-            mel_output, mel_length, _ = tacotron2.encode_text(text)  # [1, n_mels, T]
-
-        # 2️⃣ Decode waveform with HiFi-GAN
-        with torch.no_grad():
-            audio_tensor = hifigan.decode_batch(mel_output)  # [1, 1, T_audio]
-        audio = audio_tensor.squeeze().cpu().numpy()
-
-        # 3️⃣ Stream audio in chunks
-        chunk_size = 2048
-        idx = 0
-        while idx < len(audio):
-            chunk = audio[idx: idx+chunk_size]
-            await ws.send_bytes(chunk.astype(np.float32).tobytes())
-            idx += chunk_size
+        key = cache_key(text, model=MODEL_VERSION)
+        # The cache holds float32; each connection encodes to its own format
+        # Closed right away if the client goes: waiters on this synthesis must not wait for GC
+        async with aclosing(cache.stream(key, lambda: synthesize_chunks(text), chunk_size=2048 * 4)) as chunks:
+            async for chunk in encode_stream(chunks, StreamEncoder(format, SAMPLE_RATE)):
+                await ws.send_bytes(chunk)
+                timer.chunk_sent()
 
+        timer.finish()
+        latency.record(timer)
         await ws.close()
 
+    except ServerBusy:
+        await ws.close(code=BUSY_CLOSE_CODE, reason="busy")
     except WebSocketDisconnect:
         print("Client disconnected")
@@ -0,0 +1,70 @@
+"""
+In-memory MeloTTS synthesis.
+
+`TTS.tts_to_file` writes a WAV we then had to read back (and resample).
+MeloService keeps the model and speaker table resident and returns NumPy
+waveforms directly, sentence by sentence, using the same split / inference /
+inter-sentence silence as `tts_to_file` does internally.
+"""
+import re
+
+import numpy as np
+import torch
+from melo import utils
+from melo.api import TTS
+
+
+class MeloService:
+    def __init__(self, language="EN", device="auto", sdp_ratio=0.2, noise_scale=0.6, noise_scale_w=0.8):
+        self.model = TTS(language=language, device=device)
+        self.spk2id = dict(self.model.hps.data.spk2id)
+        self.sample_rate = self.model.hps.data.sampling_rate
+        self.sdp_ratio = sdp_ratio
+        self.noise_scale = noise_scale
+        self.noise_scale_w = noise_scale_w
+
+    @property
+    def speakers(self):
+        return list(self.spk2id)
+
+    def speaker_id(self, speaker):
+        if speaker not in self.spk2id:
+            raise ValueError(f"Unknown speaker {speaker!r}, expected one of {self.speakers}")
+        return self.spk2id[speaker]
+
+    def _infer(self, sentence, speaker_id, speed):
+        language = self.model.language
+        device = self.model.device
+        if language in ["EN", "ZH_MIX_EN"]:
+            sentence = re.sub(r"([a-z])([A-Z])", r"\1 \2", sentence)
+        bert, ja_bert, phones, tones, lang_ids = utils.get_text_for_tts_infer(
+            sentence, language, self.model.hps, device, self.model.symbol_to_id)
+        with torch.no_grad():
+            audio = self.model.model.infer(
+                phones.to(device).unsqueeze(0),
+                torch.LongTensor([phones.size(0)]).to(device),
+                torch.LongTensor([speaker_id]).to(device),
+                tones.to(device).unsqueeze(0),
+                lang_ids.to(device).unsqueeze(0),
+                bert.to(device).unsqueeze(0),
+                ja_bert.to(device).unsqueeze(0),
+                sdp_ratio=self.sdp_ratio,
+                noise_scale=self.noise_scale,
+                noise_scale_w=self.noise_scale_w,
+                length_scale=1.0 / speed,
+            )[0][0, 0]
+        return audio.float().cpu().numpy()
+
+    def synthesize_sentences(self, text, speaker, speed=1.0):
+        """Yield one float32 waveform per sentence, each followed by MeloTTS's 50 ms pause."""
+        if speed <= 0:
+            raise ValueError(f"speed must be positive, got {speed}")
+        speaker_id = self.speaker_id(speaker)
+        pause = np.zeros(int(self.sample_rate * 0.05 / speed), dtype=np.float32)
+        sentences = self.model.split_sentences_into_pieces(text, self.model.language, quiet=True)
+        for sentence in sentences:
+            yield np.concatenate([self._infer(sentence, speaker_id, speed), pause])
+
+    def synthesize(self, text, speaker, speed=1.0):
+        chunks = list(self.synthesize_sentences(text, speaker, speed))
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
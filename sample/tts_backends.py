@@ -0,0 +1,159 @@
+"""
+Pluggable inference backends for exported models.
+
+Servers call `backend.run(*arrays)` and get a NumPy array back, whatever
+executes the graph:
+
+- TorchBackend          an eager or TorchScript module (`TorchBackend.load`
+                        for `.pt` files written by `python -m src.train.export`)
+- OnnxRuntimeBackend    an `.onnx` export on ONNX Runtime's CPU execution
+                        provider, for CPU-only nodes without TensorRT
+
+`load_backend(kind, path)` opens an export by kind. ONNX Runtime is tuned
+with TTS_ORT_THREADS (intra-op threads, default 0 = one per core),
+TTS_ORT_OPT_LEVEL (disable | basic | extended | all, default all) and
+TTS_ORT_MEM_ARENA (default 1; 0 frees activations after every run: less
+resident memory, slower runs).
+
+Precision (PRECISIONS), chosen when the backend is created:
+- fp32   the model as trained
+- int8   dynamic quantization: int8 weights, activations quantized per
+         batch at run time. On torch this covers Linear / LSTM / GRU and
+         transposed convolutions rewritten as Linear + overlap-add (see
+         src/train/quantize.py); other convolutions and Embedding keep
+         int8 weights only and compute in fp32. On ONNX Runtime it loads
+         `<name>.int8.onnx` (python -m src.train.export --int8), where
+         Conv runs as ConvInteger and MatMul / Gather are int8 too.
+- fp16 / bf16   weights and float inputs cast, torch backends only; bf16
+         is only fast on CPUs with native bf16 (AVX512-BF16 / AMX)
+
+tts_precision_eval.py measures what each mode costs in quality and buys in
+latency and memory.
+"""
+import os
+import sys
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+# The int8 conv rewrites are shared with the export code in src/train
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+BACKENDS = ("torch", "torchscript", "onnx")
+ORT_OPT_LEVELS = ("disable", "basic", "extended", "all")
+PRECISIONS = ("fp32", "int8", "fp16", "bf16")
+FLOAT_DTYPES = {"fp32": torch.float32, "int8": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}
+
+
+def check_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+
+
+def apply_precision(module, precision):
+    """Quantize (int8) or cast (fp16 / bf16) an eager module in place; returns it."""
+    check_precision(precision)
+    if precision == "int8":
+        from torch.ao.quantization import quantize_dynamic, default_dynamic_qconfig, float_qparams_weight_only_qconfig
+        from src.train.quantize import linearize_conv_transposes, int8_weight_convs
+
+        # torch's own dynamic conv kernels are too inaccurate to use
+        module = int8_weight_convs(linearize_conv_transposes(module.eval()))
+        qconfig = {nn.Linear: default_dynamic_qconfig, nn.LSTM: default_dynamic_qconfig,
+                   nn.GRU: default_dynamic_qconfig, nn.Embedding: float_qparams_weight_only_qconfig}
+        return quantize_dynamic(module, qconfig, inplace=True)
+    return module.to(FLOAT_DTYPES[precision])
+
+
+def int8_path(path):
+    """Where `python -m src.train.export --int8` writes the quantized copy of an .onnx export."""
+    return f"{os.path.splitext(path)[0]}.int8.onnx"
+
+
+class InferenceBackend:
+    name = ""
+
+    def run(self, *inputs):
+        """inputs: NumPy arrays in the model's input order; returns its first output as NumPy."""
+        raise NotImplementedError
+
+
+class TorchBackend(InferenceBackend):
+    name = "torch"
+
+    def __init__(self, module, device="cpu", precision="fp32", method="forward"):
+        """method: which method of `module` to run (e.g. a HiFi-GAN generator's "inference")"""
+        if precision == "int8" and isinstance(module, torch.jit.ScriptModule):
+            raise ValueError("int8 needs the eager module (or the onnx backend), not a TorchScript export")
+        self.module = apply_precision(module.to(device).eval(), precision)
+        self.device = device
+        self.precision = precision
+        self.dtype = FLOAT_DTYPES[precision]
+        self.fn = getattr(self.module, method)
+
+    @classmethod
+    def load(cls, path, device="cpu", precision="fp32"):
+        backend = cls(torch.jit.load(path, map_location=device), device, precision)
+        backend.name = "torchscript"
+        return backend
+
+    def _tensor(self, x):
+        x = torch.from_numpy(np.ascontiguousarray(x)).to(self.device)
+        # Token ids and speaker ids stay integers; only float inputs follow the weights
+        return x.to(self.dtype) if x.is_floating_point() else x
+
+    def run(self, *inputs):
+        with torch.inference_mode():
+            output = self.fn(*[self._tensor(x) for x in inputs])
+        return output.float().cpu().numpy()
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    name = "onnx"
+
+    def __init__(self, path, threads=0, opt_level="all", arena=True):
+        """path: an .onnx export, or its int8 copy"""
+        import onnxruntime as ort
+
+        if opt_level not in ORT_OPT_LEVELS:
+            raise ValueError(f"Unknown graph optimization level {opt_level!r}, expected one of {ORT_OPT_LEVELS}")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        # Requests already run in parallel on the server's executor
+        options.inter_op_num_threads = 1
+        # The arena keeps the largest activations allocated between runs
+        options.enable_cpu_mem_arena = arena
+        options.graph_optimization_level = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[opt_level]
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    @classmethod
+    def from_env(cls, path):
+        return cls(path, threads=int(os.environ.get("TTS_ORT_THREADS", 0)),
+                   opt_level=os.environ.get("TTS_ORT_OPT_LEVEL", "all"),
+                   arena=os.environ.get("TTS_ORT_MEM_ARENA", "1") == "1")
+
+    def run(self, *inputs):
+        return self.session.run(None, dict(zip(self.input_names, inputs)))[0]
+
+
+def load_backend(kind, path, device="cpu", precision="fp32"):
+    """kind: "torchscript" for a .pt export, "onnx" for a .onnx export."""
+    check_precision(precision)
+    if kind == "torchscript":
+        return TorchBackend.load(path, device, precision)
+    if kind == "onnx":
+        if precision in ("fp16", "bf16"):
+            raise ValueError(f"{precision} is only supported on torch backends")
+        if precision == "int8":
+            path = int8_path(path)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{path} not found, create it with python -m src.train.export --int8")
+        return OnnxRuntimeBackend.from_env(path)
+    raise ValueError(f"Unknown backend {kind!r}, expected one of {BACKENDS[1:]}")
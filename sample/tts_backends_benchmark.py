@@ -0,0 +1,81 @@
+"""
+Parity + speed benchmark for tts_backends
+Exports MeloLikeTTS (and, with --hifigan, the HiFi-GAN of samples 9/10) with
+src/train/export.py, then runs eager PyTorch, TorchScript and ONNX Runtime on
+the same inputs at several sequence lengths: max abs error vs eager and
+median latency, single request on CPU.
+
+Run from the sample directory:
+    python ./tts_backends_benchmark.py [--checkpoint ../checkpoints/ckpt_step00012345.pt] [--hifigan]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from tts_backends import TorchBackend, OnnxRuntimeBackend
+
+# The export code and the model live with the training code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.train import export  # noqa: E402
+
+REPEATS = 20
+TEXT_LENGTHS = [16, 64, 256]   # MeloLikeTTS input tokens
+MEL_FRAMES = [32, 128, 512]    # HiFi-GAN input frames (256 samples each)
+
+
+def median_ms(backend, inputs):
+    backend.run(*inputs)  # warm-up
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        backend.run(*inputs)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+
+def compare(title, model, out_dir, name, io, make_inputs, lengths, threads):
+    ts_path, onnx_path = export.export(model, make_inputs(lengths[0]), out_dir, name, io)
+    backends = [TorchBackend(model), TorchBackend.load(ts_path)]
+    backends += [OnnxRuntimeBackend(onnx_path, threads=n, opt_level=level)
+                 for n in threads for level in ("basic", "all")]
+    labels = ["eager", "torchscript"] + [f"onnx {level}, {n or 'all'} thr"
+                                         for n in threads for level in ("basic", "all")]
+
+    print(f"\n{title}")
+    print(f"{'backend':<24} {'length':>7} {'max abs err':>12} {'median ms':>10} {'vs eager':>9}")
+    for length in lengths:
+        inputs = [x.numpy() for x in make_inputs(length)]
+        reference = backends[0].run(*inputs)
+        eager_ms = None
+        for label, backend in zip(labels, backends):
+            output = backend.run(*inputs)
+            assert output.shape == reference.shape, f"{label}: {output.shape} != {reference.shape}"
+            ms = median_ms(backend, inputs)
+            eager_ms = eager_ms or ms
+            print(f"{label:<24} {length:>7} {np.max(np.abs(output - reference)):>12.2e} "
+                  f"{ms:>10.2f} {eager_ms / ms:>8.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checkpoint", help="train.py checkpoint (random weights if omitted)")
+    parser.add_argument("--hifigan", action="store_true", help="also benchmark HiFi-GAN (needs speechbrain)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 0], help="ORT intra-op threads, 0 = all cores")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    print(f"torch {torch.__version__}, {torch.get_num_threads()} threads, best-effort CPU timings")
+    with tempfile.TemporaryDirectory() as out_dir:
+        compare("MeloLikeTTS (text tokens → mel)", export.load_melo(args.checkpoint), out_dir,
+                "melo_like_tts", export.MELO_IO,
+                lambda n: (torch.randint(0, 50, (1, n)), torch.zeros(1, dtype=torch.long)),
+                TEXT_LENGTHS, args.threads)
+        if args.hifigan:
+            compare("HiFi-GAN (mel frames → audio)", export.load_hifigan(), out_dir,
+                    "hifigan", export.HIFIGAN_IO,
+                    lambda n: (torch.randn(1, 80, n),), MEL_FRAMES, args.threads)
@@ -0,0 +1,108 @@
+"""
+Dynamic request batching for the sample TTS servers.
+
+WebSocket handlers call `await scheduler.submit(text)`. A dedicated worker
+thread gathers whatever requests arrive within `max_wait_ms` of the first
+one (up to `max_batch_size`), runs them through `batch_fn` as a single padded
+batch, and resolves each caller's future with its own result.
+
+Running the models on the worker thread also keeps the event loop free to
+accept connections and send audio while a batch is being synthesized.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BatchScheduler:
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10.0, name="tts-batcher"):
+        """
+        batch_fn: takes a list of requests, returns a list of results in the same order
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+
+        # Counters for logging / the load test
+        self.batches = 0
+        self.requests = 0
+
+    @property
+    def mean_batch_size(self):
+        return self.requests / max(self.batches, 1)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    async def submit(self, request):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((request, future, loop))
+        return await future
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = self._collect(first)
+            # Callers that disconnected while waiting don't need synthesizing
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            requests = [request for request, _, _ in batch]
+            try:
+                results = self.batch_fn(requests)
+                error = None
+            except Exception as e:
+                logger.error(f"Batch of {len(requests)} failed: {e}", exc_info=True)
+                results, error = [None] * len(requests), e
+
+            self.batches += 1
+            self.requests += len(requests)
+            for (_, future, loop), result in zip(batch, results):
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+
+
+def _resolve(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -0,0 +1,286 @@
+"""
+Synthesis response cache for the sample servers.
+
+Our traffic repeats the same prompts (greetings, IVR menus) constantly, so
+encoded audio is cached under a key built from the normalized text, language,
+speaker and model version:
+
+- in memory, as an LRU bounded by total bytes
+- optionally on disk (TTS_CACHE_DIR), so the cache survives restarts
+- single-flight: concurrent identical requests wait for the one synthesis
+  already in progress instead of starting their own
+
+`stats()` reports hit / miss / eviction counters for /metrics.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import aclosing
+
+
+def normalize_text(text):
+    """NFKC, collapse whitespace. Case and punctuation are kept: they change prosody."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(text, language="en", speaker="", model="", **extra):
+    parts = [normalize_text(text), language.lower(), speaker, model]
+    parts += [f"{k}={extra[k]}" for k in sorted(extra)]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class SynthesisCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # key -> size, oldest first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}        # key -> concurrent.futures.Future (sync callers)
+        self._inflight_async = {}  # key -> asyncio.Future (async callers)
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+        if disk_dir:
+            self._load_disk_index()
+
+    @classmethod
+    def from_env(cls):
+        """TTS_CACHE_MB (default 64, 0 disables), TTS_CACHE_DIR (unset = memory only), TTS_CACHE_DISK_MB."""
+        return cls(
+            max_bytes=int(float(os.environ.get("TTS_CACHE_MB", 64)) * 1024 * 1024),
+            disk_dir=os.environ.get("TTS_CACHE_DIR") or None,
+            disk_max_bytes=int(float(os.environ.get("TTS_CACHE_DISK_MB", 1024)) * 1024 * 1024),
+        )
+
+    # ------------------ Disk tier ------------------
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.bin")
+
+    def _load_disk_index(self):
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".bin"):
+                    st = os.stat(os.path.join(root, name))
+                    entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    # File I/O runs without the lock (and, for async callers, off the event
+    # loop via asyncio.to_thread); only the index updates take the lock.
+    def _disk_get(self, key):
+        with self._lock:
+            if key not in self._disk:
+                return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                if key in self._disk:
+                    self._disk_bytes -= self._disk.pop(key)
+            return None
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._memory_put(key, value)
+            self.disk_hits += 1
+        return value
+
+    def _disk_put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(value)
+        os.replace(tmp, path)  # atomic: readers never see a partial file
+        evicted = []
+        with self._lock:
+            if key in self._disk:
+                self._disk_bytes -= self._disk.pop(key)
+            self._disk[key] = len(value)
+            self._disk_bytes += len(value)
+            while self._disk_bytes > self.disk_max_bytes and len(self._disk) > 1:
+                old, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self.evictions += 1
+                evicted.append(old)
+        for old in evicted:
+            try:
+                os.remove(self._path(old))
+            except FileNotFoundError:
+                pass
+
+    # ------------------ Memory tier ------------------
+    def _memory_put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+        while self._memory_bytes > self.max_bytes:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old)
+            self.evictions += 1
+
+    def _memory_get(self, key):
+        # Caller holds self._lock; counts hits, misses are up to the caller
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def _lookup(self, key):
+        """Memory, then disk (blocking); counts hits and disk hits."""
+        with self._lock:
+            value = self._memory_get(key)
+        if value is None and self.disk_dir:
+            value = self._disk_get(key)
+        return value
+
+    async def _lookup_async(self, key):
+        with self._lock:
+            value = self._memory_get(key)
+        if value is None and self.disk_dir:
+            value = await asyncio.to_thread(self._disk_get, key)
+        return value
+
+    def get(self, key):
+        value = self._lookup(key)
+        if value is None:
+            with self._lock:
+                self.misses += 1
+        return value
+
+    def _store(self, key, value):
+        with self._lock:
+            self._memory_put(key, value)
+
+    def put(self, key, value):
+        value = bytes(value)
+        self._store(key, value)
+        if self.disk_dir:
+            self._disk_put(key, value)
+
+    # ------------------ Single-flight ------------------
+    # Every request is counted once: as a hit, a miss (it computed) or coalesced
+    # (it waited for another request's computation). When a computation fails,
+    # its waiters check again and one of them takes over. The in-flight check
+    # looks at memory again under the lock, since a leader may have finished
+    # during the disk lookup.
+    def get_or_compute(self, key, compute):
+        """Blocking callers (sync FastAPI handlers): return cached bytes or compute() them once."""
+        while True:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            with self._lock:
+                value = self._memory_get(key)
+                if value is not None:
+                    return value
+                waiting = self._inflight.get(key)
+                if waiting is None:
+                    future = self._inflight[key] = Future()
+                    self.misses += 1
+                    break
+            value = waiting.result()
+            if value is not None:
+                with self._lock:
+                    self.coalesced += 1
+                return value
+
+        value = None
+        try:
+            value = compute()
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+            # None tells waiters the computation failed
+            future.set_result(value)
+
+    async def stream(self, key, produce, chunk_size=8192):
+        """
+        Async callers (WebSocket handlers). `produce()` is an async iterator of
+        bytes. On a hit the cached bytes are replayed in `chunk_size` pieces;
+        on a miss the live chunks are passed through and stored at the end.
+
+        A miss makes this generator the leader other requests for `key` wait
+        on, until it finishes or is closed: callers must close it when they
+        stop early (`async with contextlib.aclosing(cache.stream(...))`)
+        instead of leaving that to garbage collection.
+        """
+        while True:
+            value = await self._lookup_async(key)
+            if value is not None:
+                break
+            with self._lock:
+                value = self._memory_get(key)
+                waiting = None if value is not None else self._inflight_async.get(key)
+                if value is None and waiting is None:
+                    future = self._inflight_async[key] = asyncio.get_running_loop().create_future()
+                    self.misses += 1
+            if value is not None or waiting is None:
+                break
+            value = await asyncio.shield(waiting)
+            if value is not None:
+                with self._lock:
+                    self.coalesced += 1
+                break
+
+        if value is not None:
+            for i in range(0, len(value), chunk_size):
+                yield value[i : i + chunk_size]
+            return
+
+        value = None
+        try:
+            parts = []
+            async with aclosing(produce()) as chunks:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    yield chunk
+            value = b"".join(parts)
+            self._store(key, value)
+        finally:
+            with self._lock:
+                if self._inflight_async.get(key) is future:
+                    del self._inflight_async[key]
+            # None tells waiters the leader failed or was cut off
+            future.set_result(value)
+        if self.disk_dir:
+            await asyncio.to_thread(self._disk_put, key, value)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+            }
@@ -0,0 +1,140 @@
+"""
+Executor-backed inference for the sample WebSocket servers.
+
+Model calls are blocking, so running them inside `async def` handlers freezes
+every other connection. InferenceExecutor runs them on a thread pool (torch
+releases the GIL inside its ops) or, for CPU-only deployments, a process pool,
+and bounds how much work is admitted:
+
+- at most `max_concurrency` requests run at once
+- at most `max_queue` more wait for a slot; beyond that `ServerBusy` is
+  raised immediately so the handler can close with BUSY_CLOSE_CODE instead
+  of letting latency grow without bound
+
+`stream()` does the same for a blocking generator (e.g. chunked vocoding),
+advancing it one item at a time on the pool so each item can be sent as
+soon as it exists.
+
+`metrics()` reports queued vs. running requests for a /metrics endpoint.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+# RFC 6455 "Try Again Later"
+BUSY_CLOSE_CODE = 1013
+
+_DONE = object()
+
+
+class ServerBusy(Exception):
+    pass
+
+
+def _drain(gen_fn, *args):
+    return list(gen_fn(*args))
+
+
+class InferenceExecutor:
+    def __init__(self, max_concurrency=2, max_queue=16, use_processes=False, initializer=None):
+        """initializer: run once in each worker process (e.g. to load the models there)"""
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        self.initializer = initializer
+        self._pool = None
+        self._slots = None
+
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            if self.use_processes:
+                # spawn: each worker imports the server module and loads its own
+                # models instead of inheriting torch state through fork()
+                self._pool = ProcessPoolExecutor(self.max_concurrency,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=self.initializer)
+            else:
+                self._pool = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="tts-infer")
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    @asynccontextmanager
+    async def limit(self):
+        """Admit one request, waiting for a free slot; raises ServerBusy if the queue is full."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise ServerBusy(f"{self.queued} requests already queued")
+
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        try:
+            yield
+            self.completed += 1
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    async def call(self, fn, *args):
+        """Run blocking `fn(*args)` on the pool (no admission; use inside limit())."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, fn, *args)
+
+    async def run(self, fn, *args):
+        """Run blocking `fn(*args)` on the pool under the concurrency limit."""
+        async with self.limit():
+            return await self.call(fn, *args)
+
+    async def iterate(self, gen_fn, *args):
+        """Yield the items of blocking generator `gen_fn(*args)` as the pool produces them (no admission)."""
+        loop = asyncio.get_running_loop()
+        if self.use_processes:
+            # Generators can't cross a process boundary; the whole result comes back at once
+            for item in await loop.run_in_executor(self.pool, _drain, gen_fn, *args):
+                yield item
+            return
+
+        gen = gen_fn(*args)
+        while True:
+            item = await loop.run_in_executor(self.pool, next, gen, _DONE)
+            if item is _DONE:
+                return
+            yield item
+
+    async def stream(self, gen_fn, *args):
+        """Like run(), for a generator function: yields items of `gen_fn(*args)` as they are produced."""
+        async with self.limit():
+            async for item in self.iterate(gen_fn, *args):
+                yield item
+
+    def metrics(self):
+        return {
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
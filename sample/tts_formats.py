@@ -0,0 +1,337 @@
+"""
+Output audio formats for the sample servers.
+
+Synthesis always produces float32 at the model's sample rate; this module
+turns that into what the client asked for, once, on the server:
+
+- float32: raw samples / float WAV (the old behaviour, 4 bytes per sample)
+- pcm16:   16-bit PCM, half the bandwidth, no audible difference for TTS
+- mulaw:   G.711 µ-law at 8 kHz for telephony, 1 byte per sample
+- opus:    Ogg/Opus, ~24 kbps for speech
+
+WebSocket handlers keep one StreamEncoder per connection: it resamples chunk
+by chunk with a stateful polyphase filter (no seams between chunks) and, for
+Opus, holds the encoder and Ogg stream open, returning pages as they fill.
+HTTP handlers send a WAV header followed by the samples straight from the
+NumPy buffer (`iter_file`), or a streaming-length header followed by chunks
+as they are synthesized (`stream_file`).
+"""
+import io
+import logging
+import struct
+from math import gcd
+
+import numpy as np
+import soundfile as sf
+from scipy import signal
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("float32", "pcm16", "mulaw", "opus")
+
+MULAW_RATE = 8000
+OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+OPUS_PAGE_MS = 20.0
+SFC_SET_OGG_PAGE_LATENCY_MS = 0x1302  # libsndfile >= 1.2; Ogg pages default to ~1 s otherwise
+
+
+def output_rate(fmt, sample_rate):
+    """The sample rate a format is delivered at for a model producing `sample_rate`."""
+    if fmt == "mulaw":
+        return MULAW_RATE
+    if fmt == "opus":
+        # Opus only takes its own rates: the lowest one that keeps the full band
+        return next((r for r in OPUS_RATES if r >= sample_rate), OPUS_RATES[-1])
+    return sample_rate
+
+
+# ------------------ Resampling ------------------
+class StreamResampler:
+    """
+    Polyphase FIR resampler that can be fed in chunks. Uses the same filter
+    as scipy.signal.resample_poly (Kaiser window, beta 5, 10 zero crossings),
+    so the concatenated output matches resampling the whole signal at once.
+    """
+
+    def __init__(self, input_rate, output_rate, half_len=10, beta=5.0, block=4096):
+        g = gcd(input_rate, output_rate)
+        self.up = output_rate // g
+        self.down = input_rate // g
+        max_rate = max(self.up, self.down)
+        taps = signal.firwin(2 * half_len * max_rate + 1, 1.0 / max_rate, window=("kaiser", beta)) * self.up
+        self.delay = (len(taps) - 1) // 2
+        self.width = -(-len(taps) // self.up)
+        # phases[p, i] = taps[p + i * up]: the taps that hit input sample n0 - i for output phase p
+        padded = np.zeros(self.up * self.width, dtype=np.float32)
+        padded[:len(taps)] = taps
+        self.phases = padded.reshape(self.width, self.up).T.copy()
+
+        self.buffer = np.zeros(self.width - 1, dtype=np.float32)  # zeros before the first sample
+        self.buffer_start = -(self.width - 1)  # input index of buffer[0]
+        self.received = 0
+        self.produced = 0
+        self.block = block
+
+    def _run(self, stop):
+        parts = []
+        # Bounded blocks: the gather below is (outputs x width)
+        for start in range(self.produced, stop, self.block):
+            k = np.arange(start, min(start + self.block, stop))
+            pos = k * self.down + self.delay
+            newest = pos // self.up
+            idx = (newest - self.buffer_start)[:, None] - np.arange(self.width)
+            parts.append(np.einsum("kt,kt->k", self.buffer[idx], self.phases[pos % self.up]))
+        out = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+        self.produced = stop
+
+        # Drop input no later output can reach
+        keep_from = (self.produced * self.down + self.delay) // self.up - (self.width - 1)
+        drop = min(max(keep_from - self.buffer_start, 0), len(self.buffer))
+        self.buffer = self.buffer[drop:]
+        self.buffer_start += drop
+        return out.astype(np.float32)
+
+    def process(self, chunk):
+        chunk = np.asarray(chunk, dtype=np.float32).reshape(-1)
+        self.buffer = np.concatenate([self.buffer, chunk])
+        self.received += len(chunk)
+        # Outputs whose newest input sample has arrived
+        ready = max((self.received * self.up - 1 - self.delay) // self.down + 1, self.produced)
+        return self._run(ready)
+
+    def flush(self):
+        """Remaining output, treating the input as zero past its end."""
+        total = -(-self.received * self.up // self.down)
+        if total <= self.produced:
+            return np.zeros(0, dtype=np.float32)
+        tail = self.delay // self.up + self.width
+        self.buffer = np.concatenate([self.buffer, np.zeros(tail, dtype=np.float32)])
+        return self._run(total)
+
+
+# ------------------ Sample encodings ------------------
+def to_pcm16(audio):
+    return np.rint(np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+
+
+def mulaw_encode(audio):
+    """float audio in [-1, 1] -> G.711 µ-law bytes (same output as audioop.lin2ulaw on 16-bit PCM)."""
+    x = to_pcm16(audio).astype(np.int32) >> 2  # G.711 works on 14-bit samples
+    mask = np.where(x < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(x), 8159) + 33
+    segment = np.floor(np.log2(magnitude)).astype(np.int32) - 5
+    value = np.where(segment > 7, 0x7F, (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F))
+    return (value ^ mask).astype(np.uint8)
+
+
+def encode_samples(audio, fmt):
+    """float audio -> sample array in a raw format (no copy for float32 input as float32)."""
+    if fmt == "float32":
+        return np.ascontiguousarray(audio, dtype=np.float32)
+    if fmt == "pcm16":
+        return to_pcm16(audio)
+    if fmt == "mulaw":
+        return mulaw_encode(audio)
+    raise ValueError(f"{fmt!r} is not a raw sample format")
+
+
+class _OggSink:
+    """Write-only file object for libsndfile; hands back bytes as pages are written."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.position = 0
+
+    def write(self, data):
+        self.data += data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.position  # Ogg is written strictly in order
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        return b""
+
+    def take(self):
+        data = bytes(self.data)
+        self.data.clear()
+        return data
+
+
+def _set_ogg_page_latency(sound_file, ms):
+    """
+    Shorter Ogg pages, so streamed Opus leaves the encoder every `ms` instead
+    of every ~1 s. soundfile has no API for sf_command(), so this goes through
+    its private _ffi / _snd / _file; if those change, or libsndfile predates
+    the command, the default page latency is kept.
+    """
+    try:
+        latency = sf._ffi.new("double*", ms)
+        sf._snd.sf_command(sound_file._file, SFC_SET_OGG_PAGE_LATENCY_MS, latency, sf._ffi.sizeof("double"))
+    except Exception as e:
+        logger.warning("Could not set the Ogg page latency (%s); Opus pages keep the default ~1 s", e)
+
+
+# ------------------ Encoders ------------------
+class StreamEncoder:
+    """Per-connection encoder: float32 chunks at `sample_rate` in, `fmt` bytes out."""
+
+    def __init__(self, fmt, sample_rate):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+        self.format = fmt
+        self.input_rate = sample_rate
+        self.sample_rate = output_rate(fmt, sample_rate)
+        self.resampler = None
+        if self.sample_rate != sample_rate:
+            self.resampler = StreamResampler(sample_rate, self.sample_rate)
+        self.opus = None
+        if fmt == "opus":
+            self.sink = _OggSink()
+            self.opus = sf.SoundFile(self.sink, "w", samplerate=self.sample_rate, channels=1,
+                                     format="OGG", subtype="OPUS")
+            _set_ogg_page_latency(self.opus, OPUS_PAGE_MS)
+
+    @property
+    def dtype(self):
+        return {"float32": "float32", "pcm16": "int16", "mulaw": "mulaw", "opus": "ogg/opus"}[self.format]
+
+    def header(self, frame_ms=None):
+        header = {"format": self.format, "sample_rate": self.sample_rate, "dtype": self.dtype}
+        if frame_ms is not None:
+            header["frame_samples"] = round(self.sample_rate * frame_ms / 1000)
+        return header
+
+    def _encode(self, audio):
+        if self.opus is None:
+            return encode_samples(audio, self.format).tobytes()
+        if len(audio):
+            self.opus.write(audio)
+        return self.sink.take()
+
+    def encode(self, chunk):
+        """float32 samples (array or raw bytes) -> encoded bytes, possibly empty while Opus fills a page."""
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = np.frombuffer(chunk, dtype=np.float32)
+        if self.resampler is not None:
+            chunk = self.resampler.process(chunk)
+        return self._encode(chunk)
+
+    def flush(self):
+        """Everything still held back: the resampler tail and, for Opus, the last pages."""
+        audio = self.resampler.flush() if self.resampler is not None else np.zeros(0, dtype=np.float32)
+        data = self._encode(audio)
+        if self.opus is not None:
+            self.opus.close()
+            data += self.sink.take()
+        return data
+
+    def close(self):
+        if self.opus is not None and not self.opus.closed:
+            self.opus.close()
+
+
+async def encode_stream(chunks, encoder):
+    """Async iterator of float32 chunks -> non-empty encoded chunks, flushed at the end."""
+    try:
+        async for chunk in chunks:
+            data = encoder.encode(chunk)
+            if data:
+                yield data
+        data = encoder.flush()
+        if data:
+            yield data
+    finally:
+        encoder.close()
+
+
+MEDIA_TYPES = {"float32": "audio/wav", "pcm16": "audio/wav", "mulaw": "audio/wav", "opus": "audio/ogg"}
+
+# ------------------ WAV streaming ------------------
+# WAVE format tag and bits per sample for each raw format
+WAV_CODECS = {"float32": (3, 32), "pcm16": (1, 16), "mulaw": (7, 8)}
+STREAMING_SIZE = 0xFFFFFFFF  # "unknown length": readers take the data chunk up to EOF
+CHUNK_BYTES = 64 * 1024
+
+
+def wav_header(sample_rate, fmt, num_samples=None, channels=1):
+    """
+    RIFF/WAVE header for `num_samples` frames of `fmt`. With num_samples=None
+    the sizes are left at 0xFFFFFFFF so the header can go out before the
+    length is known (chunked responses).
+    """
+    tag, bits = WAV_CODECS[fmt]
+    block_align = channels * bits // 8
+    data_size = STREAMING_SIZE if num_samples is None else num_samples * block_align
+    # Non-PCM formats carry a cbSize field and a fact chunk with the sample count
+    extended = tag != 1
+    fmt_chunk = struct.pack("<HHIIHH", tag, channels, sample_rate, sample_rate * block_align, block_align, bits)
+    if extended:
+        fmt_chunk += struct.pack("<H", 0)
+    header = b"fmt " + struct.pack("<I", len(fmt_chunk)) + fmt_chunk
+    if extended:
+        header += b"fact" + struct.pack("<II", 4, STREAMING_SIZE if num_samples is None else num_samples)
+    header += b"data" + struct.pack("<I", data_size)
+    riff_size = STREAMING_SIZE if num_samples is None else 4 + len(header) + data_size
+    return b"RIFF" + struct.pack("<I", riff_size) + b"WAVE" + header
+
+
+def iter_bytes(data, chunk_size=CHUNK_BYTES):
+    """Slices of `data` (bytes or a NumPy array) as memoryviews: nothing is copied."""
+    view = memoryview(data).cast("B")
+    for i in range(0, len(view), chunk_size):
+        yield view[i : i + chunk_size]
+
+
+def _resample(audio, sample_rate, rate):
+    if rate == sample_rate:
+        return audio
+    resampler = StreamResampler(sample_rate, rate)
+    return np.concatenate([resampler.process(audio), resampler.flush()])
+
+
+def iter_file(audio, sample_rate, fmt, chunk_size=CHUNK_BYTES):
+    """
+    Whole utterance -> WAV header, then the samples straight out of the NumPy
+    buffer in `chunk_size` memoryviews (converted chunk by chunk for pcm16 /
+    mulaw). Opus is encoded in one go instead.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+    rate = output_rate(fmt, sample_rate)
+    audio = _resample(audio, sample_rate, rate)
+    if fmt == "opus":
+        buffer = io.BytesIO()
+        sf.write(buffer, audio, rate, format="OGG", subtype="OPUS")
+        yield from iter_bytes(buffer.getbuffer(), chunk_size)
+        return
+    yield wav_header(rate, fmt, len(audio))
+    if fmt == "float32":
+        yield from iter_bytes(encode_samples(audio, fmt), chunk_size)
+        return
+    # Narrower formats are converted a chunk at a time, never as a second full copy
+    step = chunk_size * 8 // WAV_CODECS[fmt][1]
+    for i in range(0, len(audio), step):
+        yield memoryview(encode_samples(audio[i : i + step], fmt)).cast("B")
+
+
+def encode_file(audio, sample_rate, fmt):
+    """Whole utterance -> WAV / Ogg file bytes, for callers that keep the file (e.g. the cache)."""
+    return b"".join(iter_file(audio, sample_rate, fmt))
+
+
+async def stream_file(chunks, sample_rate, fmt):
+    """
+    Incrementally synthesized audio (async iterator of float32 chunks) -> a
+    file sent with chunked transfer: a streaming WAV header, then each chunk
+    as soon as it is encoded. Ogg/Opus is streamable as it is.
+    """
+    encoder = StreamEncoder(fmt, sample_rate)
+    if fmt != "opus":
+        yield wav_header(encoder.sample_rate, fmt)
+    async for data in encode_stream(chunks, encoder):
+        yield data
@@ -0,0 +1,71 @@
+"""
+Bandwidth / CPU benchmark for tts_formats
+Streams AUDIO_SECONDS of speech-like audio at 22050 Hz through a StreamEncoder
+per format in CHUNK_SAMPLES pieces (what the WebSocket servers do), and encodes
+the same audio as one file (what the HTTP servers do).
+
+Run from the sample directory:
+    python ./tts_formats_benchmark.py
+"""
+import time
+
+import numpy as np
+
+from tts_formats import FORMATS, StreamEncoder, encode_file
+
+SAMPLE_RATE = 22050
+AUDIO_SECONDS = 10
+CHUNK_SAMPLES = 2048
+REPEATS = 5
+
+
+def speech_like(seconds, sr):
+    """Voiced harmonics with a wandering pitch, gated into syllables, plus some breath noise."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sr)) / sr
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sr
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    audio = 0.3 * voiced * syllables + 0.02 * rng.standard_normal(len(t))
+    return (audio / np.max(np.abs(audio)) * 0.8).astype(np.float32)
+
+
+def stream(fmt, audio):
+    encoder = StreamEncoder(fmt, SAMPLE_RATE)
+    total = 0
+    first = None
+    for i in range(0, len(audio), CHUNK_SAMPLES):
+        data = encoder.encode(audio[i : i + CHUNK_SAMPLES])
+        if data and first is None:
+            first = i + CHUNK_SAMPLES  # input samples consumed before the first byte came out
+        total += len(data)
+    total += len(encoder.flush())
+    return total, first
+
+
+def cpu_ms(fn):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.process_time()
+        fn()
+        timings.append(time.process_time() - start)
+    return min(timings) * 1000
+
+
+if __name__ == "__main__":
+    audio = speech_like(AUDIO_SECONDS, SAMPLE_RATE)
+
+    print(f"{AUDIO_SECONDS} s at {SAMPLE_RATE} Hz, {CHUNK_SAMPLES}-sample chunks, best of {REPEATS}")
+    print(f"{'format':>8} {'rate':>6} {'kbps':>8} {'vs f32':>7} {'stream ms':>10} {'ms/audio s':>11} "
+          f"{'first byte ms':>14} {'file ms':>8}")
+    baseline = None
+    for fmt in FORMATS:
+        total, first = stream(fmt, audio)
+        baseline = baseline or total
+        stream_cpu = cpu_ms(lambda: stream(fmt, audio))
+        file_cpu = cpu_ms(lambda: encode_file(audio, SAMPLE_RATE, fmt))
+        rate = StreamEncoder(fmt, SAMPLE_RATE).sample_rate
+        print(f"{fmt:>8} {rate:>6} {total * 8 / AUDIO_SECONDS / 1000:>8.1f} {baseline / total:>6.1f}x "
+              f"{stream_cpu:>10.1f} {stream_cpu / AUDIO_SECONDS:>11.2f} "
+              f"{first * 1000 / SAMPLE_RATE:>14.0f} {file_cpu:>8.1f}")
@@ -0,0 +1,94 @@
+"""
+WebSocket output framing for the streaming sample servers.
+
+Synthesis produces audio in whatever pieces are convenient for the model
+(one phoneme = 256 or 512 samples in samples 7/8), and sending each piece as
+its own WebSocket message costs a syscall plus masking per ~1 KB. AudioFramer
+re-cuts the stream into frames of a target duration (TTS_FRAME_MS, e.g.
+20/40/100 ms) and flushes a partial frame whenever the producer has been idle
+for TTS_FLUSH_MS, so coalescing never adds more than that to latency.
+
+Before any audio the server sends `header()` as a JSON text message, so
+clients read the sample rate, dtype and frame size instead of hardcoding them.
+Clients may ask for a frame duration with `?frame_ms=`; it is clamped to
+[MIN_FRAME_MS, MAX_FRAME_MS] and the header reports what was granted.
+"""
+import asyncio
+import os
+
+import numpy as np
+
+MIN_FRAME_MS = 10
+MAX_FRAME_MS = 500
+
+
+class AudioFramer:
+    def __init__(self, sample_rate, dtype="float32", frame_ms=40, flush_ms=20, channels=1):
+        self.sample_rate = sample_rate
+        self.dtype = np.dtype(dtype).name
+        self.channels = channels
+        self.frame_ms = min(max(frame_ms, MIN_FRAME_MS), MAX_FRAME_MS)
+        self.flush_ms = flush_ms
+        self.sample_bytes = np.dtype(dtype).itemsize * channels
+        self.frame_samples = max(1, round(sample_rate * self.frame_ms / 1000))
+        self.frame_bytes = self.frame_samples * self.sample_bytes
+
+    @classmethod
+    def from_env(cls, sample_rate, dtype="float32", frame_ms=None):
+        """TTS_FRAME_MS (default 40) unless the client asked for `frame_ms`; TTS_FLUSH_MS (default 20)."""
+        if frame_ms is None:
+            frame_ms = float(os.environ.get("TTS_FRAME_MS", 40))
+        return cls(sample_rate, dtype, frame_ms=frame_ms, flush_ms=float(os.environ.get("TTS_FLUSH_MS", 20)))
+
+    def header(self):
+        return {
+            "type": "header",
+            "sample_rate": self.sample_rate,
+            "dtype": self.dtype,
+            "channels": self.channels,
+            "frame_samples": self.frame_samples,
+            "frame_ms": self.frame_ms,
+        }
+
+    def _take(self, buffer, n):
+        frame = bytes(buffer[:n])
+        del buffer[:n]
+        return frame
+
+    async def frames(self, chunks):
+        """
+        chunks: async iterator of raw audio bytes (whole samples)
+        Yields frames of exactly `frame_bytes`, except for idle flushes and the
+        final frame, which may be shorter.
+        """
+        buffer = bytearray()
+        source = chunks.__aiter__()
+        pending = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(source.__anext__())
+                if buffer and not pending.done():
+                    # Wait at most flush_ms for more audio, then send what we have
+                    await asyncio.wait({pending}, timeout=self.flush_ms / 1000)
+                    if not pending.done():
+                        flushable = len(buffer) - len(buffer) % self.sample_bytes
+                        if flushable:
+                            yield self._take(buffer, flushable)
+                        continue
+                try:
+                    chunk = await pending
+                except StopAsyncIteration:
+                    pending = None
+                    break
+                pending = None
+
+                buffer += chunk
+                while len(buffer) >= self.frame_bytes:
+                    yield self._take(buffer, self.frame_bytes)
+
+            if buffer:
+                yield self._take(buffer, len(buffer))
+        finally:
+            if pending is not None:
+                pending.cancel()
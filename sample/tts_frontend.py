@@ -0,0 +1,185 @@
+"""
+Shared text frontend: normalization → word tokenization → G2P → phoneme IDs.
+
+Replaces the per-character `phonemize` loops the sample servers each had.
+Words are looked up in a bounded LRU of pronunciations first (our traffic
+reuses a small vocabulary heavily); all misses in a request or batch are sent
+to the G2P backend in ONE call. Results come back as NumPy int64 arrays of
+phoneme IDs, ready for the acoustic model. The LRU is shared by all threads
+of a server and guarded by a lock.
+
+Backends:
+- RuleG2P:   the letter-to-phoneme table the samples always used (default).
+             One phoneme per character, so it skips tokenization and the
+             word cache: a direct character → phoneme / ID table is faster
+             than any lookup.
+- EspeakG2P: espeak-ng through the `phonemizer` package (optional dependency)
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from itertools import chain
+
+import numpy as np
+
+# --------------------------------------------------
+# Simple rule-based phoneme table (English only)
+# --------------------------------------------------
+PHONEME_MAP = {
+    "a": "AH", "b": "B", "c": "K", "d": "D", "e": "EH",
+    "f": "F", "g": "G", "h": "HH", "i": "IH", "j": "JH",
+    "k": "K", "l": "L", "m": "M", "n": "N", "o": "OW",
+    "p": "P", "q": "K", "r": "R", "s": "S", "t": "T",
+    "u": "UH", "v": "V", "w": "W", "x": "KS", "y": "Y",
+    "z": "Z",
+    " ": "SP"
+}
+
+SILENCE = "SP"
+PHONEMES = sorted(set(PHONEME_MAP.values()))
+PHONEME_ID_MAP = {p: i for i, p in enumerate(PHONEMES)}
+
+# Letters of any script plus combining marks (Devanagari vowel signs are marks, not letters)
+_WORD = r"(?:[^\W\d_]|[\u0300-\u036f\u0900-\u0963\u0966-\u097f])+"
+WORD_RE = re.compile(_WORD)
+# group 1 = word, group 2 = any other single character
+TOKEN_RE = re.compile(f"({_WORD})|(.)", re.DOTALL)
+
+
+class RuleG2P:
+    """One phoneme per letter from PHONEME_MAP; anything unmapped is silence."""
+
+    symbols = PHONEMES
+    table = PHONEME_MAP
+
+    def __call__(self, words):
+        return [[PHONEME_MAP.get(ch, SILENCE) for ch in word] for word in words]
+
+
+class EspeakG2P:
+    """espeak-ng G2P; every call phonemizes the whole word list in one backend invocation."""
+
+    def __init__(self, language="en-us", symbols=None, max_symbols=len(PHONEMES)):
+        from phonemizer.backend import EspeakBackend
+        from phonemizer.separator import Separator
+
+        self.backend = EspeakBackend(language, preserve_punctuation=False, with_stress=False)
+        self.separator = Separator(phone=" ", word="", syllable="")
+        # IPA symbols get IDs in first-seen order unless a fixed inventory is given.
+        # IDs stay below max_symbols (the servers' NUM_PHONEMES embedding rows);
+        # symbols seen after that map to silence.
+        self.open_vocabulary = symbols is None
+        self.symbols = list(symbols) if symbols else [SILENCE]
+        self.max_symbols = max_symbols
+
+    def __call__(self, words):
+        outputs = self.backend.phonemize(list(words), separator=self.separator, strip=True)
+        return [out.split() for out in outputs]
+
+
+class Frontend:
+    def __init__(self, g2p=None, cache_size=50000):
+        self.g2p = g2p or RuleG2P()
+        self.symbol_to_id = {s: i for i, s in enumerate(self.g2p.symbols)}
+        self.silence_id = self.symbol_to_id.get(SILENCE, 0)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # word -> (phonemes, phoneme IDs)
+        self._lock = threading.Lock()
+        self._symbols = {}
+        # Per-character backends: char -> phoneme and char -> ID, unmapped chars are silence
+        table = getattr(self.g2p, "table", None)
+        self._char_phonemes = table
+        self._char_ids = table and {ch: self.symbol_to_id[p] for ch, p in table.items()}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text):
+        return unicodedata.normalize("NFKC", text).lower()
+
+    @staticmethod
+    def tokenize(text):
+        """Words (runs of letters, any script) plus every other character on its own."""
+        return [word or char for word, char in TOKEN_RE.findall(text)]
+
+    @staticmethod
+    def is_word(token):
+        return WORD_RE.fullmatch(token) is not None
+
+    def _lookup(self, words):
+        """Pronunciations for `words`, with a single backend call for all cache misses."""
+        found, missing = {}, []
+        with self._lock:
+            for word in dict.fromkeys(words):
+                entry = self._cache.get(word)
+                if entry is not None:
+                    self._cache.move_to_end(word)
+                    found[word] = entry
+                    self.hits += 1
+                else:
+                    missing.append(word)
+                    self.misses += 1
+        if not missing:
+            return found
+
+        # The backend runs outside the lock; concurrent misses of one word just both compute it
+        pronunciations = self.g2p(missing)
+        with self._lock:
+            for word, phones in zip(missing, pronunciations):
+                found[word] = self._cache[word] = self._entry(phones)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return found
+
+    def _entry(self, phonemes):
+        return tuple(phonemes), tuple(self._id(p) for p in phonemes)
+
+    def _id(self, phoneme):
+        if phoneme not in self.symbol_to_id:
+            max_symbols = getattr(self.g2p, "max_symbols", None)
+            if not getattr(self.g2p, "open_vocabulary", False) or (
+                    max_symbols is not None and len(self.symbol_to_id) >= max_symbols):
+                return self.silence_id
+            self.g2p.symbols.append(phoneme)
+            self.symbol_to_id[phoneme] = len(self.symbol_to_id)
+        return self.symbol_to_id[phoneme]
+
+    def phonemize_batch(self, texts):
+        """texts -> list of (phonemes, np.int64 phoneme IDs)."""
+        if self._char_phonemes is not None:
+            return [self._phonemize_chars(self.normalize(t)) for t in texts]
+        tokenized = [TOKEN_RE.findall(self.normalize(t)) for t in texts]
+        pronunciations = self._lookup([word for tokens in tokenized for word, _ in tokens if word])
+
+        results = []
+        for tokens in tokenized:
+            entries = [pronunciations[word] if word else self._symbol(char) for word, char in tokens]
+            phonemes = [p for entry_phonemes, _ in entries for p in entry_phonemes]
+            ids = np.fromiter(chain.from_iterable(ids for _, ids in entries), dtype=np.int64, count=len(phonemes))
+            results.append((phonemes, ids))
+        return results
+
+    def _phonemize_chars(self, text):
+        phonemes = [self._char_phonemes.get(ch, SILENCE) for ch in text]
+        ids = np.fromiter([self._char_ids.get(ch, self.silence_id) for ch in text], dtype=np.int64, count=len(text))
+        return phonemes, ids
+
+    def _symbol(self, char):
+        """Spaces, punctuation and digits: one phoneme each, silence unless mapped."""
+        entry = self._symbols.get(char)
+        if entry is None:
+            with self._lock:
+                entry = self._symbols[char] = self._entry([PHONEME_MAP.get(char, SILENCE)])
+        return entry
+
+    def phonemize(self, text):
+        return self.phonemize_batch([text])[0]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "cached_words": len(self._cache)}
+
+
+# Shared instance for the sample servers
+frontend = Frontend()
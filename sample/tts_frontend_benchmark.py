@@ -0,0 +1,85 @@
+"""
+Micro-benchmark for tts_frontend
+Text → phoneme IDs per request: the original per-character loop against the
+shared Frontend (direct character table for the rule backend), and against
+the word-cache path with a cold and a warm cache. With `phonemizer` installed,
+also compares one espeak call per utterance against one batched call per
+request batch.
+
+Run from the sample directory:
+    python ./tts_frontend_benchmark.py
+"""
+import time
+
+import numpy as np
+
+from tts_frontend import Frontend, RuleG2P, EspeakG2P, PHONEME_MAP, PHONEME_ID_MAP
+
+REPEATS = 20
+BATCH_SIZE = 16
+TEXTS = [
+    "Hello, thank you for calling. Please hold while we connect you.",
+    "Your order has been shipped and will arrive in 3 days.",
+    "Namaste! I can speak a mix of Hindi and English.",
+    "Press one for billing, press two for technical support.",
+]
+
+# --------------------------------------------------
+# Reference: the original per-character loop
+# --------------------------------------------------
+def loop_phonemize(text):
+    phonemes = [PHONEME_MAP.get(ch, "SP") for ch in text.lower()]
+    return phonemes, np.array([PHONEME_ID_MAP[p] for p in phonemes], dtype=np.int64)
+
+class WordRuleG2P(RuleG2P):
+    """The rule backend without its character table: goes through the word cache like espeak."""
+    table = None
+
+def best_of(fn, fresh=None):
+    timings = []
+    for _ in range(REPEATS):
+        state = fresh() if fresh else None
+        start = time.perf_counter()
+        fn(state)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def report(name, ms, n):
+    print(f"{name:<28} {ms:>9.3f} {ms * 1000 / n:>10.1f}")
+
+if __name__ == "__main__":
+    batch = (TEXTS * BATCH_SIZE)[:BATCH_SIZE]
+
+    # The rule backend must reproduce the old loop exactly, with and without the word cache
+    table = Frontend()
+    warm = Frontend(WordRuleG2P())
+    for text in TEXTS:
+        old_phonemes, old_ids = loop_phonemize(text)
+        for frontend in (table, warm):
+            phonemes, ids = frontend.phonemize(text)
+            assert phonemes == old_phonemes and np.array_equal(ids, old_ids)
+
+    print(f"{BATCH_SIZE} utterances per batch, best of {REPEATS}")
+    print(f"{'':<28} {'batch ms':>9} {'us/utt':>10}")
+    report("per-char loop", best_of(lambda _: [loop_phonemize(t) for t in batch]), BATCH_SIZE)
+    report("frontend, char table", best_of(lambda _: table.phonemize_batch(batch)), BATCH_SIZE)
+    report("word cache, cold", best_of(lambda f: f.phonemize_batch(batch), lambda: Frontend(WordRuleG2P())),
+           BATCH_SIZE)
+    report("word cache, warm", best_of(lambda _: warm.phonemize_batch(batch)), BATCH_SIZE)
+
+    try:
+        from phonemizer import phonemize
+        espeak = EspeakG2P()
+    except (ImportError, RuntimeError) as e:
+        print(f"skipping espeak comparison: {e}")
+    else:
+        report("phonemize() per utterance",
+               best_of(lambda _: [phonemize(t, language="en-us", backend="espeak") for t in batch]),
+               BATCH_SIZE)
+        report("espeak, batched, cold cache",
+               best_of(lambda f: f.phonemize_batch(batch), lambda: Frontend(espeak)), BATCH_SIZE)
+        espeak_warm = Frontend(espeak)
+        espeak_warm.phonemize_batch(batch)
+        report("espeak, batched, warm cache", best_of(lambda _: espeak_warm.phonemize_batch(batch)), BATCH_SIZE)
+
+    print(f"warm word cache: {warm.stats()}")
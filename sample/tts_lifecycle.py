@@ -0,0 +1,122 @@
+"""
+Startup lifecycle for the model-serving sample servers.
+
+Loading weights and the first inferences (CUDA context, cuDNN autotuning,
+allocator growth, lazy module init) take seconds, and used to land on the
+first users after every deploy. ModelLifecycle runs
+
+    weight load → warm-up synthesis over representative text lengths
+
+in a background thread started from the FastAPI lifespan, so the process
+answers /healthz right away while /readyz only turns 200 once warm-up has
+finished. Handlers turn requests away (BUSY_CLOSE_CODE) until then.
+
+Phase timings (import, weight_load, warm_up) are logged as one startup
+breakdown line and reported by /readyz.
+
+Environment:
+- TTS_WARMUP=0            skip warm-up (ready right after loading)
+- TTS_WARMUP_ROUNDS       passes over the warm-up texts (default 2)
+- TTS_WARMUP_TEXTS        "|"-separated texts replacing WARMUP_TEXTS
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Short, medium and multi-sentence inputs, so every kernel shape the servers
+# hit (first vocoder chunk, full chunks, several sentences) is tried once
+WARMUP_TEXTS = [
+    "Hello.",
+    "Thank you for calling, how can I help you today?",
+    "Your order has been shipped and should arrive within three business days. "
+    "You will receive a message with the tracking number as soon as the courier "
+    "picks it up. Is there anything else I can help you with?",
+]
+
+
+class ModelLifecycle:
+    def __init__(self, load, warm_up, texts=None, rounds=None, enabled=None):
+        """
+        load:    blocking fn loading the models
+        warm_up: blocking fn synthesizing one text end to end
+        """
+        self.load = load
+        self.warm_up = warm_up
+        env_texts = os.environ.get("TTS_WARMUP_TEXTS")
+        self.texts = texts or (env_texts.split("|") if env_texts else WARMUP_TEXTS)
+        self.rounds = rounds if rounds is not None else int(os.environ.get("TTS_WARMUP_ROUNDS", 2))
+        self.enabled = enabled if enabled is not None else os.environ.get("TTS_WARMUP", "1") == "1"
+
+        self.status = "starting"  # starting → loading → warming → ready | failed
+        self.error = None
+        self.timings = {}         # phase -> seconds
+        self.warmup_ms = []       # per round, to see cold vs warm
+        self._task = None
+
+    @property
+    def ready(self):
+        return self.status == "ready"
+
+    def mark(self, phase, seconds):
+        self.timings[phase] = seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name, time.perf_counter() - start)
+
+    def _run(self):
+        try:
+            self.status = "loading"
+            with self.phase("weight_load"):
+                self.load()
+
+            self.status = "warming"
+            with self.phase("warm_up"):
+                for _ in range(self.rounds if self.enabled else 0):
+                    start = time.perf_counter()
+                    for text in self.texts:
+                        self.warm_up(text)
+                    self.warmup_ms.append((time.perf_counter() - start) * 1000)
+
+            self.status = "ready"
+            breakdown = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.timings.items())
+            rounds = " → ".join(f"{ms:.0f}" for ms in self.warmup_ms)
+            logger.info(f"Startup: {breakdown} (warm-up rounds ms: {rounds or 'skipped'})")
+        except Exception as e:
+            self.status = "failed"
+            self.error = repr(e)
+            logger.error("Startup failed", exc_info=True)
+
+    def start(self):
+        """Call from the lifespan: loading and warm-up run off the event loop."""
+        self._task = asyncio.get_running_loop().run_in_executor(None, self._run)
+        return self._task
+
+    def report(self):
+        return {
+            "status": self.status,
+            "error": self.error,
+            "startup_s": {phase: round(seconds, 3) for phase, seconds in self.timings.items()},
+            "warmup_round_ms": [round(ms, 1) for ms in self.warmup_ms],
+        }
+
+    def add_routes(self, app):
+        @app.get("/healthz")
+        def healthz():
+            # Liveness: the process is up; only a failed startup should get it restarted
+            code = 503 if self.status == "failed" else 200
+            return JSONResponse({"status": self.status}, status_code=code)
+
+        @app.get("/readyz")
+        def readyz():
+            return JSONResponse(self.report(), status_code=200 if self.ready else 503)
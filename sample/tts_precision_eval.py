@@ -0,0 +1,147 @@
+"""
+Quality / latency / memory evaluation of the precision modes in tts_backends
+For MeloLikeTTS (and, with --hifigan, the HiFi-GAN of samples 9/10) every
+backend × precision runs on the same inputs and is compared with eager fp32:
+
+- MeloLikeTTS: mel MSE (and SNR) against the fp32 mel
+- HiFi-GAN:    waveform SNR against the fp32 waveform, from the mel of a
+               speech-like signal
+- median latency on the longest input, and resident memory added by loading
+  and running the model (each configuration runs in a fresh process)
+
+Run from the sample directory:
+    python ./tts_precision_eval.py [--checkpoint ../checkpoints/ckpt_step00012345.pt] [--hifigan] [--threads 4]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from tts_backends import FLOAT_DTYPES, TorchBackend, load_backend
+
+# The export code and the model live with the training code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.train import export  # noqa: E402
+
+REPEATS = 10
+TEXT_LENGTHS = [32, 128, 256]   # MeloLikeTTS input tokens
+AUDIO_SECONDS = [1, 4]          # HiFi-GAN input, as mel of this much audio
+CONFIGS = [("torch", "fp32"), ("torch", "int8"), ("torch", "bf16"), ("torch", "fp16"),
+           ("onnx", "fp32"), ("onnx", "int8")]
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except FileNotFoundError:
+        import resource
+        # Peak rather than current outside Linux; bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def hifigan_inputs():
+    from speechbrain.lobes.models.HifiGAN import mel_spectogram
+    from tts_formats_benchmark import speech_like
+
+    mels = []
+    for seconds in AUDIO_SECONDS:
+        audio = torch.from_numpy(speech_like(seconds, 22050))
+        # The LibriTTS 22050 Hz HiFi-GAN's mel config
+        mel = mel_spectogram(22050, 256, 1024, 1024, 80, 0.0, 8000.0, 1, False, "slaney", "slaney", True, audio)
+        mels.append((mel.unsqueeze(0).numpy(),))
+    return mels
+
+
+def melo_inputs():
+    rng = np.random.default_rng(0)
+    return [(rng.integers(0, 50, (1, n)), np.zeros(1, dtype=np.int64)) for n in TEXT_LENGTHS]
+
+
+def evaluate(model, kind, precision, paths, threads):
+    """Runs in its own process, so resident memory is this configuration's alone."""
+    torch.set_num_threads(threads)
+    inputs = melo_inputs() if model == "melo" else hifigan_inputs()
+    baseline = rss_mb()
+
+    if kind == "torch":
+        if model == "melo":
+            # Loaded straight into the float dtype the precision runs in
+            module = export.load_melo(paths["checkpoint"], dtype=FLOAT_DTYPES[precision])
+        else:
+            module = export.load_hifigan()
+        backend = TorchBackend(module, precision=precision)
+    else:
+        backend = load_backend("onnx", paths[model], precision=precision)
+
+    outputs = [backend.run(*x) for x in inputs]
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        backend.run(*inputs[-1])
+        timings.append(time.perf_counter() - start)
+    return outputs, np.median(timings) * 1000, rss_mb() - baseline
+
+
+def snr_db(reference, output):
+    noise = np.sum((reference - output) ** 2)
+    return float("inf") if noise == 0 else 10 * np.log10(np.sum(reference ** 2) / noise)
+
+
+def report(title, model, paths, threads):
+    print(f"\n{title}")
+    print(f"{'backend':<8} {'precision':<9} {'mel MSE':>10} {'SNR dB':>8} {'median ms':>10} {'vs fp32':>8} {'RSS MB':>8}")
+    spawn = multiprocessing.get_context("spawn")
+    reference = reference_ms = None
+    for kind, precision in CONFIGS:
+        with spawn.Pool(1) as pool:
+            try:
+                outputs, ms, rss = pool.apply(evaluate, (model, kind, precision, paths, threads))
+            except Exception as e:
+                print(f"{kind:<8} {precision:<9} unsupported: {e}")
+                continue
+        if reference is None:
+            reference, reference_ms = outputs, ms
+        mse = np.mean([np.mean((r - o) ** 2) for r, o in zip(reference, outputs)])
+        snr = np.mean([snr_db(r, o) for r, o in zip(reference, outputs)])
+        mse_column = f"{mse:>10.2e}" if model == "melo" else f"{'':>10}"
+        print(f"{kind:<8} {precision:<9} {mse_column} {snr:>8.1f} {ms:>10.2f} {reference_ms / ms:>7.2f}x {rss:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checkpoint", help="train.py checkpoint (random weights if omitted)")
+    parser.add_argument("--hifigan", action="store_true", help="also evaluate HiFi-GAN (needs speechbrain)")
+    parser.add_argument("--threads", type=int, default=1, help="torch and ONNX Runtime intra-op threads")
+    args = parser.parse_args()
+    os.environ["TTS_ORT_THREADS"] = str(args.threads)
+    # glibc otherwise raises its mmap threshold after the first large free and keeps
+    # every later activation buffer on the heap, so RSS reflects allocation history
+    # more than the model; the same setting applies to every configuration
+    os.environ.setdefault("MALLOC_MMAP_THRESHOLD_", str(2**20))
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        paths = {"checkpoint": args.checkpoint}
+        if not args.checkpoint:
+            # Same random weights in every process
+            torch.manual_seed(0)
+            paths["checkpoint"] = os.path.join(out_dir, "random.pth")
+            torch.save(export.load_melo().state_dict(), paths["checkpoint"])
+
+        melo = export.load_melo(paths["checkpoint"])
+        paths["melo"] = export.export(melo, export.melo_example_inputs(), out_dir, "melo_like_tts",
+                                      export.MELO_IO, int8=True)[1]
+        if args.hifigan:
+            paths["hifigan"] = export.export(export.load_hifigan(), export.hifigan_example_inputs(), out_dir,
+                                             "hifigan", export.HIFIGAN_IO, int8=True)[1]
+
+        print(f"torch {torch.__version__}, {args.threads} thread(s); RSS = memory added by loading + running")
+        report("MeloLikeTTS (text tokens → mel), vs eager fp32", "melo", paths, args.threads)
+        if args.hifigan:
+            report("HiFi-GAN (mel → waveform), vs eager fp32", "hifigan", paths, args.threads)
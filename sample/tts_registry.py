@@ -0,0 +1,283 @@
+"""
+Model registry for multi-model sample servers.
+
+Each sample server used to hardcode one acoustic model and one vocoder, so
+serving several languages meant one process per language, each holding its
+own HiFi-GAN. ModelRegistry hosts several models in one process:
+
+- requests are routed on `language` ("en-IN" falls back to "en")
+- acoustic models with the same mel config share one vocoder instance
+- models are loaded on first use, not at startup
+- models are accounted by parameter + buffer bytes and the least recently
+  used ones are evicted once the total exceeds TTS_MODEL_BUDGET_MB
+
+Models in use (between acquire() and release()) are never evicted, and a
+vocoder stays resident while any loaded acoustic model depends on it.
+End-to-end models (MeloTTS) are registered without a mel config and get no
+vocoder.
+
+`stats()` reports what is resident, sizes and load / hit / eviction counters
+for /metrics.
+"""
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownLanguage(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class MelConfig:
+    """What a vocoder must agree on with the acoustic model feeding it."""
+    sample_rate: int
+    n_mels: int = 80
+    hop_length: int = 256
+    f_min: float = 0.0
+    f_max: float = 8000.0
+
+
+def model_bytes(model):
+    """Parameter + buffer bytes of a torch module, or of the modules a wrapper holds."""
+    if torch is not None and isinstance(model, torch.nn.Module):
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    # SpeechBrain Pretrained keeps its modules in .mods, our wrappers in .model
+    return sum(model_bytes(getattr(model, attr)) for attr in ("mods", "model") if hasattr(model, attr))
+
+
+class _Spec:
+    def __init__(self, name, kind, load, mel_config, vocoder=None, languages=()):
+        self.name = name
+        self.kind = kind            # "acoustic" | "vocoder"
+        self.load = load
+        self.mel_config = mel_config
+        self.vocoder = vocoder      # name of the shared vocoder (acoustic models only)
+        self.languages = languages
+        self.size = 0               # bytes, known after the first load
+
+
+class _Entry:
+    def __init__(self, model, size):
+        self.model = model
+        self.size = size
+        self.users = 0
+        self.last_used = time.time()
+
+
+class Pipeline:
+    """An acquired (acoustic model, vocoder) pair; hand it back with release()."""
+
+    def __init__(self, name, acoustic, vocoder, sample_rate):
+        self.name = name
+        self.acoustic = acoustic
+        self.vocoder = vocoder      # None for end-to-end models
+        self.sample_rate = sample_rate
+
+
+class ModelRegistry:
+    def __init__(self, budget_bytes=0):
+        """budget_bytes: soft limit on resident model bytes (0 = unlimited)"""
+        self.budget_bytes = budget_bytes
+        self._specs = {}
+        self._routes = {}              # language -> acoustic model name
+        self._loaded = OrderedDict()   # name -> _Entry, least recently used first
+        self._lock = threading.Lock()
+        self._load_locks = {}          # name -> threading.Lock, one load per model at a time
+
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    @classmethod
+    def from_env(cls):
+        """TTS_MODEL_BUDGET_MB (default 0 = keep everything that was loaded)."""
+        return cls(budget_bytes=int(float(os.environ.get("TTS_MODEL_BUDGET_MB", 0)) * 1024 * 1024))
+
+    # ------------------ Registration ------------------
+    def add_vocoder(self, name, load, mel_config):
+        self._add(_Spec(name, "vocoder", load, mel_config))
+
+    def add_acoustic(self, name, load, languages, mel_config=None, sample_rate=None):
+        """
+        mel_config: what the model outputs; it is paired with the first
+                    registered vocoder with the same config. None = end to end.
+        sample_rate: output rate of an end-to-end model; None = the loaded
+                     model's own `sample_rate` (e.g. MeloTTS's config)
+        """
+        vocoder = None
+        if mel_config is not None:
+            vocoder = next((s.name for s in self._specs.values()
+                            if s.kind == "vocoder" and s.mel_config == mel_config), None)
+            if vocoder is None:
+                raise ValueError(f"No registered vocoder matches the mel config of {name}: {mel_config}")
+        spec = _Spec(name, "acoustic", load, mel_config or MelConfig(sample_rate), vocoder, tuple(languages))
+        self._add(spec)
+        for language in spec.languages:
+            self.route(language, name)
+
+    def _add(self, spec):
+        if spec.name in self._specs:
+            raise ValueError(f"Model {spec.name!r} is already registered")
+        self._specs[spec.name] = spec
+        self._load_locks[spec.name] = threading.Lock()
+
+    def route(self, language, name):
+        """Send requests for `language` to acoustic model `name` (overrides earlier routes)."""
+        if name not in self._specs or self._specs[name].kind != "acoustic":
+            raise ValueError(f"Unknown acoustic model {name!r}")
+        self._routes[language.lower()] = name
+
+    def resolve(self, language):
+        """Acoustic model name for `language`: exact tag first, then the primary subtag."""
+        language = language.lower().replace("_", "-")
+        for tag in (language, language.split("-")[0]):
+            if tag in self._routes:
+                return self._routes[tag]
+        raise UnknownLanguage(f"No model for language {language!r}, expected one of {self.languages}")
+
+    @property
+    def languages(self):
+        return sorted(self._routes)
+
+    # ------------------ Acquire / release ------------------
+    def acquire(self, language):
+        """
+        Blocking: the pipeline for `language`, loading its models if needed.
+        Run it on an executor; the models stay resident until release().
+        """
+        spec = self._specs[self.resolve(language)]
+        vocoder = self._use(spec.vocoder) if spec.vocoder else None
+        try:
+            acoustic = self._use(spec.name)
+        except Exception:
+            if vocoder is not None:
+                self._unuse(spec.vocoder)
+            raise
+        sample_rate = spec.mel_config.sample_rate
+        if sample_rate is None:
+            sample_rate = acoustic.sample_rate
+        return Pipeline(spec.name, acoustic, vocoder, sample_rate)
+
+    def release(self, pipeline):
+        spec = self._specs[pipeline.name]
+        with self._lock:
+            for name in (spec.name, spec.vocoder):
+                if name is not None:
+                    self._loaded[name].users -= 1
+            self._make_room(0)
+
+    @contextmanager
+    def use(self, language):
+        pipeline = self.acquire(language)
+        try:
+            yield pipeline
+        finally:
+            self.release(pipeline)
+
+    def _take(self, name):
+        entry = self._loaded.get(name)
+        if entry is not None:
+            entry.users += 1
+            entry.last_used = time.time()
+            self._loaded.move_to_end(name)
+        return entry
+
+    def _use(self, name):
+        with self._lock:
+            entry = self._take(name)
+            if entry is not None:
+                self.hits += 1
+                return entry.model
+
+        # Other models keep serving while this one loads; concurrent requests
+        # for the same model wait for the first load instead of repeating it
+        with self._load_locks[name]:
+            with self._lock:
+                entry = self._take(name)
+                if entry is not None:
+                    self.hits += 1
+                    return entry.model
+                # Size is only known from an earlier load; otherwise the budget
+                # is enforced right after loading
+                self._make_room(self._specs[name].size)
+
+            start = time.perf_counter()
+            model = self._specs[name].load()
+            seconds = time.perf_counter() - start
+
+            with self._lock:
+                entry = _Entry(model, model_bytes(model))
+                self._specs[name].size = entry.size
+                self._loaded[name] = entry
+                self._take(name)
+                self.loads += 1
+                self.load_seconds += seconds
+                logger.info(f"Loaded {name} ({entry.size / 2**20:.0f} MB) in {seconds:.2f}s")
+                self._make_room(0)
+            return model
+
+    def _unuse(self, name):
+        with self._lock:
+            self._loaded[name].users -= 1
+
+    # ------------------ Eviction ------------------
+    def resident_bytes(self):
+        return sum(entry.size for entry in self._loaded.values())
+
+    def _evictable(self, name):
+        if self._loaded[name].users:
+            return False
+        # A shared vocoder goes only once no resident acoustic model needs it
+        return not any(self._specs[other].vocoder == name for other in self._loaded)
+
+    def _make_room(self, incoming):
+        """Evict least recently used, unused models until `incoming` more bytes fit. Holds _lock."""
+        if not self.budget_bytes:
+            return
+        freed = False
+        while self.resident_bytes() + incoming > self.budget_bytes:
+            victim = next((name for name in self._loaded if self._evictable(name)), None)
+            if victim is None:
+                # Everything left is in use; the budget is soft
+                break
+            entry = self._loaded.pop(victim)
+            self.evictions += 1
+            freed = True
+            logger.info(f"Evicted {victim} ({entry.size / 2**20:.0f} MB, idle {time.time() - entry.last_used:.0f}s)")
+        if freed:
+            gc.collect()
+            if torch is not None and torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resident_mb": round(self.resident_bytes() / 2**20, 1),
+                "budget_mb": round(self.budget_bytes / 2**20, 1),
+                "loaded": {
+                    name: {"size_mb": round(entry.size / 2**20, 1), "users": entry.users,
+                           "idle_s": round(time.time() - entry.last_used, 1)}
+                    for name, entry in self._loaded.items()
+                },
+                "routes": dict(self._routes),
+                "vocoders": {name: spec.vocoder for name, spec in self._specs.items() if spec.vocoder},
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_seconds": round(self.load_seconds, 2),
+            }
@@ -0,0 +1,146 @@
+"""
+Incremental (chunked) vocoding for the sample streaming servers.
+
+Instead of running the vocoder over the whole utterance and slicing the
+result, `stream_vocode` decodes the mel in windows of `chunk_frames`, each
+padded with `context_frames` of mel on both sides so the vocoder's receptive
+field sees real neighbours, keeps only the centre of each window, and
+crossfades `crossfade` samples across chunk boundaries to hide any seam.
+Each chunk is yielded as soon as it is decoded, so first audio goes out after
+one small window instead of after the whole utterance.
+
+`pipelined_stream` runs that per sentence, overlapping the acoustic model
+for sentence N+1 with vocoding and sending sentence N.
+
+StreamTimer / LatencyStats record time-to-first-byte against total
+synthesis time so that claim can be checked from /metrics.
+"""
+import asyncio
+import time
+
+import numpy as np
+
+
+def stream_vocode(vocode, mel, hop_length, chunk_frames=40, first_chunk_frames=16,
+                  context_frames=10, crossfade=256):
+    """
+    vocode: callable taking a mel slice [..., n_mels, t] and returning a 1-D
+            float waveform of t * hop_length samples
+    mel:    [..., n_mels, T] (torch tensor or numpy array)
+    Yields float32 numpy chunks which concatenate to the full waveform.
+    """
+    total = mel.shape[-1]
+    crossfade = min(crossfade, context_frames * hop_length)
+    fade_in = np.linspace(0.0, 1.0, crossfade, dtype=np.float32)
+    tail = None
+    start = 0
+    size = first_chunk_frames
+
+    while start < total:
+        end = min(start + size, total)
+        win_start = max(start - context_frames, 0)
+        win_end = min(end + context_frames, total)
+        audio = np.asarray(vocode(mel[..., win_start:win_end]), dtype=np.float32).reshape(-1)
+
+        # Centre of the window, plus `crossfade` extra samples to blend into the next chunk
+        lo = (start - win_start) * hop_length
+        hi = (end - win_start) * hop_length
+        last = end == total
+        chunk = audio[lo:hi if last else hi + crossfade]
+
+        if tail is not None:
+            n = min(len(tail), len(chunk))
+            chunk = chunk.copy()
+            chunk[:n] = tail[:n] * (1.0 - fade_in[:n]) + chunk[:n] * fade_in[:n]
+
+        if last:
+            yield chunk
+        else:
+            tail = chunk[-crossfade:] if crossfade else None
+            yield chunk[:len(chunk) - crossfade]
+
+        start = end
+        size = chunk_frames
+
+
+async def pipelined_stream(segments, acoustic, vocode_chunks, max_in_flight=2):
+    """
+    segments:      texts to synthesize in order (e.g. from tts_text.split_sentences)
+    acoustic:      async fn, text -> mel
+    vocode_chunks: fn, mel -> async iterator of audio chunks
+    At most `max_in_flight` mels wait ahead of the one being streamed.
+    """
+    mels = asyncio.Queue(maxsize=max_in_flight)
+
+    async def produce():
+        try:
+            for segment in segments:
+                await mels.put(await acoustic(segment))
+            await mels.put(None)
+        except Exception as e:
+            await mels.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            mel = await mels.get()
+            if mel is None:
+                break
+            if isinstance(mel, Exception):
+                raise mel
+            async for chunk in vocode_chunks(mel):
+                yield chunk
+    finally:
+        producer.cancel()
+
+
+class StreamTimer:
+    """Per-request timing: start → first chunk sent → done."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first = None
+        self.end = None
+
+    def chunk_sent(self):
+        if self.first is None:
+            self.first = time.perf_counter()
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def ttfb(self):
+        return None if self.first is None else self.first - self.start
+
+    @property
+    def total(self):
+        return None if self.end is None else self.end - self.start
+
+
+class LatencyStats:
+    """Keeps the last `window` TTFB / total times for reporting percentiles."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.ttfb = []
+        self.total = []
+
+    def record(self, timer):
+        if timer.ttfb is None or timer.total is None:
+            return
+        self.ttfb = (self.ttfb + [timer.ttfb])[-self.window:]
+        self.total = (self.total + [timer.total])[-self.window:]
+
+    def summary(self):
+        if not self.ttfb:
+            return {"count": 0}
+        ttfb = np.array(self.ttfb) * 1000
+        total = np.array(self.total) * 1000
+        return {
+            "count": len(ttfb),
+            "ttfb_ms_p50": float(np.percentile(ttfb, 50)),
+            "ttfb_ms_p95": float(np.percentile(ttfb, 95)),
+            "total_ms_p50": float(np.percentile(total, 50)),
+            "total_ms_p95": float(np.percentile(total, 95)),
+        }
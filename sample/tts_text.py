@@ -0,0 +1,81 @@
+"""
+Text segmentation for the streaming servers.
+
+Long LLM outputs are split into sentences (and over-long sentences into
+clauses) so each piece can be synthesized on its own: memory and latency stay
+bounded, Tacotron2's attention sees short inputs, and sentence N+1 can be
+synthesized while sentence N is still streaming.
+
+Handles the Hindi–English mixed text we target: the Devanagari danda (।)
+and double danda (॥) end sentences like '.', '!' and '?', and common
+abbreviations in both scripts (Mr., Dr., डॉ.) don't.
+"""
+import re
+
+SENTENCE_END = re.compile(r"""(?:(?<=[.!?।॥])|(?<=[.!?।॥]["'”’)\]]))\s+|\n\s*\n""")
+CLAUSE_END = re.compile(r"(?<=[,;:—–])\s+")
+
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e",
+    "डॉ", "श्री", "सं",
+}
+# Also ordinary words: abbreviations only in front of a number ("No. 5", "Vol. 2")
+NUMBER_ABBREVIATIONS = {"no", "vol", "fig", "p", "pp"}
+# Single capitals that are words of their own, not initials ("so did I.", "plan A.")
+NOT_INITIALS = {"I", "A"}
+
+
+def _ends_with_abbreviation(piece, following):
+    """Whether the '.' ending `piece` belongs to an abbreviation, given the `following` piece."""
+    if not piece.endswith("."):
+        return False
+    last = piece.rsplit(None, 1)[-1].strip("\"'“‘([").rstrip(".")
+    if last.lower() in ABBREVIATIONS:
+        return True
+    if last.lower() in NUMBER_ABBREVIATIONS:
+        return following[:1].isdigit()
+    # Initials: "J. K. Rowling", "M. Gandhi"
+    return len(last) == 1 and last.isupper() and last not in NOT_INITIALS and following[:1].isupper()
+
+
+def _pack(pieces, max_chars):
+    """Greedily join consecutive pieces while they fit in max_chars."""
+    packed = []
+    for piece in pieces:
+        if packed and len(packed[-1]) + 1 + len(piece) <= max_chars:
+            packed[-1] = f"{packed[-1]} {piece}"
+        else:
+            packed.append(piece)
+    return packed
+
+
+def _split_long(sentence, max_chars):
+    pieces = []
+    for clause in _pack(CLAUSE_END.split(sentence), max_chars):
+        if len(clause) <= max_chars:
+            pieces.append(clause)
+        else:
+            # No usable punctuation: fall back to word boundaries
+            pieces.extend(_pack(clause.split(), max_chars))
+    return pieces
+
+
+def split_sentences(text, max_chars=200):
+    """Split `text` into sentences of at most `max_chars` characters (where possible)."""
+    sentences = []
+    for piece in SENTENCE_END.split(text.strip()):
+        piece = " ".join(piece.split())
+        if not piece:
+            continue
+        if sentences and _ends_with_abbreviation(sentences[-1], piece):
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+
+    segments = []
+    for sentence in sentences:
+        if len(sentence) > max_chars:
+            segments.extend(_split_long(sentence, max_chars))
+        else:
+            segments.append(sentence)
+    return segments
@@ -0,0 +1,183 @@
+# checkpoint.py
+"""
+Asynchronous, resumable checkpoints.
+
+A checkpoint is everything train() needs to continue exactly where it
+stopped: model, optimizer and GradScaler state, the RNG states (torch, CUDA,
+NumPy, Python) and the sampler position (epoch + next batch), so a restart
+resumes mid-epoch on the same batch order.
+
+`save()` only takes a CPU copy of the state on the training thread; the
+copy is serialized to disk on a background thread while training continues.
+At most one write is in flight: a save that arrives while the previous one
+is still writing waits for it, which bounds memory to one extra copy.
+
+Files are written to a temporary name, fsynced and renamed, so a crash never
+leaves a truncated checkpoint behind. `checkpoints.json` lists what is on
+disk in write order; only the last `keep_last` written and the `keep_best`
+with the best metric are kept. A fresh (not resumed) run moves the previous
+run's checkpoints and manifest aside first, so their higher step numbers
+never count as "newer" than its own.
+
+Everything is stored as tensors / plain Python values, so checkpoints load
+with `torch.load(..., weights_only=True)`.
+"""
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+MANIFEST_FILE = "checkpoints.json"
+
+
+# ------------------ State helpers ------------------
+def to_cpu(obj):
+    """Copy of a (nested) state dict with every tensor detached and copied to CPU memory."""
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(v) for v in obj)
+    return obj
+
+
+def capture_rng():
+    kind, keys, pos, has_gauss, gauss = np.random.get_state()
+    return {
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else [],
+        "numpy": (kind, torch.from_numpy(keys.astype(np.int64)), pos, has_gauss, gauss),
+        "python": random.getstate(),
+    }
+
+
+def restore_rng(state):
+    torch.set_rng_state(state["torch"])
+    if state["cuda"] and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+    kind, keys, pos, has_gauss, gauss = state["numpy"]
+    np.random.set_state((kind, keys.numpy().astype(np.uint32), pos, has_gauss, gauss))
+    version, internal, gauss_next = state["python"]
+    random.setstate((version, tuple(internal), gauss_next))
+
+
+def _atomic_write(path, write):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# ------------------ Manager ------------------
+class CheckpointManager:
+    def __init__(self, directory, keep_last=3, keep_best=2, mode="min", fresh=False):
+        """
+        mode:  whether a lower ("min", e.g. loss) or higher ("max") metric is better
+        fresh: a new run; checkpoints listed in an existing manifest are moved to
+               `<directory>/previous-<time>/` instead of being managed (and deleted) by this one
+        """
+        self.directory = directory
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.mode = mode
+        os.makedirs(directory, exist_ok=True)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending = None
+        self.entries = self._read_manifest()
+        if fresh:
+            self._set_aside()
+
+    def _read_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return []
+        # Drop entries whose file is gone (e.g. deleted by hand)
+        return [e for e in entries if os.path.exists(os.path.join(self.directory, e["file"]))]
+
+    def _set_aside(self):
+        manifest = os.path.join(self.directory, MANIFEST_FILE)
+        if not os.path.exists(manifest):
+            return
+        target = os.path.join(self.directory, time.strftime("previous-%Y%m%d-%H%M%S"))
+        os.makedirs(target, exist_ok=True)
+        for e in self.entries:
+            os.replace(os.path.join(self.directory, e["file"]), os.path.join(target, e["file"]))
+        os.replace(manifest, os.path.join(target, MANIFEST_FILE))
+        print(f"Warning: fresh start in {self.directory}, which holds {len(self.entries)} checkpoint(s) "
+              f"of a previous run; moved them to {target}")
+        self.entries = []
+
+    def _write_manifest(self):
+        data = json.dumps(self.entries, indent=1).encode()
+        _atomic_write(os.path.join(self.directory, MANIFEST_FILE), lambda f: f.write(data))
+
+    # ------------------ Saving ------------------
+    def save(self, state, step, metric=None):
+        """
+        state:  dict of state dicts / tensors / plain values (see train.py)
+        step:   global step, names the file
+        metric: value ranked for keep_best (e.g. epoch loss); None = not ranked
+        """
+        self.wait()  # one write in flight; also surfaces the previous write's error
+        snapshot = to_cpu(state)
+        self._pending = self._writer.submit(self._write, snapshot, step, metric)
+
+    def _write(self, snapshot, step, metric):
+        name = f"ckpt_step{step:08d}.pt"
+        _atomic_write(os.path.join(self.directory, name), lambda f: torch.save(snapshot, f))
+        # Write order, not step order: a run resumed from an older checkpoint
+        # must not have its new files ranked behind the abandoned ones
+        self.entries = [e for e in self.entries if e["file"] != name]
+        self.entries.append({"file": name, "step": step, "metric": metric})
+        self._retain()
+        self._write_manifest()
+
+    def _retain(self):
+        keep = {e["file"] for e in self.entries[-self.keep_last:]} if self.keep_last else set()
+        ranked = sorted((e for e in self.entries if e["metric"] is not None),
+                        key=lambda e: e["metric"], reverse=self.mode == "max")
+        keep |= {e["file"] for e in ranked[:self.keep_best]}
+        for e in self.entries:
+            if e["file"] not in keep:
+                try:
+                    os.remove(os.path.join(self.directory, e["file"]))
+                except FileNotFoundError:
+                    pass
+        self.entries = [e for e in self.entries if e["file"] in keep]
+
+    def wait(self):
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def close(self):
+        self.wait()
+        self._writer.shutdown()
+
+    # ------------------ Loading ------------------
+    def latest(self):
+        return os.path.join(self.directory, self.entries[-1]["file"]) if self.entries else None
+
+    def best(self):
+        ranked = sorted((e for e in self.entries if e["metric"] is not None),
+                        key=lambda e: e["metric"], reverse=self.mode == "max")
+        return os.path.join(self.directory, ranked[0]["file"]) if ranked else None
+
+    def load(self, path="auto", map_location="cpu"):
+        """path: a checkpoint file, "auto" for the latest one here; returns None if there is none."""
+        self.wait()
+        if path == "auto":
+            path = self.latest()
+        if path is None:
+            return None
+        return torch.load(path, map_location=map_location, weights_only=True)
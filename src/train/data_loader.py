@@ -1,26 +1,53 @@
 # data_loader.py
 import os
 import torch
-import librosa
 import numpy as np
 import pandas as pd
+import soundfile as sf
 from torch.utils.data import Dataset, DataLoader
-from phonemizer import phonemize
+
+from src.train.mel_cache import MelParams, load_mel, open_or_build_mel_cache
 
 # Define a simple vocabulary for phonemes
 VOCAB = "abcdefghijklmnopqrstuvwxyz. !?, "
 CHAR_TO_ID = {char: i for i, char in enumerate(VOCAB)}
 
 class LJSpeechDataset(Dataset):
-    def __init__(self, target_dir, n_mels=80):
+    def __init__(self, target_dir, n_mels=80, n_fft=1024, hop_length=256, sample_rate=22050,
+                 use_mel_cache=False, mel_cache_root=None):
         self.target_dir = target_dir
         self.wav_dir = os.path.join(target_dir, "wavs")
-        self.metadata = pd.read_csv(os.path.join(target_dir, "metadata.csv"), 
-                                    sep="|", header=None, quoting=3)
+        metadata = pd.read_csv(os.path.join(target_dir, "metadata.csv"), 
+                               sep="|", header=None, quoting=3)
+        # Per-item data is kept in flat arrays rather than a DataFrame of Python
+        # strings: DataLoader workers forked from this process then share the pages
+        # copy-on-write, instead of each worker touching (and so copying) every
+        # object's refcount.
+        self.file_ids = metadata.iloc[:, 0].to_numpy(dtype=np.str_)
+        tokens = [self.preprocess_text(str(t)) for t in metadata.iloc[:, 2]] # Use normalized text
+        self.text_offsets = np.cumsum([0] + [len(t) for t in tokens])
+        self.text_tokens = torch.cat(tokens)
         self.n_mels = n_mels
+        self.mel_params = MelParams(sample_rate, n_mels, n_fft, hop_length)
+        # Precomputed mels (see mel_cache.py); rebuilt if the params changed
+        self.mel_cache = None
+        if use_mel_cache:
+            self.mel_cache = open_or_build_mel_cache(target_dir, self.mel_params, mel_cache_root)
 
     def __len__(self):
-        return len(self.metadata)
+        return len(self.file_ids)
+
+    def mel_lengths(self):
+        """Mel frame count of every item, without decoding any audio."""
+        if self.mel_cache is not None:
+            return np.asarray(self.mel_cache.frame_lengths)
+        # Only the WAV header is read; frames are scaled to the target sample rate
+        lengths = []
+        for file_id in self.file_ids:
+            info = sf.info(os.path.join(self.wav_dir, f"{file_id}.wav"))
+            samples = int(np.ceil(info.frames * self.mel_params.sample_rate / info.samplerate))
+            lengths.append(1 + samples // self.mel_params.hop_length)
+        return np.asarray(lengths)
 
     def preprocess_text(self, text):
         text = text.lower()
@@ -29,19 +56,15 @@ class LJSpeechDataset(Dataset):
 
     def get_mel(self, filename):
         wav_path = os.path.join(self.wav_dir, f"{filename}.wav")
-        audio, _ = librosa.load(wav_path, sr=22050)
-        # Standard TTS Mel-spectrogram parameters
-        mel = librosa.feature.melspectrogram(y=audio, sr=22050, n_mels=self.n_mels, 
-                                             n_fft=1024, hop_length=256)
-        mel = librosa.power_to_db(mel, ref=np.max)
-        return torch.FloatTensor(mel)
+        return torch.from_numpy(load_mel(wav_path, self.mel_params))
 
     def __getitem__(self, idx):
-        file_id = self.metadata.iloc[idx, 0]
-        raw_text = self.metadata.iloc[idx, 2] # Use normalized text
-        
-        text_tensor = self.preprocess_text(raw_text)
-        mel_tensor = self.get_mel(file_id)
+        text_tensor = self.text_tokens[self.text_offsets[idx]:self.text_offsets[idx + 1]]
+        if self.mel_cache is not None:
+            # Cache rows follow metadata.csv order; .float() is a no-op for float32 caches
+            mel_tensor = torch.from_numpy(self.mel_cache.get(idx)).float()
+        else:
+            mel_tensor = self.get_mel(self.file_ids[idx])
         
         return text_tensor, mel_tensor
 
@@ -50,12 +73,15 @@ def collate_fn(batch):
     # Padding sequences to match the longest one in the batch
     texts, mels = zip(*batch)
     texts_padded = torch.nn.utils.rnn.pad_sequence(texts, batch_first=True)
-    
+    # Real lengths, so the model and the loss can ignore the padding (see losses.py)
+    text_lengths = torch.LongTensor([t.size(0) for t in texts])
+    mel_lengths = torch.LongTensor([m.size(1) for m in mels])
+
     # Mel spectrograms need padding on the time axis (last dimension)
-    max_mel_len = max([m.size(1) for m in mels])
+    max_mel_len = int(mel_lengths.max())
     mels_padded = torch.stack([torch.nn.functional.pad(m, (0, max_mel_len - m.size(1))) for m in mels])
-    
-    return texts_padded, mels_padded
+
+    return texts_padded, text_lengths, mels_padded, mel_lengths
 
 if __name__ == "__main__":
     # Test the loader
@@ -63,7 +89,8 @@ if __name__ == "__main__":
     # On A100, you can easily use batch_size=64 or higher
     loader = DataLoader(dataset, batch_size=16, shuffle=True, collate_fn=collate_fn)
     
-    for texts, mels in loader:
+    for texts, text_lengths, mels, mel_lengths in loader:
         print(f"Batch Texts Shape: {texts.shape}") # [Batch, Text_Len]
         print(f"Batch Mels Shape: {mels.shape}")   # [Batch, 80, Mel_Len]
+        print(f"Real mel frames: {int(mel_lengths.sum())} of {mels.size(0) * mels.size(2)}")
         break
\ No newline at end of file
@@ -0,0 +1,137 @@
+# device.py
+"""
+Device / precision selection for training.
+
+`probe()` reports what this machine can do (CUDA and its GPUs, Apple MPS,
+bf16 support on GPU and CPU, torch.compile, phonemizer). `select()` turns
+a requested device / precision (or "auto") into a TrainSetup, picking the
+fastest supported combination:
+
+    CUDA with bf16 (Ampere+)    bf16 autocast, no GradScaler
+    older CUDA                  fp16 autocast + GradScaler
+    MPS                         fp32
+    CPU with native bf16        bf16 autocast (AVX512-BF16 / AMX), no GradScaler
+    other CPUs                  fp32
+
+GradScaler only exists to keep fp16 gradients from underflowing; bf16 has
+fp32's exponent range, so it trains without one.
+
+Usage (prints the probe and the setup "auto" resolves to):
+    python -m src.train.device
+"""
+import contextlib
+from dataclasses import dataclass
+
+import torch
+from torch.amp import GradScaler
+
+DEVICES = ("auto", "cuda", "mps", "cpu")
+PRECISIONS = ("auto", "fp32", "bf16", "fp16")
+AUTOCAST_DTYPES = {"bf16": torch.bfloat16, "fp16": torch.float16}
+
+
+def _cpu_bf16():
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def probe():
+    caps = {
+        "torch": torch.__version__,
+        "cuda": torch.cuda.is_available(),
+        "gpus": [torch.cuda.get_device_name(i) for i in range(torch.cuda.device_count())],
+        "cuda_bf16": torch.cuda.is_available() and torch.cuda.is_bf16_supported(),
+        "mps": torch.backends.mps.is_available(),
+        "cpu_bf16": _cpu_bf16(),
+        "cpu_threads": torch.get_num_threads(),
+        "compile": hasattr(torch, "compile"),
+    }
+    try:
+        import phonemizer
+        caps["phonemizer"] = phonemizer.__version__
+    except ImportError:
+        caps["phonemizer"] = None
+    return caps
+
+
+@dataclass(frozen=True)
+class TrainSetup:
+    device: torch.device
+    precision: str  # fp32 | bf16 | fp16
+    compile: bool = False
+
+    def autocast(self):
+        if self.precision == "fp32":
+            return contextlib.nullcontext()
+        return torch.autocast(self.device.type, dtype=AUTOCAST_DTYPES[self.precision])
+
+    def grad_scaler(self):
+        # Disabled scalers pass scale() / step() / update() straight through
+        return GradScaler(self.device.type, enabled=self.precision == "fp16")
+
+    def describe(self, caps=None):
+        caps = caps or probe()
+        if self.device.type == "cuda":
+            name = caps["gpus"][self.device.index or 0]
+        elif self.device.type == "cpu":
+            threads = caps["cpu_threads"]
+            name = f"CPU ({threads} thread{'s' if threads != 1 else ''})"
+        else:
+            name = self.device.type.upper()
+        return f"{name}, {self.precision}{', torch.compile' if self.compile else ''}"
+
+
+def select(device="auto", precision="auto", compile=False, caps=None):
+    """Resolve "auto" and reject combinations this machine can't run."""
+    if device not in DEVICES and not device.startswith("cuda:"):
+        raise ValueError(f"Unknown device {device!r}, expected one of {DEVICES}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    caps = caps or probe()
+
+    if device == "auto":
+        device = "cuda" if caps["cuda"] else "mps" if caps["mps"] else "cpu"
+    device = torch.device(device)
+    if device.type == "cuda" and not caps["cuda"]:
+        raise ValueError("CUDA requested but not available")
+    if device.type == "mps" and not caps["mps"]:
+        raise ValueError("MPS requested but not available")
+
+    bf16 = {"cuda": caps["cuda_bf16"], "cpu": caps["cpu_bf16"]}.get(device.type, False)
+    if precision == "auto":
+        if bf16:
+            precision = "bf16"
+        elif device.type == "cuda":
+            precision = "fp16"
+        else:
+            precision = "fp32"
+    if precision == "fp16" and device.type != "cuda":
+        raise ValueError("fp16 training (with GradScaler) needs a CUDA device; use bf16 or fp32")
+    if precision == "bf16" and device.type == "mps":
+        raise ValueError("bf16 autocast is not supported on MPS; use fp32")
+    if precision == "bf16" and device.type == "cuda" and not bf16:
+        raise ValueError("This GPU has no bf16 support; use fp16")
+    # bf16 on a CPU without native support is allowed (it is emulated, just slow)
+
+    if compile and not caps["compile"]:
+        raise ValueError(f"torch.compile needs torch >= 2.0, found {caps['torch']}")
+    return TrainSetup(device, precision, compile)
+
+
+def main():
+    caps = probe()
+    print(f"PyTorch Version: {caps['torch']}")
+    print(f"CUDA Available: {caps['cuda']}")
+    for i, name in enumerate(caps["gpus"]):
+        print(f"GPU {i}: {name}")
+    print(f"BFloat16 on GPU: {caps['cuda_bf16']} | on CPU: {caps['cpu_bf16']}")
+    print(f"MPS Available: {caps['mps']}")
+    print(f"torch.compile: {caps['compile']}")
+    print(f"Phonemizer Version: {caps['phonemizer'] or 'not installed'}")
+    print(f"Training would use: {select(caps=caps).describe(caps)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# distributed.py
+"""
+Multi-process (DistributedDataParallel) training support.
+
+train.py runs single-process unless it is launched by torchrun, which sets
+RANK / LOCAL_RANK / WORLD_SIZE for every process it starts:
+
+    torchrun --nproc_per_node=8 -m src.train.train          # 8 GPUs, NCCL
+    TTS_TRAIN_DEVICE=cpu TTS_TRAIN_PRECISION=fp32 \\
+        torchrun --nproc_per_node=4 -m src.train.train      # 4 CPU processes, gloo
+
+Each process trains on its own slice of every epoch's batches (see
+BucketBatchSampler's num_replicas / rank) and DDP averages the gradients.
+Only rank 0 prints, writes metrics and saves checkpoints; metrics are summed
+over all ranks first, so throughput is the whole job's.
+"""
+import os
+from dataclasses import dataclass
+
+import torch
+import torch.distributed as dist
+
+BACKENDS = ("auto", "nccl", "gloo")
+
+
+@dataclass(frozen=True)
+class Distributed:
+    rank: int = 0
+    local_rank: int = 0
+    world_size: int = 1
+
+    @classmethod
+    def from_env(cls):
+        """The torchrun environment of this process; a single process if not launched by torchrun."""
+        return cls(int(os.environ.get("RANK", 0)), int(os.environ.get("LOCAL_RANK", 0)),
+                   int(os.environ.get("WORLD_SIZE", 1)))
+
+    @property
+    def enabled(self):
+        return self.world_size > 1
+
+    @property
+    def is_main(self):
+        return self.rank == 0
+
+    def device(self, requested="auto"):
+        """One GPU per process on CUDA; "auto" falls back to CPU, the only other device DDP runs on."""
+        if not self.enabled:
+            return requested
+        if requested in ("auto", "cuda") and torch.cuda.is_available():
+            return f"cuda:{self.local_rank}"
+        return "cpu" if requested == "auto" else requested
+
+    def init_process_group(self, device, backend="auto"):
+        if not self.enabled:
+            return
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        device = torch.device(device)
+        if backend == "auto":
+            backend = "nccl" if device.type == "cuda" else "gloo"
+        if device.type == "cuda":
+            torch.cuda.set_device(device)
+        dist.init_process_group(backend, rank=self.rank, world_size=self.world_size)
+
+    def shutdown(self):
+        if self.enabled and dist.is_initialized():
+            dist.destroy_process_group()
+
+    # ------------------ Collectives ------------------
+    def all_reduce_sum(self, tensor):
+        if self.enabled:
+            dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+        return tensor
+
+    def all_gather_object(self, obj):
+        """[obj of rank 0, obj of rank 1, ...] on every rank"""
+        if not self.enabled:
+            return [obj]
+        objects = [None] * self.world_size
+        dist.all_gather_object(objects, obj)
+        return objects
+
+    def barrier(self):
+        if self.enabled:
+            dist.barrier()
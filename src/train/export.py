@@ -0,0 +1,174 @@
+# export.py
+"""
+Export MeloLikeTTS and the HiFi-GAN vocoder of samples 9/10 for inference
+outside of eager PyTorch.
+
+Each model is written in two formats, plus an optional int8 copy:
+- TorchScript (`<name>.pt`), for torch.jit.load / libtorch
+- ONNX (`<name>.onnx`), for ONNX Runtime on CPU-only nodes (see
+  sample/tts_backends.py)
+- with --int8, also `<name>.int8.onnx`: ONNX Runtime dynamic quantization,
+  int8 weights for Conv / MatMul / Gather, activations quantized at run
+  time. Transposed convolutions are exported as MatMul + overlap-add first
+  (see quantize.py), so they run as int8 GEMMs too
+
+Batch and sequence axes (text length, mel frames) are dynamic, so one file
+serves every input length.
+
+Usage:
+    python -m src.train.export --checkpoint checkpoints/ckpt_step00012345.pt --out exported
+    python -m src.train.export --hifigan --int8 --out exported   # needs speechbrain
+"""
+import os
+import copy
+import inspect
+import argparse
+import tempfile
+
+import torch
+import torch.nn as nn
+
+from src.train.model import MeloLikeTTS
+from src.train.quantize import linearize_conv_transposes
+
+ONNX_OPSET = 17
+HIFIGAN_SOURCE = "speechbrain/tts-hifigan-libritts-22050Hz"
+
+# input / output names and their dynamic axes, per model
+MELO_IO = {
+    "inputs": ["text_seq", "speaker_id"],
+    "outputs": ["mel"],
+    "dynamic_axes": {
+        "text_seq": {0: "batch", 1: "text_len"},
+        "speaker_id": {0: "batch"},
+        "mel": {0: "batch", 2: "frames"},
+    },
+}
+HIFIGAN_IO = {
+    "inputs": ["mel"],
+    "outputs": ["audio"],
+    "dynamic_axes": {
+        "mel": {0: "batch", 2: "frames"},
+        "audio": {0: "batch", 2: "samples"},
+    },
+}
+
+
+class HifiganInference(nn.Module):
+    """The generator as SpeechBrain's decode_batch runs it: replicate-padded mel → waveform."""
+
+    def __init__(self, generator):
+        super().__init__()
+        self.generator = generator
+
+    def forward(self, mel):
+        return self.generator.inference(mel)
+
+
+def load_melo(checkpoint=None, vocab_size=50, num_speakers=1, speaker_dim=256, dtype=torch.float32):
+    # Built directly in `dtype` and filled from the memory-mapped checkpoint:
+    # an fp16 / bf16 load never holds an fp32 copy of the model
+    default_dtype = torch.get_default_dtype()
+    torch.set_default_dtype(dtype)
+    try:
+        # Same hyperparameters as train.py
+        model = MeloLikeTTS(vocab_size=vocab_size, num_speakers=num_speakers, speaker_dim=speaker_dim)
+    finally:
+        torch.set_default_dtype(default_dtype)
+    if checkpoint:
+        state = torch.load(checkpoint, map_location="cpu", weights_only=True, mmap=True)
+        # train.py checkpoints keep the model next to optimizer / RNG state; bare state_dicts work too
+        model.load_state_dict(state.get("model", state))
+    return model.eval()
+
+
+def melo_example_inputs(batch=2, text_len=32):
+    return (torch.zeros(batch, text_len, dtype=torch.long), torch.zeros(batch, dtype=torch.long))
+
+
+def load_hifigan(source=HIFIGAN_SOURCE, savedir="pretrained_hifigan"):
+    from speechbrain.inference.vocoders import HIFIGAN
+
+    hifigan = HIFIGAN.from_hparams(source=source, savedir=savedir, run_opts={"device": "cpu"})
+    generator = hifigan.hparams.generator
+    # decode_batch does this on its first call; weight norm is training-only
+    if hifigan.first_call:
+        generator.remove_weight_norm()
+        hifigan.first_call = False
+    return HifiganInference(generator).eval()
+
+
+def hifigan_example_inputs(batch=1, frames=64, n_mels=80):
+    return (torch.randn(batch, n_mels, frames),)
+
+
+def export_torchscript(model, example_inputs, path):
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_inputs)
+    traced.save(path)
+    return path
+
+
+def export_onnx(model, example_inputs, path, io):
+    # dynamic_axes is the TorchScript-based exporter's API; newer torch
+    # defaults to the torch.export-based one unless told otherwise
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            example_inputs,
+            path,
+            input_names=io["inputs"],
+            output_names=io["outputs"],
+            dynamic_axes=io["dynamic_axes"],
+            opset_version=ONNX_OPSET,
+            **legacy,
+        )
+    return path
+
+
+def quantize_onnx(model, example_inputs, path, io):
+    """Write `<path stem>.int8.onnx`, a dynamically quantized export of `model`."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    int8_path = f"{os.path.splitext(path)[0]}.int8.onnx"
+    with tempfile.TemporaryDirectory() as tmp:
+        # MatMul + overlap-add instead of ConvTranspose, which has no int8 kernel
+        linear = export_onnx(linearize_conv_transposes(copy.deepcopy(model)), example_inputs,
+                             os.path.join(tmp, "linear.onnx"), io)
+        quantize_dynamic(linear, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def export(model, example_inputs, out_dir, name, io, int8=False):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [
+        export_torchscript(model, example_inputs, os.path.join(out_dir, f"{name}.pt")),
+        export_onnx(model, example_inputs, os.path.join(out_dir, f"{name}.onnx"), io),
+    ]
+    if int8:
+        paths.append(quantize_onnx(model, example_inputs, paths[1], io))
+    for path in paths:
+        print(f"Wrote {path} ({os.path.getsize(path) / 2**20:.1f} MB)")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkpoint", help="train.py checkpoint (random weights if omitted)")
+    parser.add_argument("--out", default="exported")
+    parser.add_argument("--vocab-size", type=int, default=50)
+    parser.add_argument("--num-speakers", type=int, default=1)
+    parser.add_argument("--hifigan", action="store_true", help=f"export {HIFIGAN_SOURCE} instead")
+    parser.add_argument("--int8", action="store_true", help="also write a dynamically quantized int8 ONNX copy")
+    args = parser.parse_args()
+
+    if args.hifigan:
+        export(load_hifigan(), hifigan_example_inputs(), args.out, "hifigan", HIFIGAN_IO, args.int8)
+    else:
+        model = load_melo(args.checkpoint, args.vocab_size, args.num_speakers)
+        export(model, melo_example_inputs(), args.out, "melo_like_tts", MELO_IO, args.int8)
+
+
+if __name__ == "__main__":
+    main()
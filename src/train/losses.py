@@ -0,0 +1,52 @@
+# losses.py
+"""
+Length-aware mel losses.
+
+collate_fn pads every mel in a batch to the longest one with zeros, while
+real log-mels are mostly negative, so a plain MSE over the padded tensor
+trains the model to predict the padding. These losses only count the real
+frames of each item (`lengths`, from collate_fn):
+
+    masked   padded frames are multiplied out of the squared error
+    packed   real frames are gathered into one [frames, n_mels] tensor first,
+             so the loss and its backward only touch real frames. Sizing that
+             tensor needs the lengths on the host: one sync per step.
+
+Both give the same value: the mean over real frames and mel bins. In
+"packed" mode train.py also runs MeloLikeTTS packed (`packed=True`), so the
+decoder's matmul skips the padded tokens as well; "masked" runs the model
+over the padded batch with the padding zeroed.
+"""
+import torch
+import torch.nn.functional as F
+
+LOSS_MODES = ("masked", "packed", "padded")
+
+
+def length_mask(lengths, max_len):
+    """[B, max_len] bool, True on the first lengths[b] positions of row b"""
+    return torch.arange(max_len, device=lengths.device) < lengths.unsqueeze(1)
+
+
+def masked_mse_loss(output, target, lengths):
+    """output / target: [B, n_mels, T]; lengths: [B] real frames per item"""
+    mask = length_mask(lengths, target.size(2)).unsqueeze(1).float()
+    # In fp32 whatever the autocast dtype: a bf16 sum over the whole batch loses precision
+    squared_error = (output.float() - target).pow(2) * mask
+    return squared_error.sum() / (mask.sum() * target.size(1))
+
+
+def packed_mse_loss(output, target, lengths):
+    mask = length_mask(lengths, target.size(2))
+    return F.mse_loss(output.transpose(1, 2)[mask], target.transpose(1, 2)[mask])
+
+
+def mel_loss(output, target, lengths, mode="masked"):
+    if mode == "masked":
+        return masked_mse_loss(output, target, lengths)
+    if mode == "packed":
+        return packed_mse_loss(output, target, lengths)
+    if mode == "padded":
+        # Every frame of the padded batch, padding included
+        return F.mse_loss(output, target)
+    raise ValueError(f"Unknown loss mode {mode!r}, expected one of {LOSS_MODES}")
@@ -0,0 +1,222 @@
+# mel_cache.py
+"""
+Offline mel-spectrogram cache for LJSpeech-style datasets.
+
+Every mel is computed once and appended to a single flat blob on disk
+(`mels.bin`), with an index (`index.npy`) holding the offset and frame count
+of each item. Training then reads zero-copy slices from a memory map instead
+of re-decoding the WAV with librosa on every epoch.
+
+The cache directory is keyed on the mel parameters (sample rate, n_mels,
+n_fft, hop_length), so changing any of them builds a fresh cache.
+
+Usage:
+    python -m src.train.mel_cache --data data/LJSpeech-1.1 --workers 8
+"""
+import os
+import json
+import shutil
+import argparse
+from dataclasses import dataclass, asdict
+from multiprocessing import Pool
+
+import librosa
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+BLOB_FILE = "mels.bin"
+INDEX_FILE = "index.npy"
+META_FILE = "meta.json"
+
+INDEX_DTYPE = np.dtype([("offset", np.int64), ("frames", np.int64)])
+
+
+@dataclass(frozen=True)
+class MelParams:
+    sample_rate: int = 22050
+    n_mels: int = 80
+    n_fft: int = 1024
+    hop_length: int = 256
+
+    @property
+    def key(self):
+        return f"sr{self.sample_rate}_mels{self.n_mels}_fft{self.n_fft}_hop{self.hop_length}"
+
+
+def load_mel(wav_path, params=MelParams()):
+    """Decode a WAV and return its log-mel spectrogram, shape [n_mels, T]."""
+    audio, _ = librosa.load(wav_path, sr=params.sample_rate)
+    return mel_from_audio(audio, params)
+
+
+def mel_from_audio(audio, params=MelParams()):
+    """Log-mel spectrogram, shape [n_mels, T], of float audio already at params.sample_rate."""
+    # Standard TTS Mel-spectrogram parameters
+    mel = librosa.feature.melspectrogram(y=audio, sr=params.sample_rate, n_mels=params.n_mels,
+                                         n_fft=params.n_fft, hop_length=params.hop_length)
+    mel = librosa.power_to_db(mel, ref=np.max)
+    return mel.astype(np.float32)
+
+
+def read_file_ids(target_dir):
+    metadata = pd.read_csv(os.path.join(target_dir, "metadata.csv"),
+                           sep="|", header=None, quoting=3)
+    return [str(f) for f in metadata.iloc[:, 0]]
+
+
+def default_cache_root(target_dir):
+    return os.path.join(target_dir, "mel_cache")
+
+
+def _load_mel_job(job):
+    wav_path, params = job
+    return load_mel(wav_path, params)
+
+
+class MelCache:
+    """
+    Read-only view over a built cache directory.
+
+    The memory map is opened lazily and dropped on pickling, so a dataset
+    holding a MelCache can be shipped to DataLoader workers cheaply; each
+    worker maps the same file and the OS shares the pages between them.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.params = MelParams(**self.meta["params"])
+        self.dtype = np.dtype(self.meta["dtype"])
+        self.file_ids = self.meta["file_ids"]
+        self.index = np.load(os.path.join(cache_dir, INDEX_FILE))
+        self._id_to_row = {fid: i for i, fid in enumerate(self.file_ids)}
+        self._blob = None
+
+    def __len__(self):
+        return len(self.file_ids)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_blob"] = None
+        return state
+
+    @property
+    def blob(self):
+        if self._blob is None:
+            # Copy-on-write keeps the slices writable (torch.from_numpy wants
+            # that) without ever touching the file on disk.
+            self._blob = np.memmap(os.path.join(self.cache_dir, BLOB_FILE),
+                                   dtype=self.dtype, mode="c")
+        return self._blob
+
+    @property
+    def frame_lengths(self):
+        return self.index["frames"]
+
+    def get(self, row):
+        """Return the mel of item `row` as a [n_mels, T] view into the blob."""
+        offset, frames = self.index[row]
+        n = self.params.n_mels * int(frames)
+        return self.blob[offset:offset + n].reshape(self.params.n_mels, int(frames))
+
+    def __getitem__(self, file_id):
+        return self.get(self._id_to_row[file_id])
+
+    def matches(self, params, file_ids, dtype=None):
+        """dtype: required mel dtype; None accepts whatever the cache was built with."""
+        return (self.meta.get("version") == CACHE_VERSION
+                and self.params == params
+                and (dtype is None or self.dtype == np.dtype(dtype))
+                and self.file_ids == list(file_ids))
+
+
+def build_mel_cache(target_dir, params=MelParams(), cache_root=None, dtype="float16",
+                    num_workers=0, file_ids=None):
+    """
+    Compute the mel of every item in `metadata.csv` and write the cache.
+
+    The cache is written into a temporary directory and renamed into place
+    only once complete, so an interrupted build never leaves a cache that
+    looks valid. Returns the opened MelCache.
+    """
+    cache_root = cache_root or default_cache_root(target_dir)
+    cache_dir = os.path.join(cache_root, params.key)
+    tmp_dir = cache_dir + ".tmp"
+    file_ids = list(file_ids) if file_ids is not None else read_file_ids(target_dir)
+    wav_dir = os.path.join(target_dir, "wavs")
+    jobs = [(os.path.join(wav_dir, f"{fid}.wav"), params) for fid in file_ids]
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    index = np.zeros(len(file_ids), dtype=INDEX_DTYPE)
+    offset = 0
+
+    pool = Pool(num_workers) if num_workers > 0 else None
+    mels = pool.imap(_load_mel_job, jobs, chunksize=16) if pool else map(_load_mel_job, jobs)
+    try:
+        with open(os.path.join(tmp_dir, BLOB_FILE), "wb") as blob:
+            for row, mel in enumerate(mels):
+                blob.write(np.ascontiguousarray(mel, dtype=dtype).tobytes())
+                index[row] = (offset, mel.shape[1])
+                offset += mel.size
+                if row % 1000 == 0:
+                    print(f"Cached {row}/{len(file_ids)} mels")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    np.save(os.path.join(tmp_dir, INDEX_FILE), index)
+    with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+        json.dump({"version": CACHE_VERSION, "params": asdict(params),
+                   "dtype": np.dtype(dtype).name, "file_ids": file_ids}, f)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    print(f"Mel cache written to {cache_dir} ({offset * np.dtype(dtype).itemsize / 1e6:.1f} MB)")
+    return MelCache(cache_dir)
+
+
+def open_or_build_mel_cache(target_dir, params=MelParams(), cache_root=None, dtype=None,
+                            num_workers=0):
+    """
+    Open the cache for `params`, rebuilding it if missing or stale.
+
+    A cache of another dtype than `dtype` is stale too; dtype=None reuses a
+    cache of any dtype and builds float16.
+    """
+    cache_root = cache_root or default_cache_root(target_dir)
+    cache_dir = os.path.join(cache_root, params.key)
+    file_ids = read_file_ids(target_dir)
+    if os.path.exists(os.path.join(cache_dir, META_FILE)):
+        cache = MelCache(cache_dir)
+        if cache.matches(params, file_ids, dtype):
+            return cache
+        print(f"Mel cache at {cache_dir} is stale, rebuilding...")
+    return build_mel_cache(target_dir, params, cache_root, dtype or "float16", num_workers, file_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute mel-spectrograms for training")
+    parser.add_argument("--data", default="data/LJSpeech-1.1")
+    parser.add_argument("--cache-root", default=None)
+    parser.add_argument("--sample-rate", type=int, default=22050)
+    parser.add_argument("--n-mels", type=int, default=80)
+    parser.add_argument("--n-fft", type=int, default=1024)
+    parser.add_argument("--hop-length", type=int, default=256)
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the cache is valid")
+    args = parser.parse_args()
+
+    params = MelParams(args.sample_rate, args.n_mels, args.n_fft, args.hop_length)
+    if args.force:
+        build_mel_cache(args.data, params, args.cache_root, args.dtype, args.workers)
+    else:
+        open_or_build_mel_cache(args.data, params, args.cache_root, args.dtype, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# metrics.py
+"""
+Training metrics without a host sync per step.
+
+`loss.item()` waits for the GPU to finish everything queued so far, so
+calling it every step keeps the CUDA queue empty. TrainMetrics adds
+per-step tensors (loss, ...) into on-device sums and copies them to the
+host once per `log_every` steps, together, in a single sync.
+
+Per interval it reports:
+- step time, split into data wait (blocked on the next batch) and compute
+  (everything else, including the GPU work the sync waited for)
+- samples/sec and mel-frames/sec over wall time, and the share of padding
+  when the steps report padded_frames too
+
+Each interval and each epoch is printed and appended as one JSON object per
+line to `jsonl_path`, so throughput can be charted across runs.
+
+With `world` (a distributed.Distributed), every rank calls step() and the
+sums are added across ranks in the same sync: loss is the mean over all
+ranks and samples/sec the whole job's. Only rank 0 prints and writes.
+"""
+import json
+import time
+
+import torch
+
+
+class TrainMetrics:
+    def __init__(self, log_every=10, jsonl_path=None, world=None):
+        self.log_every = log_every
+        self.world = world if world is not None and world.enabled else None
+        self.verbose = world is None or world.is_main
+        self.jsonl = open(jsonl_path, "a") if jsonl_path and self.verbose else None
+        self.global_step = 0
+        self.epoch = 0
+
+    # ------------------ Accumulation ------------------
+    def _sums(self):
+        # Tensors stay on the device until the next sync; ints are host-side counts
+        return {"steps": 0, "data_wait": 0.0, "start": time.perf_counter()}
+
+    def _add(self, sums, name, value):
+        if torch.is_tensor(value):
+            value = value.detach().float()
+        sums[name] = sums.get(name, 0) + value
+
+    def start_epoch(self, epoch):
+        self.epoch = epoch
+        self._interval = self._sums()
+        self._epoch = self._sums()
+        self._step_end = time.perf_counter()
+
+    def batch_ready(self):
+        """Call as soon as the next batch is in hand; the time since the last step is data wait."""
+        wait = time.perf_counter() - self._step_end
+        self._interval["data_wait"] += wait
+        self._epoch["data_wait"] += wait
+
+    def micro_step(self):
+        """Call after a gradient-accumulation micro-batch, so the next batch_ready() only counts data wait."""
+        self._step_end = time.perf_counter()
+
+    def step(self, **values):
+        """
+        values: per-step quantities to sum, e.g. loss=loss, samples=B, mel_frames=real frames,
+                padded_frames=B * T.
+        Tensors are summed on the device; "loss" is reported as a mean per step.
+        With a `world`, every rank must call step() the same number of times.
+        """
+        self.global_step += 1
+        for sums in (self._interval, self._epoch):
+            sums["steps"] += 1
+            for name, value in values.items():
+                self._add(sums, name, value)
+
+        if self._interval["steps"] == self.log_every:
+            record = self._summarize(self._interval, step=self.global_step)
+            self._emit("interval", record)
+            self._interval = self._sums()
+        self._step_end = time.perf_counter()
+
+    def end_epoch(self, **extra):
+        """Returns the epoch summary; `extra` (e.g. padding stats) is logged with it."""
+        record = {**self._summarize(self._epoch, step=self.global_step), **extra}
+        self._emit("epoch", record)
+        return record
+
+    # ------------------ Reporting ------------------
+    def _summarize(self, sums, **fields):
+        # The one device-to-host sync of the interval: every tensor sum in one copy
+        names = [name for name, value in sums.items() if torch.is_tensor(value)]
+        if self.world:
+            # One all-reduce for everything that is summed, host-side counts included.
+            # An epoch without steps has nothing to reduce (on every rank: all run as many steps)
+            names = [name for name in sums if name not in ("steps", "start", "data_wait")]
+            if names:
+                device = next((sums[name].device for name in names if torch.is_tensor(sums[name])), "cpu")
+                values = torch.stack([torch.as_tensor(sums[name], dtype=torch.float64, device=device)
+                                      for name in names])
+                host = self.world.all_reduce_sum(values).tolist()
+                sums = {**sums, **dict(zip(names, host))}
+        elif names:
+            host = torch.stack([sums[name] for name in names]).tolist()
+            sums = {**sums, **dict(zip(names, host))}
+
+        steps = max(sums["steps"], 1)
+        if self.world and "loss" in sums:
+            sums["loss"] /= self.world.world_size
+        wall = time.perf_counter() - sums["start"]
+        record = {"epoch": self.epoch, **fields, "steps": sums["steps"]}
+        if "loss" in sums:
+            record["loss"] = sums["loss"] / steps
+        record["step_ms"] = wall / steps * 1000
+        record["data_wait_ms"] = sums["data_wait"] / steps * 1000
+        record["compute_ms"] = record["step_ms"] - record["data_wait_ms"]
+        for name in ("samples", "mel_frames", "padded_frames"):
+            if name in sums:
+                record[f"{name}_per_sec"] = sums[name] / wall
+        if "mel_frames" in sums and "padded_frames" in sums:
+            record["padding_ratio"] = 1.0 - sums["mel_frames"] / max(sums["padded_frames"], 1)
+        return record
+
+    def _emit(self, kind, record):
+        if not self.verbose:
+            return
+        if kind == "interval":
+            line = f"Epoch {record['epoch']} | Step {record['step']}"
+        else:
+            line = f"--- Epoch {record['epoch']} summary"
+        if "loss" in record:
+            line += f" | Loss: {record['loss']:.4f}"
+        line += (f" | {record['step_ms']:.0f} ms/step "
+                 f"(data {record['data_wait_ms']:.0f}, compute {record['compute_ms']:.0f})")
+        if "samples_per_sec" in record:
+            line += f" | {record['samples_per_sec']:.1f} samples/s"
+        if "mel_frames_per_sec" in record:
+            line += f" | {record['mel_frames_per_sec']:.0f} mel frames/s"
+        print(line + (" ---" if kind == "epoch" else ""))
+
+        if self.jsonl:
+            self.jsonl.write(json.dumps({"type": kind, "time": time.time(), **record}) + "\n")
+            self.jsonl.flush()
+
+    def close(self):
+        if self.jsonl:
+            self.jsonl.close()
+            self.jsonl = None
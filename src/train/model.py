@@ -16,10 +16,51 @@ class MeloLikeTTS(nn.Module):
             stride=128
         )
 
-    def forward(self, text_seq, speaker_id):
+    def forward(self, text_seq, speaker_id, text_lengths=None, packed=False):
+        """packed: with text_lengths, run the decoder on the real tokens only (see _packed_forward)"""
+        if packed and text_lengths is not None:
+            return self._packed_forward(text_seq, speaker_id, text_lengths)
         t_feat = self.text_encoder(text_seq).transpose(1, 2)
         s_feat = self.speaker_emb(speaker_id).unsqueeze(-1)
         s_feat = s_feat.expand(-1, -1, t_feat.size(-1))
         combined = torch.cat([t_feat, s_feat], dim=1)
+        if text_lengths is not None:
+            # Zero the padding positions (token 0 is also "a") so they add nothing to the real frames
+            mask = torch.arange(text_seq.size(1), device=text_seq.device) < text_lengths.unsqueeze(1)
+            combined = combined * mask.unsqueeze(1).to(combined.dtype)
 
-        return self.decoder(combined)
\ No newline at end of file
+        return self.decoder(combined)
+
+    def _packed_forward(self, text_seq, speaker_id, text_lengths):
+        """
+        Same output as forward() with text_lengths, computed without the padding.
+
+        The decoder's kernel is a multiple of its stride, so it is a matmul of
+        every token column with the weight followed by an overlap-add of the
+        kernel's stride-sized pieces. Only the real tokens are gathered into
+        the matmul, which is nearly all of the decoder's compute; their
+        pieces are scattered back and overlap-added at the padded width, like
+        the zeros of masked padding would be. Needs the real token count on
+        the host: one sync per step.
+        """
+        batch, tokens = text_seq.shape
+        decoder = self.decoder
+        c_in, c_out, kernel = decoder.weight.shape
+        stride = decoder.stride[0]
+        taps = kernel // stride
+
+        mask = torch.arange(tokens, device=text_seq.device) < text_lengths.unsqueeze(1)
+        rows = mask.nonzero(as_tuple=True)
+        combined = torch.cat([self.text_encoder(text_seq[rows]), self.speaker_emb(speaker_id[rows[0]])], dim=1)
+        pieces = combined @ decoder.weight.reshape(c_in, c_out * kernel)      # [real tokens, c_out * kernel]
+
+        y = pieces.new_zeros(batch, tokens, c_out * kernel)
+        y[rows] = pieces
+        # [batch, c_out, taps, tokens, stride]: piece j of token t lands in output block t + j
+        y = y.view(batch, tokens, c_out, taps, stride).permute(0, 2, 3, 1, 4)
+        out = None
+        for j in range(taps):
+            piece = nn.functional.pad(y[:, :, j], (0, 0, j, taps - 1 - j))
+            out = piece if out is None else out + piece
+        out = out.reshape(batch, c_out, (tokens + taps - 1) * stride)
+        return out + decoder.bias.view(1, -1, 1)
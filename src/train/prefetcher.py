@@ -0,0 +1,54 @@
+# prefetcher.py
+"""
+Asynchronous host-to-device batch prefetching.
+
+Wraps a DataLoader so that while the model runs on batch N, batch N+1 is
+already being copied to the GPU on a side CUDA stream. Needs pinned host
+memory (`pin_memory=True` on the loader) for the copies to be truly async.
+On CPU it simply moves each batch with `.to(device)`.
+"""
+import torch
+
+
+def _to_device(batch, device, non_blocking=False):
+    return tuple(t.to(device, non_blocking=non_blocking) if torch.is_tensor(t) else t
+                 for t in batch)
+
+
+class DevicePrefetcher:
+    def __init__(self, loader, device):
+        self.loader = loader
+        self.device = torch.device(device)
+
+    def __len__(self):
+        return len(self.loader)
+
+    def _preload(self, it, stream):
+        try:
+            batch = next(it)
+        except StopIteration:
+            return None
+        with torch.cuda.stream(stream):
+            return _to_device(batch, self.device, non_blocking=True)
+
+    def __iter__(self):
+        if self.device.type != "cuda":
+            for batch in self.loader:
+                yield _to_device(batch, self.device)
+            return
+
+        stream = torch.cuda.Stream(self.device)
+        it = iter(self.loader)
+        next_batch = self._preload(it, stream)
+        while next_batch is not None:
+            # Compute must not start before this batch's copy has landed
+            current = torch.cuda.current_stream(self.device)
+            current.wait_stream(stream)
+            batch = next_batch
+            for t in batch:
+                if torch.is_tensor(t):
+                    # Memory was allocated on the side stream but is used on the
+                    # compute stream; tell the caching allocator not to reuse it early
+                    t.record_stream(current)
+            next_batch = self._preload(it, stream)
+            yield batch
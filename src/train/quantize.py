@@ -0,0 +1,117 @@
+# quantize.py
+"""
+int8 rewrites for convolution layers.
+
+Dynamic quantization (torch's quantize_dynamic, ONNX Runtime's) runs Linear
+/ MatMul as int8 GEMMs, but neither has a usable int8 transposed convolution
+on CPU: torch's dynamic ConvTranspose1d is too inaccurate, and ONNX Runtime
+runs a quantized (QDQ) ConvTranspose by dequantizing its weights back to
+fp32. Almost all of MeloLikeTTS's weights are in one.
+
+- LinearConvTranspose1d: a ConvTranspose1d whose kernel is a multiple of
+  its stride (MeloLikeTTS's decoder, HiFi-GAN's upsamplers) is a Linear over
+  the input frames followed by an overlap-add of the kernel's stride-sized
+  pieces. Exact in fp32, and the Linear then quantizes to an int8 GEMM
+  (fbgemm in torch, MatMulInteger in ONNX Runtime).
+- Int8WeightConv1d: any other Conv1d / ConvTranspose1d keeps int8 weights
+  (one scale per output channel) and dequantizes them on each call: a
+  quarter of the weight memory, fp32 compute.
+"""
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+def _replace(module, convert):
+    """Swap every child `c` for convert(c) where that returns a module; returns the count."""
+    count = 0
+    for name, child in module.named_children():
+        new = convert(child)
+        if new is not None:
+            setattr(module, name, new)
+            count += 1
+        else:
+            count += _replace(child, convert)
+    return count
+
+
+# ------------------ Transposed conv as Linear ------------------
+class LinearConvTranspose1d(nn.Module):
+    def __init__(self, conv):
+        super().__init__()
+        c_in, c_out, kernel = conv.weight.shape
+        self.c_out = c_out
+        self.stride = conv.stride[0]
+        self.taps = kernel // self.stride
+        self.padding = conv.padding[0]
+        # Input channel → every (output channel, kernel position) at once
+        self.linear = nn.Linear(c_in, c_out * kernel, bias=False)
+        self.linear.weight = nn.Parameter(conv.weight.detach().reshape(c_in, c_out * kernel).t().contiguous())
+        self.bias = conv.bias
+
+    @staticmethod
+    def supports(conv):
+        return (isinstance(conv, nn.ConvTranspose1d) and conv.groups == 1 and conv.dilation[0] == 1
+                and conv.output_padding[0] == 0 and conv.padding_mode == "zeros"
+                and conv.kernel_size[0] % conv.stride[0] == 0)
+
+    def forward(self, x):
+        batch, _, frames = x.shape
+        y = self.linear(x.transpose(1, 2)).view(batch, frames, self.c_out, self.taps, self.stride)
+        # [batch, c_out, taps, frames, stride]: piece j of frame t lands in output block t + j
+        y = y.permute(0, 2, 3, 1, 4)
+        if torch.onnx.is_in_onnx_export():
+            # Pad + add exports as plain ONNX ops
+            out = None
+            for j in range(self.taps):
+                piece = y[:, :, j].reshape(batch, self.c_out, frames * self.stride)
+                piece = F.pad(piece, (j * self.stride, (self.taps - 1 - j) * self.stride))
+                out = piece if out is None else out + piece
+        else:
+            # Accumulated in place from strided views: no per-piece copies
+            out = y.new_zeros(batch, self.c_out, frames + self.taps - 1, self.stride)
+            for j in range(self.taps):
+                out[:, :, j:j + frames] += y[:, :, j]
+            out = out.view(batch, self.c_out, -1)
+        if self.padding:
+            out = out[:, :, self.padding:-self.padding]
+        return out if self.bias is None else out + self.bias.view(1, -1, 1)
+
+
+def linearize_conv_transposes(module):
+    """Rewrite every supported ConvTranspose1d in place; returns the module."""
+    _replace(module, lambda m: LinearConvTranspose1d(m) if LinearConvTranspose1d.supports(m) else None)
+    return module
+
+
+# ------------------ Weight-only int8 conv ------------------
+class Int8WeightConv1d(nn.Module):
+    def __init__(self, conv):
+        super().__init__()
+        self.transposed = isinstance(conv, nn.ConvTranspose1d)
+        weight = conv.weight.detach().float()
+        # Output channels are dim 1 of a transposed conv's weight, dim 0 otherwise
+        reduce = (0, 2) if self.transposed else (1, 2)
+        scale = weight.abs().amax(dim=reduce, keepdim=True).clamp(min=1e-12) / 127
+        self.register_buffer("weight_int8", torch.round(weight / scale).to(torch.int8))
+        self.register_buffer("scale", scale)
+        self.bias = conv.bias
+        self.kwargs = {"stride": conv.stride, "padding": conv.padding, "dilation": conv.dilation,
+                       "groups": conv.groups}
+        if self.transposed:
+            self.kwargs["output_padding"] = conv.output_padding
+
+    @staticmethod
+    def supports(conv):
+        return isinstance(conv, (nn.Conv1d, nn.ConvTranspose1d)) and conv.padding_mode == "zeros"
+
+    def forward(self, x):
+        weight = self.weight_int8.to(x.dtype) * self.scale.to(x.dtype)
+        conv = F.conv_transpose1d if self.transposed else F.conv1d
+        return conv(x, weight, self.bias, **self.kwargs)
+
+
+def int8_weight_convs(module):
+    """Store every remaining Conv1d / ConvTranspose1d with int8 weights, in place; returns the module."""
+    _replace(module, lambda m: Int8WeightConv1d(m) if Int8WeightConv1d.supports(m) else None)
+    return module
@@ -0,0 +1,136 @@
+# sampler.py
+"""
+Length-bucketed batch sampling.
+
+A plain shuffled DataLoader mixes 1 s and 10 s clips in the same batch, so
+most of every padded mel tensor is zeros. BucketBatchSampler shuffles the
+dataset, cuts it into large "megabatches", sorts each megabatch by length and
+slices it into batches of similar length. Batch order is shuffled again so
+the model doesn't see all the long batches back to back.
+
+Batches are either a fixed number of items (`batch_size`) or as many items as
+fit in a padded-frame budget (`max_frames`), which keeps memory per step
+roughly constant.
+
+The batch order depends only on (seed, epoch), so a run resumed from a
+checkpoint calls `set_epoch(epoch, start_batch=n)` and continues with the
+same batches it would have seen.
+
+For distributed training every rank builds the same batch list (same seed
+and epoch) and keeps every `num_replicas`-th batch starting at `rank`, so
+the length bucketing is unchanged. The list is first padded, by repeating
+batches from its start, to a multiple of `num_replicas`: DDP needs every
+rank to run the same number of steps.
+
+With `groups` (e.g. ShardedDataset.shard_ids()), items are shuffled and
+bucketed within their group and the groups are visited one after the other
+in a random order, so consecutive batches read from the same shard.
+"""
+import torch
+from torch.utils.data import Sampler
+
+
+def padding_stats(lengths, batches):
+    """Return (real_frames, padded_frames) for a list of index batches."""
+    real = padded = 0
+    for batch in batches:
+        batch_lengths = [int(lengths[i]) for i in batch]
+        real += sum(batch_lengths)
+        padded += max(batch_lengths) * len(batch_lengths)
+    return real, padded
+
+
+class BucketBatchSampler(Sampler):
+    def __init__(self, lengths, batch_size=32, max_frames=None, megabatch_multiplier=50,
+                 shuffle=True, drop_last=False, seed=0, num_replicas=1, rank=0, groups=None):
+        self.lengths = torch.as_tensor(lengths, dtype=torch.long)
+        self.groups = None if groups is None else torch.as_tensor(groups, dtype=torch.long)
+        self.batch_size = batch_size
+        self.max_frames = max_frames
+        self.megabatch_size = batch_size * megabatch_multiplier
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+        self.start_batch = 0
+        self._batches = None
+        # Filled in per epoch so train() can report how much padding we saved
+        self.real_frames = 0
+        self.padded_frames = 0
+
+    def set_epoch(self, epoch, start_batch=0):
+        """start_batch: skip the batches of this epoch a resumed run has already trained on"""
+        self.epoch = epoch
+        self.start_batch = start_batch
+        self._batches = None
+
+    @property
+    def padding_ratio(self):
+        return 1.0 - self.real_frames / max(self.padded_frames, 1)
+
+    def _split(self, indices):
+        if self.max_frames is None:
+            batches = [indices[i:i + self.batch_size] for i in range(0, len(indices), self.batch_size)]
+            if self.drop_last and batches and len(batches[-1]) < self.batch_size:
+                batches.pop()
+            return batches
+
+        # Indices are sorted longest-first, so the first item sets the padded length
+        batches, batch, longest = [], [], 0
+        for idx in indices:
+            length = int(self.lengths[idx])
+            if batch and max(longest, length) * (len(batch) + 1) > self.max_frames:
+                batches.append(batch)
+                batch, longest = [], 0
+            batch.append(idx)
+            longest = max(longest, length)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _make_batches(self):
+        g = torch.Generator()
+        g.manual_seed(self.seed + self.epoch)
+        if self.groups is None:
+            groups = [torch.arange(len(self.lengths))]
+        else:
+            group_ids = torch.unique(self.groups)
+            if self.shuffle:
+                group_ids = group_ids[torch.randperm(len(group_ids), generator=g)]
+            groups = [torch.nonzero(self.groups == i).flatten() for i in group_ids]
+
+        batches = []
+        for group in groups:
+            order = group[torch.randperm(len(group), generator=g)] if self.shuffle else group
+            group_batches = []
+            for start in range(0, len(order), self.megabatch_size):
+                mega = order[start:start + self.megabatch_size]
+                mega = mega[torch.argsort(self.lengths[mega], descending=True)]
+                group_batches.extend(self._split(mega.tolist()))
+
+            if self.shuffle:
+                perm = torch.randperm(len(group_batches), generator=g).tolist()
+                group_batches = [group_batches[i] for i in perm]
+            batches.extend(group_batches)
+
+        # No batches at all (empty dataset): every rank gets none, nothing to pad from
+        if self.num_replicas > 1 and batches:
+            pad = -len(batches) % self.num_replicas
+            batches += [batches[i % len(batches)] for i in range(pad)]
+            batches = batches[self.rank::self.num_replicas]
+
+        self.real_frames, self.padded_frames = padding_stats(self.lengths, batches)
+        return batches
+
+    def batches(self):
+        if self._batches is None:
+            self._batches = self._make_batches()
+        return self._batches
+
+    def __iter__(self):
+        return iter(self.batches()[self.start_batch:])
+
+    def __len__(self):
+        return max(len(self.batches()) - self.start_batch, 0)
@@ -0,0 +1,240 @@
+# shards.py
+"""
+Sharded, pre-packed training data.
+
+LJSpeechDataset starts by parsing metadata.csv and tokenizing every line,
+and without the mel cache reads one small WAV per item: slow on network
+filesystems and in a fresh container. `pack()` writes text token IDs and
+mels (or 16-bit audio) of the whole dataset into a few large shards once;
+ShardedDataset then starts by reading a small JSON file and one index per
+shard, and serves items as slices of memory-mapped shard files.
+
+Layout of a shard directory:
+    meta.json                 format version, kind, mel params, dtypes, shard names, file IDs
+    shard-00000.tokens.bin    token IDs of every item in the shard, back to back
+    shard-00000.data.bin      mels ([n_mels, T], kind "mel") or PCM (kind "audio"), back to back
+    shard-00000.index.npy     per item: token offset / count, data offset / length
+
+Items are shuffled once at packing time, so every shard holds a mix of
+lengths. Pass `shard_ids()` to BucketBatchSampler as `groups` and each
+epoch visits the shards in a random order, shuffling and bucketing items
+within a shard: reads stay inside one file at a time.
+
+Usage:
+    python -m src.train.shards --data data/LJSpeech-1.1 --out data/LJSpeech-1.1-shards --workers 8
+"""
+import os
+import json
+import shutil
+import argparse
+from dataclasses import asdict
+from multiprocessing import Pool
+
+import librosa
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+from src.train.data_loader import LJSpeechDataset
+from src.train.mel_cache import MelParams, mel_from_audio, open_or_build_mel_cache
+
+SHARD_VERSION = 1
+META_FILE = "meta.json"
+KINDS = ("mel", "audio")
+TOKEN_DTYPE = np.dtype(np.int16)
+AUDIO_DTYPE = np.dtype(np.int16)
+
+INDEX_DTYPE = np.dtype([("text_offset", np.int64), ("text_length", np.int64),
+                        ("offset", np.int64), ("length", np.int64)])
+
+
+def _shard_name(i):
+    return f"shard-{i:05d}"
+
+
+def _load_audio_job(job):
+    wav_path, sample_rate = job
+    audio, _ = librosa.load(wav_path, sr=sample_rate)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(AUDIO_DTYPE)
+
+
+class _ShardWriter:
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.tokens = open(os.path.join(directory, f"{name}.tokens.bin"), "wb")
+        self.data = open(os.path.join(directory, f"{name}.data.bin"), "wb")
+        self.index = []
+        self.text_offset = self.offset = 0
+
+    @property
+    def nbytes(self):
+        return self.tokens.tell() + self.data.tell()
+
+    def add(self, tokens, data, length):
+        self.tokens.write(np.ascontiguousarray(tokens, dtype=TOKEN_DTYPE).tobytes())
+        self.data.write(np.ascontiguousarray(data).tobytes())
+        self.index.append((self.text_offset, len(tokens), self.offset, length))
+        self.text_offset += len(tokens)
+        self.offset += data.size
+
+    def close(self):
+        self.tokens.close()
+        self.data.close()
+        np.save(os.path.join(self.directory, f"{self.name}.index.npy"), np.array(self.index, dtype=INDEX_DTYPE))
+
+
+def pack(target_dir, out_dir, kind="mel", params=MelParams(), dtype="float16", shard_mb=256,
+         num_workers=0, seed=0):
+    """
+    Pack an LJSpeech-style dataset into shards of about `shard_mb` MB each.
+
+    kind "mel" stores mels of `params` (built through the mel cache, which
+    is reused if valid); kind "audio" stores 16-bit PCM at
+    params.sample_rate and leaves mel extraction to training. Like the mel
+    cache, the shards are written to a temporary directory and renamed
+    into place once complete.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind {kind!r}, expected one of {KINDS}")
+    if kind == "mel":
+        open_or_build_mel_cache(target_dir, params, dtype=dtype, num_workers=num_workers)
+    dataset = LJSpeechDataset(target_dir, params.n_mels, params.n_fft, params.hop_length,
+                              params.sample_rate, use_mel_cache=kind == "mel")
+    order = np.random.default_rng(seed).permutation(len(dataset))
+
+    pool = None
+    if kind == "mel":
+        items = (dataset[i][1].numpy().astype(dtype) for i in order)
+    else:
+        dtype = AUDIO_DTYPE.name
+        jobs = [(os.path.join(dataset.wav_dir, f"{dataset.file_ids[i]}.wav"), params.sample_rate) for i in order]
+        pool = Pool(num_workers) if num_workers > 0 else None
+        items = pool.imap(_load_audio_job, jobs, chunksize=16) if pool else map(_load_audio_job, jobs)
+
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    shards, writer, total = [], None, 0
+    try:
+        for n, (row, data) in enumerate(zip(order, items)):
+            if writer is None or writer.nbytes >= shard_mb * 2**20:
+                if writer:
+                    total += writer.nbytes
+                    writer.close()
+                writer = _ShardWriter(tmp_dir, _shard_name(len(shards)))
+                shards.append(writer.name)
+            tokens = dataset.text_tokens[dataset.text_offsets[row]:dataset.text_offsets[row + 1]].numpy()
+            writer.add(tokens, data, data.shape[-1])
+            if n % 1000 == 0:
+                print(f"Packed {n}/{len(order)} items into {len(shards)} shard(s)")
+        if writer:
+            total += writer.nbytes
+            writer.close()
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+        json.dump({"version": SHARD_VERSION, "kind": kind, "params": asdict(params), "dtype": dtype,
+                   "shards": shards, "file_ids": [str(dataset.file_ids[i]) for i in order]}, f)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    print(f"Packed {len(order)} items into {len(shards)} shard(s) in {out_dir} ({total / 1e6:.1f} MB)")
+    return ShardedDataset(out_dir)
+
+
+class ShardedDataset(Dataset):
+    """
+    Items of a packed shard directory, as (text tokens, mel [n_mels, T]) like LJSpeechDataset.
+
+    Shard files are memory-mapped lazily and the maps are dropped on
+    pickling, so DataLoader workers each map the same files and the OS
+    shares the pages between them.
+    """
+
+    def __init__(self, shard_dir):
+        self.shard_dir = shard_dir
+        with open(os.path.join(shard_dir, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get("version") != SHARD_VERSION:
+            raise ValueError(f"{shard_dir} was packed with format version {meta.get('version')}, "
+                             f"expected {SHARD_VERSION}; repack with `python -m src.train.shards`")
+        self.kind = meta["kind"]
+        self.mel_params = MelParams(**meta["params"])
+        self.n_mels = self.mel_params.n_mels
+        self.dtype = np.dtype(meta["dtype"])
+        self.shards = meta["shards"]
+        self.file_ids = meta["file_ids"]
+        indexes = [np.load(os.path.join(shard_dir, f"{name}.index.npy")) for name in self.shards]
+        self.index = np.concatenate(indexes)
+        self._shard_of = np.repeat(np.arange(len(indexes)), [len(index) for index in indexes])
+        self._maps = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_maps"] = {}
+        return state
+
+    def _map(self, shard, part, dtype):
+        key = (shard, part)
+        if key not in self._maps:
+            # Copy-on-write, as in MelCache: writable slices, file never modified
+            path = os.path.join(self.shard_dir, f"{self.shards[shard]}.{part}.bin")
+            self._maps[key] = np.memmap(path, dtype=dtype, mode="c")
+        return self._maps[key]
+
+    def shard_ids(self):
+        """Shard of every item, for BucketBatchSampler's `groups`."""
+        return self._shard_of
+
+    def mel_lengths(self):
+        """Mel frame count of every item, from the shard indexes alone."""
+        if self.kind == "mel":
+            return self.index["length"]
+        return 1 + self.index["length"] // self.mel_params.hop_length
+
+    def __getitem__(self, idx):
+        shard = self._shard_of[idx]
+        text_offset, text_length, offset, length = self.index[idx]
+        tokens = self._map(shard, "tokens", TOKEN_DTYPE)[text_offset:text_offset + text_length]
+        text_tensor = torch.from_numpy(tokens.astype(np.int64))
+
+        if self.kind == "mel":
+            mel = self._map(shard, "data", self.dtype)[offset:offset + self.n_mels * length]
+            # .float() is a no-op for float32 shards
+            mel_tensor = torch.from_numpy(mel.reshape(self.n_mels, int(length))).float()
+        else:
+            audio = self._map(shard, "data", self.dtype)[offset:offset + length]
+            mel_tensor = torch.from_numpy(mel_from_audio(audio.astype(np.float32) / 32768, self.mel_params))
+        return text_tensor, mel_tensor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a dataset into shards for training")
+    parser.add_argument("--data", default="data/LJSpeech-1.1")
+    parser.add_argument("--out", default=None, help="Output directory (default: <data>-shards)")
+    parser.add_argument("--kind", choices=KINDS, default="mel",
+                        help="Store mels, or 16-bit audio to compute mels during training")
+    parser.add_argument("--sample-rate", type=int, default=22050)
+    parser.add_argument("--n-mels", type=int, default=80)
+    parser.add_argument("--n-fft", type=int, default=1024)
+    parser.add_argument("--hop-length", type=int, default=256)
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16", help="Mel dtype")
+    parser.add_argument("--shard-mb", type=float, default=256, help="Approximate size of each shard")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the packing-time shuffle")
+    args = parser.parse_args()
+
+    params = MelParams(args.sample_rate, args.n_mels, args.n_fft, args.hop_length)
+    pack(args.data, args.out or args.data.rstrip("/") + "-shards", args.kind, params, args.dtype,
+         args.shard_mb, args.workers, args.seed)
+
+
+if __name__ == "__main__":
+    main()
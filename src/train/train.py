@@ -1,55 +1,166 @@
 # train.py
+import contextlib
+import os
 import torch
-import torch.nn as nn
-from torch.amp import autocast, GradScaler
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import DataLoader
 
 # Import your previous classes
 from src.train.model import MeloLikeTTS
 from src.train.data_loader import LJSpeechDataset, collate_fn
+from src.train.shards import ShardedDataset
+from src.train.sampler import BucketBatchSampler
+from src.train.prefetcher import DevicePrefetcher
+from src.train.device import select
+from src.train.metrics import TrainMetrics
+from src.train.checkpoint import CheckpointManager, capture_rng, restore_rng
+from src.train.distributed import Distributed
+from src.train.losses import LOSS_MODES, mel_loss
 
 # 1. Hyperparameters Optimized for A100
 BATCH_SIZE = 32  # You can go up to 128 on an 80GB A100
 LEARNING_RATE = 2e-4
 EPOCHS = 100
-DEVICE = "cuda"
+# "auto" picks the fastest setup this machine supports (see `python -m src.train.device`):
+# bf16 on Ampere+ GPUs, fp16 + GradScaler on older ones, bf16 or fp32 on CPU.
+# Override for CPU CI / smoke runs with e.g. TTS_TRAIN_DEVICE=cpu TTS_TRAIN_PRECISION=fp32
+DEVICE = os.environ.get("TTS_TRAIN_DEVICE", "auto")  # auto | cuda | cuda:N | mps | cpu
+PRECISION = os.environ.get("TTS_TRAIN_PRECISION", "auto")  # auto | fp32 | bf16 | fp16 (CUDA only)
+COMPILE = os.environ.get("TTS_TRAIN_COMPILE", "0") == "1"  # opt-in torch.compile of the model
+LOG_EVERY = int(os.environ.get("TTS_TRAIN_LOG_EVERY", 10))  # steps between loss / throughput syncs
+METRICS_FILE = os.environ.get("TTS_TRAIN_METRICS", "train_metrics.jsonl")  # JSONL log, "" to disable
+USE_MEL_CACHE = True  # build once with `python -m src.train.mel_cache`
+# Packed shards (`python -m src.train.shards`) instead of metadata.csv + WAVs / mel cache; "" = off
+SHARDS_DIR = os.environ.get("TTS_TRAIN_SHARDS", "")
+NUM_WORKERS = 8  # processes decoding audio / slicing the mel cache in parallel
+PERSISTENT_WORKERS = True  # keep workers alive between epochs instead of re-forking
+PREFETCH_FACTOR = 4  # batches each worker prepares ahead of the training step
+MAX_FRAMES_PER_BATCH = None  # e.g. 32 * 600; if set, replaces BATCH_SIZE with a padded-frame budget
+CHECKPOINT_DIR = os.environ.get("TTS_TRAIN_CHECKPOINT_DIR", "checkpoints")
+CHECKPOINT_EVERY = int(os.environ.get("TTS_TRAIN_CHECKPOINT_EVERY", 500))  # steps; 0 = only at epoch ends
+KEEP_LAST = 3  # most recent checkpoints kept on disk
+KEEP_BEST = 2  # plus the ones with the lowest epoch loss
+RESUME = os.environ.get("TTS_TRAIN_RESUME", "auto")  # auto = latest in CHECKPOINT_DIR | a file | "" = fresh start
+# Batches per optimizer step; the effective batch is BATCH_SIZE * ACCUM_STEPS * processes
+ACCUM_STEPS = int(os.environ.get("TTS_TRAIN_ACCUM_STEPS", 1))
+DIST_BACKEND = os.environ.get("TTS_TRAIN_DIST_BACKEND", "auto")  # auto = nccl on CUDA, gloo on CPU (torchrun only)
+# masked | packed = loss over real mel frames only (see losses.py; packed also skips padded tokens in the
+# model's forward) | padded = MSE over the whole padded batch
+LOSS_MODE = os.environ.get("TTS_TRAIN_LOSS", "masked")
 
 def train():
+    if LOSS_MODE not in LOSS_MODES:
+        raise ValueError(f"Unknown TTS_TRAIN_LOSS {LOSS_MODE!r}, expected one of {LOSS_MODES}")
+    # Single process unless launched by torchrun; see distributed.py
+    world = Distributed.from_env()
+    setup = select(world.device(DEVICE), PRECISION, COMPILE)
+    world.init_process_group(setup.device, DIST_BACKEND)
+
     # 2. Initialize Dataset and Loader
-    dataset = LJSpeechDataset("data/LJSpeech-1.1")
+    if SHARDS_DIR:
+        dataset = ShardedDataset(SHARDS_DIR)
+    else:
+        dataset = LJSpeechDataset("data/LJSpeech-1.1", use_mel_cache=USE_MEL_CACHE)
+    # Group items of similar length so batches carry as little padding as possible;
+    # with shards, one shard at a time so reads stay within one file
+    sampler = BucketBatchSampler(dataset.mel_lengths(), batch_size=BATCH_SIZE,
+                                 max_frames=MAX_FRAMES_PER_BATCH,
+                                 num_replicas=world.world_size, rank=world.rank,
+                                 groups=dataset.shard_ids() if SHARDS_DIR else None)
     loader = DataLoader(
         dataset,
-        batch_size=BATCH_SIZE,
-        shuffle=True,
+        batch_sampler=sampler,
         collate_fn=collate_fn,
-        num_workers=0,   # 🔥 CHANGE THIS
-        pin_memory=True
+        num_workers=NUM_WORKERS,
+        persistent_workers=PERSISTENT_WORKERS and NUM_WORKERS > 0,
+        prefetch_factor=PREFETCH_FACTOR if NUM_WORKERS > 0 else None,
+        pin_memory=setup.device.type == "cuda"
     )
+    # Copies batch N+1 to the GPU while batch N is being trained on
+    batches = DevicePrefetcher(loader, setup.device)
 
     # 3. Initialize Model, Optimizer, and Scaler
     # vocab_size 50 covers our basic alphabet + phonemes
-    model = MeloLikeTTS(vocab_size=50, num_speakers=1, speaker_dim=256).to(DEVICE)
+    model = MeloLikeTTS(vocab_size=50, num_speakers=1, speaker_dim=256).to(setup.device)
+    # Gradients are averaged across processes during backward
+    ddp_model = DistributedDataParallel(
+        model, device_ids=[setup.device] if setup.device.type == "cuda" else None
+    ) if world.enabled else None
+    # Batch shapes vary with bucketing, so compile for dynamic shapes up front;
+    # checkpoints are saved from `model`, without the DDP / compile wrappers' prefixes
+    train_model = ddp_model or model
+    if setup.compile:
+        train_model = torch.compile(train_model, dynamic=True)
     optimizer = torch.optim.AdamW(model.parameters(), lr=LEARNING_RATE)
-    scaler = GradScaler('cuda')
-    criterion = nn.MSELoss()
+    # Only fp16 needs loss scaling; for fp32 / bf16 the scaler is a pass-through
+    scaler = setup.grad_scaler()
 
-    print(f"Starting training on {torch.cuda.get_device_name(0)}...")
+    # Losses are summed on the device and synced every LOG_EVERY steps, not per step
+    metrics = TrainMetrics(log_every=LOG_EVERY, jsonl_path=METRICS_FILE or None, world=world)
 
-    for epoch in range(EPOCHS):
-        total_loss = 0
-        for i, (texts, mels) in enumerate(loader):
-            texts, mels = texts.to(DEVICE), mels.to(DEVICE)
-            
-            # Since LJSpeech is 1 speaker, we use Speaker ID 0 for all
-            speaker_ids = torch.zeros(texts.size(0), dtype=torch.long).to(DEVICE)
+    # Written from a CPU copy on a background thread; see checkpoint.py.
+    # A fresh start (rank 0, which owns the files) moves an earlier run's checkpoints aside
+    checkpoints = CheckpointManager(CHECKPOINT_DIR, keep_last=KEEP_LAST, keep_best=KEEP_BEST,
+                                    fresh=not RESUME and world.is_main)
 
-            optimizer.zero_grad()
+    def save(epoch, next_batch, metric=None):
+        # Every rank's RNG state is kept so each resumes its own random stream; only rank 0 writes
+        rng = world.all_gather_object(capture_rng())
+        if world.is_main:
+            checkpoints.save({
+                "model": model.state_dict(),
+                "optimizer": optimizer.state_dict(),
+                "scaler": scaler.state_dict(),
+                "rng": rng,
+                "epoch": epoch,
+                "batch": next_batch,
+                "step": metrics.global_step,
+                "world_size": world.world_size,
+            }, step=metrics.global_step, metric=metric)
+
+    start_epoch, start_batch = 0, 0
+    state = checkpoints.load(RESUME) if RESUME else None
+    if state is not None:
+        # Loaded on every rank, so all processes start from the same weights
+        model.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        scaler.load_state_dict(state["scaler"])
+        rng = state["rng"]
+        restore_rng(rng[world.rank] if world.rank < len(rng) else rng[0])
+        start_epoch, start_batch = state["epoch"], state["batch"]
+        if state.get("world_size", 1) != world.world_size and start_batch:
+            # Each rank's slice of the epoch depends on the number of processes
+            start_epoch, start_batch = start_epoch + 1, 0
+        metrics.global_step = state["step"]
+        if world.is_main:
+            print(f"Resumed at epoch {start_epoch}, batch {start_batch} (step {state['step']})")
+
+    if world.is_main:
+        print(f"Starting training on {setup.describe()}"
+              f"{f' x {world.world_size} processes' if world.enabled else ''}...")
+
+    for epoch in range(start_epoch, EPOCHS):
+        # Mid-epoch resume: same batch order, minus the batches already trained on
+        sampler.set_epoch(epoch, start_batch if epoch == start_epoch else 0)
+        num_batches = len(sampler.batches())
+        metrics.start_epoch(epoch)
+        optimizer.zero_grad()
+        step_values = {}
+        for batch_index, (texts, text_lengths, mels, mel_lengths) in enumerate(batches, start=sampler.start_batch):
+            metrics.batch_ready()
+            # The last batch of the epoch steps the optimizer even if the accumulation is short
+            update = (batch_index + 1) % ACCUM_STEPS == 0 or batch_index + 1 == num_batches
+
+            # Since LJSpeech is 1 speaker, we use Speaker ID 0 for all
+            speaker_ids = torch.zeros(texts.size(0), dtype=torch.long, device=setup.device)
 
             # Mixed Precision Forward Pass
-            with autocast('cuda', dtype=torch.bfloat16):
+            with setup.autocast():
                 # Model predicts Mel-spectrogram
                 # Shape adjustment: we need to make sure model output matches mels
-                output = model(texts, speaker_ids)
+                # "packed" also skips the padded tokens in the decoder's matmul (see model.py)
+                output = train_model(texts, speaker_ids, None if LOSS_MODE == "padded" else text_lengths,
+                                     packed=LOSS_MODE == "packed")
                 
                 # Trim or pad output to match ground truth mel length
                 if output.size(2) > mels.size(2):
@@ -57,21 +168,41 @@ def train():
                 elif output.size(2) < mels.size(2):
                     pad_amount = mels.size(2) - output.size(2)
                     output = torch.nn.functional.pad(output, (0, pad_amount))
-                loss = criterion(output, mels)
+                loss = mel_loss(output, mels, mel_lengths, LOSS_MODE) / ACCUM_STEPS
+
+            # Backward Pass; between optimizer steps DDP skips the gradient all-reduce
+            with ddp_model.no_sync() if ddp_model and not update else contextlib.nullcontext():
+                scaler.scale(loss).backward()
+            for name, value in (("loss", loss.detach()), ("samples", texts.size(0)),
+                                ("mel_frames", mel_lengths.sum()), ("padded_frames", mels.size(0) * mels.size(2))):
+                step_values[name] = step_values.get(name, 0) + value
+            if not update:
+                metrics.micro_step()
+                continue
 
-            # Backward Pass
-            scaler.scale(loss).backward()
             scaler.step(optimizer)
             scaler.update()
+            optimizer.zero_grad()
+
+            metrics.step(**step_values)
+            step_values = {}
+
+            if CHECKPOINT_EVERY and metrics.global_step % CHECKPOINT_EVERY == 0:
+                save(epoch, batch_index + 1)
 
-            total_loss += loss.item()
+        # Frames of the batches this run trained on (not those skipped on resume), summed over ranks
+        summary = metrics.end_epoch()
 
-            if i % 10 == 0:
-                print(f"Epoch {epoch} | Step {i} | Loss: {loss.item():.4f}")
+        # Save Checkpoint (resumes at the start of the next epoch; ranked by epoch loss)
+        save(epoch + 1, 0, metric=summary.get("loss"))
+        if world.is_main and "padding_ratio" in summary:
+            print(f"--- Padding: {summary['padding_ratio']:.1%} of mel frames | "
+                  f"{summary['mel_frames_per_sec']:.0f} real frames/sec "
+                  f"({summary['padded_frames_per_sec']:.0f} padded) ---")
 
-        # Save Checkpoint
-        torch.save(model.state_dict(), f"melo_model_epoch_{epoch}.pth")
-        print(f"--- Epoch {epoch} Average Loss: {total_loss/len(loader):.4f} ---")
+    metrics.close()
+    checkpoints.close()
+    world.shutdown()
 
 if __name__ == "__main__":
     train()
\ No newline at end of file